@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
@@ -62,6 +63,7 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    'reviews.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,7 +79,8 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, plus render times for Server-Timing
+        'BACKEND': 'reviews.timing.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
@@ -113,6 +116,105 @@ DATABASES = {
 }
 
 
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The IGDB cache evicts least recently used entries once MAX_ENTRIES is hit
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'igdb': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'igdb',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+    # Anonymous full pages and their surrogate key versions
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pages',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+# Anonymous pages are cached for this many seconds (0 disables the cache).
+# Edits purge the affected pages at once in the process that made them;
+# with the per-process cache above, others catch up within the timeout.
+# Bump PAGE_CACHE_VERSION when templates change in a deploy.
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_VERSION = 1
+
+# Listing counts are cached until the listing changes (or this many
+# seconds); on PostgreSQL, listings estimated above the threshold show the
+# planner's estimate instead of a COUNT(*)
+COUNT_CACHE_TIMEOUT = 60 * 10
+COUNT_ESTIMATE_THRESHOLD = 50000
+
+# Review page views are buffered per process and written every interval
+# or once this many are pending (the most a killed worker can lose);
+# repeat views by the same visitor within the window count once
+VIEW_COUNT_FLUSH_INTERVAL = 30
+VIEW_COUNT_FLUSH_SIZE = 500
+VIEW_COUNT_DEDUPE_WINDOW = 60 * 30
+
+# Seconds IGDB responses stay fresh, then how long they may be served stale
+# while being refreshed in the background
+IGDB_CACHE_TTL = 60 * 60 * 24
+IGDB_CACHE_STALE_TTL = 60 * 60 * 24 * 7
+
+# IGDB allows about 4 requests a second; the budget is shared by every
+# process through a database token bucket. 429/5xx responses are retried
+# with jittered exponential backoff.
+IGDB_RATE_LIMIT = 4
+IGDB_RATE_LIMIT_BURST = 4
+IGDB_MAX_RETRIES = 3
+
+# Upstream base URLs, normally left unset. `manage.py run_fake_upstream`
+# prints values pointing at a local stand-in for offline benchmarks.
+IGDB_API_URL = os.environ.get('IGDB_API_URL')
+TWITCH_TOKEN_URL = os.environ.get('TWITCH_TOKEN_URL')
+CLOUDINARY_UPLOAD_PREFIX = os.environ.get('CLOUDINARY_UPLOAD_PREFIX')
+AI_REVIEW_ENDPOINT = os.environ.get('AI_REVIEW_ENDPOINT')
+
+# Fraction of requests measured by reviews.timing.ServerTimingMiddleware
+# (a log line, plus a Server-Timing header for staff or under DEBUG); 0
+# turns it off
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0.05))
+
+# Navbar menus are invalidated by model signals; the timeout bounds how long
+# other processes (with their own local cache) can show an outdated menu
+MENU_CACHE_TIMEOUT = 60 * 5
+
+# Full-text search (see reviews/search.py)
+SEARCH_CONFIG = 'english'
+SEARCH_RESULTS_LIMIT = 100
+
+# Seconds before a process rebuilds its in-memory autocomplete index, which
+# bounds how long names changed by other processes can be missing
+AUTOCOMPLETE_INDEX_TIMEOUT = 60 * 5
+
+# Concurrent downloads/uploads for imports and AI review generations per
+# process (see reviews/assets.py and reviews/ai_reviews.py)
+ASSET_PIPELINE_WORKERS = 8
+AI_REVIEW_WORKERS = 4
+
+# Image downloads and Cloudinary uploads retry 429/5xx responses and
+# connection errors like IGDB requests do
+ASSET_MAX_RETRIES = 3
+
+# Background jobs run by `manage.py run_jobs`: items handled per saved
+# chunk, and seconds before a silent worker's job can be claimed again
+JOB_CHUNK_SIZE = 10
+JOB_LEASE_SECONDS = 60 * 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -175,5 +277,17 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'WARNING',
         },
+        # Failures in background work (IGDB refreshes, AI reviews, view
+        # count flushes) that do not surface in a response
+        'reviews': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+        # One JSON line per request sampled by ServerTimingMiddleware
+        'reviews.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DeveloperConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'developer'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,5 +1,11 @@
+from reviews.menus import lazy_menu
 from .models import Developer
 
 
 def developers_context(request):
-    return {'all_developers': Developer.objects.all()}
+    return {
+        'all_developers': lazy_menu(
+            'developers',
+            lambda: list(Developer.objects.values('name', 'slug'))
+        )
+    }
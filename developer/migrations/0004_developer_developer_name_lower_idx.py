@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:08
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('developer', '0003_developer_slug'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='developer',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='developer_name_lower_idx'),
+        ),
+    ]
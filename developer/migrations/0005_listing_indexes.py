@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('developer', '0004_developer_developer_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='developer',
+            index=models.Index(fields=['created_on', 'id'], name='developer_created_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='developer',
+            index=models.Index(fields=['updated_on'], name='developer_updated_on_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from cloudinary.models import CloudinaryField
 
 # Create your models here.
@@ -16,6 +17,16 @@ class Developer(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Case-insensitive name lookups when matching IGDB companies
+            models.Index(Lower('name'), name='developer_name_lower_idx'),
+            # Newest first listing, paged by (created_on, id) cursors
+            models.Index(fields=['created_on', 'id'],
+                         name='developer_created_on_idx'),
+            # Newest change, part of the catalogue version (ETags)
+            models.Index(fields=['updated_on'],
+                         name='developer_updated_on_idx'),
+        ]
 
     def __str__(self):
         return self.name
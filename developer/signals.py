@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from reviews.menus import invalidate_menu
+from .models import Developer
+
+
+@receiver(post_save, sender=Developer)
+@receiver(post_delete, sender=Developer)
+def invalidate_developers_menu(sender, **kwargs):
+    invalidate_menu('developers')
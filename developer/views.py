@@ -1,12 +1,18 @@
 from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import generic
 from .models import Developer
 from reviews.models import Review
+from reviews.conditional import catalogue_version, conditional_page
+from reviews.page_cache import add_surrogate_keys, cache_anonymous_page
+from reviews.pagination import CursorPaginationMixin
 
 # Create your views here.
 
 
-class DeveloperList(generic.ListView):
+@method_decorator(conditional_page(catalogue_version), name='dispatch')
+@method_decorator(cache_anonymous_page, name='dispatch')
+class DeveloperList(CursorPaginationMixin, generic.ListView):
     """List all developers with pagination"""
     model = Developer
     template_name = "developer/developer_list.html"
@@ -14,6 +20,7 @@ class DeveloperList(generic.ListView):
     paginate_by = 12
 
     def get_queryset(self):
+        add_surrogate_keys(self.request, 'developers')
         queryset = Developer.objects.all()
         sort = self.request.GET.get('sort')
         if sort == 'az':
@@ -29,10 +36,15 @@ class DeveloperList(generic.ListView):
         return queryset
 
 
+@conditional_page(catalogue_version)
+@cache_anonymous_page
 def developer_games(request, slug):
     """Show all games (reviews) by a specific developer"""
     developer = get_object_or_404(Developer, slug=slug)
-    games = Review.objects.filter(developer=developer, is_published=True)
+    add_surrogate_keys(request, f'developer:{developer.pk}')
+    games = Review.objects.filter(
+        developer=developer, is_published=True
+    ).for_cards()
 
     return render(request, 'developer/developer_games.html', {
         'developer': developer,
@@ -1,33 +1,40 @@
 from django.shortcuts import render
-from django.core.paginator import Paginator
 from reviews.models import Review
 from datetime import timedelta
 from django.utils import timezone
+from reviews.conditional import conditional_page, home_version
+from reviews.page_cache import add_surrogate_keys, cache_anonymous_page
+from reviews.pagination import CursorPaginator
 
 
+@conditional_page(home_version)
+@cache_anonymous_page
 def home_view(request):
     # Get the days filter parameter, default to 7 days
     days_filter = int(request.GET.get('days', 7))
 
-    # Calculate the date threshold based on the filter
-    filter_date = timezone.now() - timedelta(days=days_filter)
+    # Calculate the date threshold based on the filter, to the hour so the
+    # query (and its cached count) stays the same for an hour
+    filter_date = (timezone.now() - timedelta(days=days_filter)).replace(
+        minute=0, second=0, microsecond=0)
+
+    add_surrogate_keys(request, 'reviews', 'featured')
 
     # Filter reviews based on the selected time period
     review_queryset = Review.objects.filter(
         is_published=True, review_date__gte=filter_date
-    ).order_by('-review_date')
+    ).order_by('-review_date').for_cards()
 
     # Pagination for recent reviews
-    paginator = Paginator(review_queryset, 16)  # 16 reviews per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(review_queryset, 16)  # 16 reviews per page
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     # Check if pagination is needed
-    is_paginated = paginator.num_pages > 1
+    is_paginated = page_obj.has_other_pages()
 
     featured_reviews = Review.objects.filter(
         is_featured=True, is_published=True
-    )
+    ).for_cards()
 
     context = {
         'review_list': page_obj,
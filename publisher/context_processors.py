@@ -1,5 +1,11 @@
+from reviews.menus import lazy_menu
 from .models import Publisher
 
 
 def publishers_context(request):
-    return {'all_publishers': Publisher.objects.all()}
+    return {
+        'all_publishers': lazy_menu(
+            'publishers',
+            lambda: list(Publisher.objects.values('name', 'slug'))
+        )
+    }
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('publisher', '0004_publisher_publisher_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(fields=['created_on', 'id'], name='publisher_created_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(fields=['updated_on'], name='publisher_updated_on_idx'),
+        ),
+    ]
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from reviews.menus import invalidate_menu
+from .models import Publisher
+
+
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Publisher)
+def invalidate_publishers_menu(sender, **kwargs):
+    invalidate_menu('publishers')
@@ -1,12 +1,18 @@
 from django.shortcuts import render, get_object_or_404
+from django.utils.decorators import method_decorator
 from django.views import generic
 from .models import Publisher
 from reviews.models import Review
+from reviews.conditional import catalogue_version, conditional_page
+from reviews.page_cache import add_surrogate_keys, cache_anonymous_page
+from reviews.pagination import CursorPaginationMixin
 
 # Create your views here.
 
 
-class PublisherList(generic.ListView):
+@method_decorator(conditional_page(catalogue_version), name='dispatch')
+@method_decorator(cache_anonymous_page, name='dispatch')
+class PublisherList(CursorPaginationMixin, generic.ListView):
     """List all publishers with pagination"""
     model = Publisher
     template_name = "publisher/publisher_list.html"
@@ -14,6 +20,7 @@ class PublisherList(generic.ListView):
     paginate_by = 12
 
     def get_queryset(self):
+        add_surrogate_keys(self.request, 'publishers')
         queryset = Publisher.objects.all()
         sort = self.request.GET.get('sort')
         if sort == 'az':
@@ -29,10 +36,15 @@ class PublisherList(generic.ListView):
         return queryset
 
 
+@conditional_page(catalogue_version)
+@cache_anonymous_page
 def publisher_games(request, slug):
     """Show all games (reviews) by a specific publisher"""
     publisher = get_object_or_404(Publisher, slug=slug)
-    games = Review.objects.filter(publisher=publisher, is_published=True)
+    add_surrogate_keys(request, f'publisher:{publisher.pk}')
+    games = Review.objects.filter(
+        publisher=publisher, is_published=True
+    ).for_cards()
 
     return render(request, 'publisher/publisher_games.html', {
         'publisher': publisher,
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django_summernote.admin import SummernoteModelAdmin
-from .models import Review, Publisher, Developer, UserComment, UserReview
+from .models import (Review, Publisher, Developer, UserComment, UserReview,
+                     GeneratedReview, Job)
 # Register your models here.
 
 
@@ -46,10 +47,11 @@ class ReviewAdmin(SummernoteModelAdmin):
     summernote_fields = ('description', 'review_text')
     list_display = (
         'title', 'publisher', 'developer',
-        'review_score', 'is_published', 'is_featured'
+        'review_score', 'is_published', 'is_featured', 'ai_review_status'
     )
     list_filter = (
-        'is_published', 'is_featured', 'publisher', 'developer'
+        'is_published', 'is_featured', 'ai_review_status', 'publisher',
+        'developer'
     )
     search_fields = ('title', 'description')
     prepopulated_fields = {'slug': ('title',)}
@@ -62,22 +64,22 @@ class ReviewAdmin(SummernoteModelAdmin):
     ]
 
     def mark_as_published(self, request, queryset):
-        updated = queryset.update(is_published=True)
+        updated = queryset.update_and_purge(is_published=True)
         self.message_user(request, f'{updated} reviews marked as published.')
     mark_as_published.short_description = "Mark selected reviews as published"
 
     def mark_as_unpublished(self, request, queryset):
-        updated = queryset.update(is_published=False)
+        updated = queryset.update_and_purge(is_published=False)
         self.message_user(request, f'{updated} reviews marked as unpublished.')
     mark_as_unpublished.short_description = "Mark selected as unpublished"
 
     def mark_as_featured(self, request, queryset):
-        updated = queryset.update(is_featured=True)
+        updated = queryset.update_and_purge(is_featured=True)
         self.message_user(request, f'{updated} reviews marked as featured.')
     mark_as_featured.short_description = "Mark selected reviews as featured"
 
     def mark_as_unfeatured(self, request, queryset):
-        updated = queryset.update(is_featured=False)
+        updated = queryset.update_and_purge(is_featured=False)
         self.message_user(request, f'{updated} reviews unmarked as featured.')
     mark_as_unfeatured.short_description = "Mark selected as not featured"
 
@@ -93,7 +95,7 @@ class UserCommentAdmin(admin.ModelAdmin):
     actions = ['approve_comments']
 
     def approve_comments(self, request, queryset):
-        queryset.update(approved=True)
+        queryset.approve()
     approve_comments.short_description = "Mark selected comments as approved"
 
 
@@ -108,5 +110,29 @@ class UserReviewAdmin(admin.ModelAdmin):
     actions = ['approve_reviews']
 
     def approve_reviews(self, request, queryset):
-        queryset.update(approved=True)
+        queryset.approve()
     approve_reviews.short_description = "Mark selected reviews as approved"
+
+
+@admin.register(GeneratedReview)
+class GeneratedReviewAdmin(admin.ModelAdmin):
+    list_display = (
+        'title', 'prompt_version', 'model', 'prompt_tokens',
+        'completion_tokens', 'latency_ms', 'created_on'
+    )
+    list_filter = ('prompt_version', 'model')
+    search_fields = ('title',)
+    ordering = ('-created_on',)
+    list_per_page = 25
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'kind', 'status', 'completed', 'total', 'attempts',
+        'created_by', 'created_on', 'finished_on'
+    )
+    list_filter = ('status', 'kind')
+    readonly_fields = ('items', 'result', 'error')
+    ordering = ('-created_on',)
+    list_per_page = 25
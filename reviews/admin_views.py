@@ -2,6 +2,11 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from .models import UserComment, UserReview
+from .pagination import CursorPaginator
+
+
+# Rows of an approval queue shown per page
+APPROVAL_PAGE_SIZE = 50
 
 
 @user_passes_test(lambda u: u.is_superuser)
@@ -13,8 +18,7 @@ def approve_comments(request):
         if action in ['approve', 'reject']:
             comment_ids = request.POST.getlist('comment_ids')
             if action == 'approve':
-                UserComment.objects.filter(id__in=comment_ids).update(
-                    approved=True)
+                UserComment.objects.filter(id__in=comment_ids).approve()
                 messages.success(
                     request, f'Approved {len(comment_ids)} comment(s)')
             elif action == 'reject':
@@ -31,20 +35,26 @@ def approve_comments(request):
                     request,
                     f'Deleted {len(approved_comment_ids)} approved comment(s)')
 
-    # Get all unapproved comments
+    # Unapproved comments, a page at a time
     unapproved_comments = UserComment.objects.filter(
         approved=False
-    ).order_by('-created_on')
+    ).select_related('author', 'review').order_by('-created_on')
 
     # Get recently approved comments for reference
     recent_approved = UserComment.objects.filter(
         approved=True
-    ).order_by('-created_on')[:10]
+    ).select_related('author', 'review').order_by('-created_on')[:10]
+
+    paginator = CursorPaginator(unapproved_comments, APPROVAL_PAGE_SIZE)
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     context = {
-        'unapproved_comments': unapproved_comments,
+        'unapproved_comments': page_obj,
         'recent_approved': recent_approved,
+        # Exact, unlike paginator.count, as approvals shrink the queue
         'total_unapproved': unapproved_comments.count(),
+        'is_paginated': page_obj.has_other_pages(),
+        'page_obj': page_obj,
     }
 
     return render(request, 'reviews/approve_comments.html', context)
@@ -59,8 +69,7 @@ def approve_reviews(request):
         if action in ['approve', 'reject']:
             review_ids = request.POST.getlist('review_ids')
             if action == 'approve':
-                UserReview.objects.filter(id__in=review_ids).update(
-                    approved=True)
+                UserReview.objects.filter(id__in=review_ids).approve()
                 messages.success(
                     request, f'Approved {len(review_ids)} review(s)')
             elif action == 'reject':
@@ -76,20 +85,26 @@ def approve_reviews(request):
                     request,
                     f'Deleted {len(approved_review_ids)} approved review(s)')
 
-    # Get all unapproved reviews
+    # Unapproved reviews, a page at a time
     unapproved_reviews = UserReview.objects.filter(
         approved=False
-    ).order_by('-created_on')
+    ).select_related('user', 'game').order_by('-created_on')
 
     # Get recently approved reviews for reference
     recent_approved = UserReview.objects.filter(
         approved=True
-    ).order_by('-created_on')[:10]
+    ).select_related('user', 'game').order_by('-created_on')[:10]
+
+    paginator = CursorPaginator(unapproved_reviews, APPROVAL_PAGE_SIZE)
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     context = {
-        'unapproved_reviews': unapproved_reviews,
+        'unapproved_reviews': page_obj,
         'recent_approved': recent_approved,
+        # Exact, unlike paginator.count, as approvals shrink the queue
         'total_unapproved': unapproved_reviews.count(),
+        'is_paginated': page_obj.has_other_pages(),
+        'page_obj': page_obj,
     }
 
     return render(request, 'reviews/approve_reviews.html', context)
@@ -0,0 +1,171 @@
+"""
+AI review generation, kept off the request path.
+
+Imports create reviews straight away with ``ai_review_status='pending'``
+and queue them here. A small thread pool writes the text in the
+background, and every completion is stored in GeneratedReview keyed by
+(title, prompt version) so retries and re-imports reuse it. Pending
+reviews left behind by a restart are picked up by generate_ai_reviews.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from .page_cache import purge
+from .timing import upstream
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger('reviews.ai_reviews')
+
+
+ENDPOINT = "https://models.github.ai/inference"
+MODEL = "openai/gpt-4.1"
+
+# Bump whenever the prompt changes so cached text is regenerated
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = ("You are a game reviewer and need to create "
+                 "professional gaming reviews")
+PROMPT = ("write 5-7 paragraphs including a conclusion on {title}. "
+          "Do not include a heading, break each paragraph with a "
+          "<p> tag, Please ensure the review has appropriate spacing "
+          "for the paragraphs to display as HTML.")
+
+_client = None
+_client_endpoint = None
+_client_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def placeholder_text(title):
+    return f"Auto-generated review for {title}."
+
+
+def get_client():
+    """Shared client, rebuilt if AI_REVIEW_ENDPOINT changes"""
+    global _client, _client_endpoint
+    endpoint = getattr(settings, 'AI_REVIEW_ENDPOINT', None) or ENDPOINT
+    if _client is None or _client_endpoint != endpoint:
+        with _client_lock:
+            if _client is None or _client_endpoint != endpoint:
+                from azure.ai.inference import ChatCompletionsClient
+                from azure.core.credentials import AzureKeyCredential
+                _client = ChatCompletionsClient(
+                    endpoint=endpoint,
+                    credential=AzureKeyCredential(
+                        getattr(settings, 'AI_REVIEW_TOKEN', None) or
+                        os.environ.get("GITHUB_TOKEN")),
+                )
+                _client_endpoint = endpoint
+    return _client
+
+
+def cache_title(title):
+    return title.strip().lower()
+
+
+def generate_review_text(title):
+    """Return review text for ``title``, from the cache when possible"""
+    from .models import GeneratedReview
+
+    key = cache_title(title)
+    cached = GeneratedReview.objects.filter(
+        title=key, prompt_version=PROMPT_VERSION).first()
+    if cached:
+        return cached.content
+
+    from azure.ai.inference.models import SystemMessage, UserMessage
+    started = time.monotonic()
+    with upstream('ai'):
+        response = get_client().complete(
+            messages=[
+                SystemMessage(SYSTEM_PROMPT),
+                UserMessage(PROMPT.format(title=title)),
+            ],
+            temperature=1,
+            top_p=1,
+            model=MODEL
+        )
+    latency_ms = int((time.monotonic() - started) * 1000)
+    content = response.choices[0].message.content
+    usage = getattr(response, 'usage', None)
+
+    try:
+        with transaction.atomic():
+            GeneratedReview.objects.create(
+                title=key,
+                prompt_version=PROMPT_VERSION,
+                content=content,
+                model=MODEL,
+                prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                completion_tokens=getattr(
+                    usage, 'completion_tokens', 0) or 0,
+                latency_ms=latency_ms,
+            )
+    except IntegrityError:
+        # Another worker finished the same title first; keep its text
+        return GeneratedReview.objects.get(
+            title=key, prompt_version=PROMPT_VERSION).content
+    return content
+
+
+def write_review(review_id):
+    """Generate and store the text for one pending review"""
+    from .models import Review
+
+    close_old_connections()
+    try:
+        review = Review.objects.only('id', 'title').get(pk=review_id)
+        try:
+            content = generate_review_text(review.title)
+        except Exception:
+            logger.exception('AI review failed for %r', review.title)
+            Review.objects.filter(pk=review_id).update(
+                ai_review_status='failed')
+            return False
+        if Review.objects.filter(
+            pk=review_id, ai_review_status='pending'
+        ).update(review_text=content, ai_review_status='ready',
+                 updated_on=timezone.now()):
+            purge(f'review:{review_id}')
+        return True
+    except Review.DoesNotExist:
+        return False
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    """Process-wide pool bounding concurrent calls to the AI endpoint"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'AI_REVIEW_WORKERS', 4),
+                    thread_name_prefix='ai-review',
+                )
+    return _executor
+
+
+def queue_reviews(review_ids):
+    """
+    Generate text for pending reviews in the background once the current
+    transaction commits. Returns the futures, which resolve to whether
+    the text was written.
+    """
+    futures = []
+
+    def submit():
+        executor = get_executor()
+        futures.extend(
+            executor.submit(write_review, review_id)
+            for review_id in review_ids
+        )
+
+    transaction.on_commit(submit)
+    return futures
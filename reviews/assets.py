@@ -0,0 +1,180 @@
+"""
+Concurrent download and Cloudinary upload of images used by imports.
+
+Callers register every cover and logo a batch needs, run the pipeline
+once, then read back the Cloudinary public ids before touching the
+database. Assets sharing a public id (the same developer on several
+games) are fetched once, and bytes go straight from the download to the
+upload without temp files. Throttled (429) and failed (5xx) responses
+and connection errors are retried with the same backoff as IGDB
+requests.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from .throttle import RETRY_STATUSES, retry_delay
+from .timing import upstream
+import requests
+import time
+
+
+# Cloudinary folder for each kind of asset
+COVER_FOLDER = 'game_covers'
+DEVELOPER_LOGO_FOLDER = 'developer_logos'
+PUBLISHER_LOGO_FOLDER = 'publisher_logos'
+
+
+def normalize_url(url):
+    """IGDB returns protocol-relative image URLs"""
+    if url and url.startswith('//'):
+        return 'https:' + url
+    return url or ''
+
+
+def image_public_id(folder, name):
+    return f"{folder}/{name.lower().replace(' ', '_')}"
+
+
+class AssetPipeline:
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or getattr(
+            settings, 'ASSET_PIPELINE_WORKERS', 8)
+        self.timeout = timeout or getattr(
+            settings, 'ASSET_DOWNLOAD_TIMEOUT', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4,
+                              pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.max_retries = getattr(settings, 'ASSET_MAX_RETRIES', 3)
+        self.backoff_base = getattr(settings, 'ASSET_BACKOFF_BASE', 0.5)
+        self.backoff_cap = getattr(settings, 'ASSET_BACKOFF_CAP', 8)
+        self.pending = {}   # public id -> (folder, url)
+        self.results = {}   # public id -> uploaded public id or None
+        self.errors = []
+
+    def add(self, folder, name, url):
+        """Register an image and return the key to look it up with"""
+        url = normalize_url(url)
+        if not url or not name:
+            return None
+        public_id = image_public_id(folder, name)
+        if public_id not in self.results:
+            self.pending.setdefault(public_id, (folder, url))
+        return public_id
+
+    def run(self):
+        """Download and upload every pending asset concurrently"""
+        if not self.pending:
+            return self.results
+        pending, self.pending = self.pending, {}
+        workers = min(self.max_workers, len(pending))
+        # Workers run outside the request context, so time the whole batch
+        with upstream('cloudinary'), \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            uploaded = executor.map(
+                lambda item: self.transfer(item[0], *item[1]),
+                pending.items()
+            )
+            self.results.update(zip(pending, uploaded))
+        return self.results
+
+    def transfer(self, public_id, folder, url):
+        try:
+            content = self.download(url)
+            result = self.upload(
+                content,
+                filename=url.rsplit('/', 1)[-1],
+                public_id=public_id,
+                folder=folder,
+                overwrite=True,
+                resource_type='image',
+            )
+            return result['public_id']
+        except Exception as e:
+            self.errors.append(f'Failed to upload {public_id}: {str(e)}')
+            return None
+
+    def download(self, url):
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if (response.status_code not in RETRY_STATUSES or
+                        attempt == self.max_retries):
+                    response.raise_for_status()
+                    return response.content
+                retry_after = response.headers.get('Retry-After')
+            self.wait(attempt, retry_after)
+
+    def upload(self, content, **options):
+        from cloudinary import exceptions
+        from cloudinary.uploader import upload
+
+        # Client errors (bad request, credentials, ...) raise subclasses of
+        # their own; throttling, 500s, other statuses and socket errors
+        # raise these
+        retried = (exceptions.Error, exceptions.GeneralError,
+                   exceptions.RateLimited)
+        # Send uploads to a local stand-in instead of api.cloudinary.com
+        upload_prefix = getattr(settings, 'CLOUDINARY_UPLOAD_PREFIX', None)
+        if upload_prefix:
+            options['upload_prefix'] = upload_prefix
+        for attempt in range(self.max_retries + 1):
+            try:
+                return upload(content, **options)
+            except exceptions.Error as e:
+                if type(e) not in retried or attempt == self.max_retries:
+                    raise
+            self.wait(attempt)
+
+    def wait(self, attempt, retry_after=None):
+        time.sleep(retry_delay(
+            attempt, self.backoff_base, self.backoff_cap, retry_after))
+
+    def get(self, key, default=None):
+        """Return the uploaded public id for ``key``, or ``default``"""
+        return self.results.get(key) or default
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def add_game_assets(pipeline, game, existing_developers=(),
+                    existing_publishers=()):
+    """
+    Register the cover and company logos for an IGDB game.
+
+    Logos of companies already in the database are skipped because the
+    stored company keeps its logo. Returns the keys for the cover,
+    developer logo and publisher logo.
+    """
+    title = game.get('name', '')
+    cover_key = pipeline.add(COVER_FOLDER, title, game.get('cover_url'))
+
+    developer_key = publisher_key = None
+    if game.get('developers'):
+        developer = game['developers'][0]
+        if developer['name'] not in existing_developers:
+            developer_key = pipeline.add(
+                DEVELOPER_LOGO_FOLDER, developer['name'],
+                developer.get('logo_url'))
+    if game.get('publishers'):
+        publisher = game['publishers'][0]
+        if publisher['name'] not in existing_publishers:
+            publisher_key = pipeline.add(
+                PUBLISHER_LOGO_FOLDER, publisher['name'],
+                publisher.get('logo_url'))
+    return cover_key, developer_key, publisher_key
+
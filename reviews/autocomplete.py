@@ -0,0 +1,173 @@
+"""
+In-process prefix index for search-as-you-type completions.
+
+Every name is stored under each of its word starts ("Legend of Zelda" is
+found by "leg", "of z" and "zel") in one sorted list per kind. A lookup is
+a bisect plus a forward scan that stops once ``limit`` names are found, so
+keystrokes never reach the database. The index is built on first use,
+one build per process at a time, and patched by reviews.signals once
+changes commit; the timeout bounds how long other processes can serve
+names changed elsewhere.
+"""
+from bisect import bisect_left, insort
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from urllib.parse import urlencode
+from .throttle import SingleFlight
+import re
+import threading
+import time
+
+
+KINDS = ('games', 'developers', 'publishers', 'genres')
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def index_keys(name):
+    """Return the key of every word start in ``name``"""
+    words = normalize(name).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self.keys = {kind: [] for kind in KINDS}    # kind -> sorted (key, pk)
+        self.entries = {}   # (kind, pk) -> (label, url)
+        self.lock = threading.Lock()
+        self.built_at = None
+        # Requests finding the index stale wait for one rebuild
+        self.builds = SingleFlight()
+
+    def is_stale(self):
+        timeout = getattr(settings, 'AUTOCOMPLETE_INDEX_TIMEOUT', 300)
+        return (self.built_at is None or
+                time.monotonic() - self.built_at > timeout)
+
+    def build(self):
+        """Load every name from the database into a fresh index"""
+        from developer.models import Developer
+        from publisher.models import Publisher
+        from .models import Genre, Review
+
+        entries = {}
+        for pk, title, slug in Review.objects.filter(
+                is_published=True).values_list('pk', 'title', 'slug'):
+            entries[('games', pk)] = entry_for('games', title, slug)
+        for pk, name, slug in Developer.objects.values_list(
+                'pk', 'name', 'slug'):
+            entries[('developers', pk)] = entry_for('developers', name, slug)
+        for pk, name, slug in Publisher.objects.values_list(
+                'pk', 'name', 'slug'):
+            entries[('publishers', pk)] = entry_for('publishers', name, slug)
+        for pk, name in Genre.objects.values_list('pk', 'name'):
+            entries[('genres', pk)] = entry_for('genres', name)
+
+        keys = {kind: [] for kind in KINDS}
+        for (kind, pk), (label, url) in entries.items():
+            keys[kind].extend((key, pk) for key in index_keys(label))
+        for kind_keys in keys.values():
+            kind_keys.sort()
+        with self.lock:
+            self.keys = keys
+            self.entries = entries
+            self.built_at = time.monotonic()
+
+    def ensure_built(self):
+        if self.is_stale():
+            self.builds.do('build', self.rebuild)
+
+    def rebuild(self):
+        # Another request may have finished a build while this one waited
+        if self.is_stale():
+            self.build()
+
+    def add(self, kind, pk, label, url):
+        """Insert or replace a single entry"""
+        with self.lock:
+            self._discard(kind, pk)
+            self.entries[(kind, pk)] = (label, url)
+            for key in index_keys(label):
+                insort(self.keys[kind], (key, pk))
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._discard(kind, pk)
+
+    def _discard(self, kind, pk):
+        entry = self.entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        keys = self.keys[kind]
+        for key in index_keys(entry[0]):
+            position = bisect_left(keys, (key, pk))
+            if position < len(keys) and keys[position] == (key, pk):
+                del keys[position]
+
+    def complete(self, prefix, limit):
+        """Return up to ``limit`` completions of each kind for ``prefix``"""
+        prefix = normalize(prefix)
+        results = {kind: [] for kind in KINDS}
+        if not prefix:
+            return results
+
+        with self.lock:
+            for kind, matches in results.items():
+                keys = self.keys[kind]
+                seen = set()
+                position = bisect_left(keys, (prefix,))
+                while position < len(keys) and len(matches) < limit:
+                    key, pk = keys[position]
+                    position += 1
+                    if not key.startswith(prefix):
+                        break
+                    if pk in seen:
+                        continue
+                    seen.add(pk)
+                    label, url = self.entries[(kind, pk)]
+                    matches.append({'label': label, 'url': url})
+        return results
+
+
+def entry_for(kind, name, slug=None):
+    """Return the (label, url) pair shown for a completion"""
+    if kind == 'games':
+        url = reverse('reviews:review_detail', args=[slug])
+    elif kind == 'developers':
+        url = reverse('developer:developer_games', args=[slug])
+    elif kind == 'publishers':
+        url = reverse('publisher:publisher_games', args=[slug])
+    else:
+        url = (reverse('reviews:review_list') + '?' +
+               urlencode({'genre': name}))
+    return (name, url)
+
+
+prefix_index = PrefixIndex()
+
+
+def complete(prefix, limit):
+    prefix_index.ensure_built()
+    return prefix_index.complete(prefix, limit)
+
+
+def index_entry(kind, pk, name, slug=None):
+    """
+    Add or update a name once the current transaction commits, if this
+    process has built the index
+    """
+    def add():
+        if prefix_index.built_at is not None:
+            prefix_index.add(kind, pk, *entry_for(kind, name, slug))
+    transaction.on_commit(add)
+
+
+def unindex_entry(kind, pk):
+    def remove():
+        if prefix_index.built_at is not None:
+            prefix_index.remove(kind, pk)
+    transaction.on_commit(remove)
@@ -0,0 +1,151 @@
+"""
+Conditional GET (ETag / Last-Modified) for anonymous pages.
+
+``conditional_page`` looks up a page's version with one small query
+before the view runs, and answers a matching If-None-Match or
+If-Modified-Since with 304 Not Modified without rendering anything.
+
+Versions come from the database only, so every process (and the edge
+cache in front of them) derives the same validators for the same data:
+
+- Every page's navbar lists the genres, developers and publishers, so
+  every version includes their newest ``updated_on`` and row count.
+- List and company pages add the newest ``Review.updated_on``. Deleting
+  a review touches its developer and publisher instead, so the list
+  versions never need to count the reviews table.
+- A review page adds the review's ``updated_on``, its latest approved
+  comment and user review, and its like count.
+
+Writes that change what a page shows without saving the review (counter
+updates, bulk actions, genre changes, IGDB refreshes, AI review text)
+touch ``Review.updated_on`` so the version follows them. Each part is
+read through an index, so a version costs a few index probes whatever
+the size of the catalogue.
+"""
+from django.conf import settings
+from django.db.models import (CharField, Count, DateTimeField, F, Max,
+                              OuterRef, Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+from functools import wraps
+from developer.models import Developer
+from publisher.models import Publisher
+from .models import Genre, Review, UserComment, UserReview
+from .page_cache import anonymous_request
+import hashlib
+
+
+def table_version(model, table, count=True):
+    """(table, newest updated_on, row count or 0) of ``model``"""
+    return model.objects.order_by().annotate(
+        table=Value(table, CharField())
+    ).values('table').annotate(
+        updated=Max('updated_on'),
+        total=Count('updated_on') if count else Value(0),
+    ).values_list('table', 'updated', 'total')
+
+
+def menu_versions():
+    """Versions of the tables every navbar lists"""
+    return table_version(Genre, 'genres').union(
+        table_version(Developer, 'developers'),
+        table_version(Publisher, 'publishers'), all=True)
+
+
+def catalogue_versions():
+    return table_version(Review, 'reviews', count=False).union(
+        menu_versions(), all=True)
+
+
+def catalogue_version(request, *args, **kwargs):
+    return list(catalogue_versions())
+
+
+def home_version(request):
+    # The page lists reviews from a window ending at the current hour (see
+    # home.views), so it also changes as reviews age out of it
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+    return catalogue_version(request) + [('hour', hour, 0)]
+
+
+def review_versions(slug):
+    """The menu versions plus the published review at ``slug``"""
+    def latest(queryset):
+        return Coalesce(
+            Subquery(queryset.filter(approved=True).order_by(
+                '-created_on').values('created_on')[:1]),
+            'updated_on',
+        )
+
+    review = Review.objects.order_by().filter(
+        slug=slug, is_published=True
+    ).annotate(
+        table=Value('review', CharField()),
+        updated=Greatest(
+            'updated_on',
+            latest(UserComment.objects.filter(review=OuterRef('pk'))),
+            latest(UserReview.objects.filter(game=OuterRef('pk'))),
+            output_field=DateTimeField(),
+        ),
+        total=F('like_count'),
+    ).values_list('table', 'updated', 'total')
+    return review.union(menu_versions(), all=True)
+
+
+def review_version(request, slug):
+    """``review_versions``, or None without a published review at ``slug``"""
+    rows = list(review_versions(slug))
+    if not any(table == 'review' for table, _, _ in rows):
+        return None
+    return rows
+
+
+def validators(rows):
+    """Weak ETag and Last-Modified time for the version ``rows``"""
+    version = (getattr(settings, 'PAGE_CACHE_VERSION', 1), sorted(rows))
+    digest = hashlib.sha1(repr(version).encode()).hexdigest()
+    last_modified = max(
+        (updated for _, updated, _ in rows if updated is not None),
+        default=None)
+    return f'W/"{digest}"', last_modified
+
+
+def conditional_page(version):
+    """
+    Answer conditional GETs for anonymous visitors from ``version``,
+    called with the view's arguments, before the view runs
+    """
+    def decorator(view):
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not anonymous_request(request):
+                return view(request, *args, **kwargs)
+            rows = version(request, *args, **kwargs)
+            if rows is None:
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators(rows)
+            # Keeps the page cache from serving a page older than this
+            request._page_etag = etag
+            response = condition(
+                etag_func=lambda *args, **kwargs: etag,
+                last_modified_func=lambda *args, **kwargs: last_modified,
+            )(view)(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                # Revalidate on every visit rather than trust a heuristic
+                # freshness lifetime derived from Last-Modified
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ['Cookie'])
+            else:
+                # Error pages are not versioned by the page's data
+                for header in ('ETag', 'Last-Modified'):
+                    if response.has_header(header):
+                        del response[header]
+            return response
+
+        return wrapped
+
+    return decorator
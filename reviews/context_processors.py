@@ -1,5 +1,9 @@
+from .menus import lazy_menu
 from .models import Genre
 
 
 def genres_context(request):
-    return {'genres': Genre.objects.all()}
+    return {
+        'genres': lazy_menu(
+            'genres', lambda: list(Genre.objects.values('name')))
+    }
@@ -0,0 +1,84 @@
+"""
+Row counts for paginated listings.
+
+``cached_count`` caches COUNT(*) per query, versioned by the page cache
+tags that are purged whenever rows of the model are published,
+unpublished, added or deleted. So a count is only recomputed after the
+listing changes, not on every render.
+
+On PostgreSQL, listings the planner expects to hold more than
+COUNT_ESTIMATE_THRESHOLD rows use its estimate instead of counting:
+``pg_class.reltuples`` for a whole table, EXPLAIN for a filtered query.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DatabaseError, connections
+from .page_cache import get_page_cache, tag_versions
+import hashlib
+import json
+import time
+
+
+# Page cache tags purged when rows of these models appear or disappear
+COUNT_TAGS = {
+    'reviews.review': ('reviews',),
+    'developer.developer': ('developers', 'menu:developers'),
+    'publisher.publisher': ('publishers', 'menu:publishers'),
+}
+
+
+def count_key(queryset, versions):
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(
+        repr((sql, params, sorted(versions.items()))).encode()).hexdigest()
+    return f'count:{digest}'
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for ``queryset``, or None"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        if not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # -1 until the table is first analyzed
+            estimate = row[0] if row else -1
+        else:
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = plan[0]['Plan']['Plan Rows']
+    except DatabaseError:
+        return None
+    return int(estimate) if estimate >= 0 else None
+
+
+def cached_count(queryset):
+    """
+    The number of rows in ``queryset``: exact and cached until the
+    listing changes, or the planner's estimate for very large listings
+    """
+    tags = ('all',) + COUNT_TAGS.get(queryset.model._meta.label_lower, ())
+    versions = tag_versions(get_page_cache(), tags, time.time_ns())
+    if versions is None:
+        # A tag was purged just now
+        return queryset.count()
+
+    try:
+        key = count_key(queryset, versions)
+    except EmptyResultSet:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        threshold = getattr(settings, 'COUNT_ESTIMATE_THRESHOLD', 50000)
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate > threshold:
+            count = estimate
+        else:
+            count = queryset.count()
+        cache.set(key, count, getattr(settings, 'COUNT_CACHE_TIMEOUT', 600))
+    return count
@@ -0,0 +1,371 @@
+"""
+Local stand-ins for the services imports and reviews depend on.
+
+One HTTP server answers for Twitch OAuth, the IGDB API (recorded /games
+payloads, searched and filtered like the real endpoint), IGDB image
+downloads, Cloudinary uploads and the AI chat completions endpoint, so
+imports and page loads can be measured offline and repeatably.
+
+Latency, 5xx errors, injected 429s and a per-second rate limit can be
+turned on, and the random choices are seeded. Run it with
+``manage.py run_fake_upstream`` and point a process at it with the
+environment variables that command prints, or use it in-process::
+
+    with FakeUpstream(latency=0.1) as upstream, \\
+            override_settings(**upstream.settings()):
+        call_command('populate_reviews', ...)
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+import copy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+
+
+DEFAULT_PAYLOAD = Path(__file__).resolve().parent / 'benchmarks' / \
+    'igdb_games.json'
+
+SERVICES = ('twitch', 'igdb', 'images', 'cloudinary', 'ai')
+
+# Smallest valid GIF, served for every IGDB image
+PIXEL = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!'
+         b'\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+         b'\x00\x02\x02D\x01\x00;')
+
+REVIEW_TEXT = (
+    "<p>{title} is a confident, polished release that knows exactly what "
+    "it wants to be.</p>"
+    "<p>The moment-to-moment play is tight, and the systems layered on top "
+    "give every session a clear sense of progress.</p>"
+    "<p>Presentation is strong throughout, with art direction and sound "
+    "that support the tone rather than distract from it.</p>"
+    "<p>Some pacing issues in the middle stretch hold it back, but never "
+    "for long.</p>"
+    "<p>In conclusion, {title} is easy to recommend to anyone curious "
+    "about the genre.</p>"
+)
+
+SEARCH_PATTERN = re.compile(r'search\s+"((?:[^"\\]|\\.)*)"')
+IDS_PATTERN = re.compile(r'where\s+id\s*=\s*\(?([\d,\s]+)\)?')
+LIMIT_PATTERN = re.compile(r'limit\s+(\d+)')
+SUBQUERY_PATTERN = re.compile(r'query\s+(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\{')
+
+
+def unescape(value):
+    return re.sub(r'\\(.)', r'\1', value)
+
+
+def split_multiquery(body):
+    """Yield (endpoint, name, query) for each sub-query of a /multiquery"""
+    position = 0
+    while True:
+        match = SUBQUERY_PATTERN.search(body, position)
+        if match is None:
+            return
+        # Find the closing brace, skipping quoted strings
+        index = match.end()
+        quoted = False
+        while index < len(body):
+            char = body[index]
+            if quoted and char == '\\':
+                index += 1
+            elif char == '"':
+                quoted = not quoted
+            elif char == '}' and not quoted:
+                break
+            index += 1
+        yield match.group(1), unescape(match.group(2)), \
+            body[match.end():index]
+        position = index + 1
+
+
+class GameCatalogue:
+    """Recorded IGDB games, queried like the /games endpoint"""
+
+    def __init__(self, games, image_base):
+        # Image URLs point back at this server instead of images.igdb.com
+        games = json.loads(json.dumps(games).replace(
+            '//images.igdb.com/', f'{image_base}/'))
+        self.games = games
+        self.by_id = {game['id']: game for game in games}
+
+    def synthesize(self, name):
+        """
+        A game for a title missing from the recording, cloned from a
+        recorded one so imports of any title list behave the same way
+        """
+        checksum = zlib.crc32(name.lower().encode())
+        game = copy.deepcopy(self.games[checksum % len(self.games)])
+        game['id'] = 10_000_000 + checksum % 10_000_000
+        game['name'] = name
+        return game
+
+    def query(self, body):
+        match = LIMIT_PATTERN.search(body)
+        limit = int(match.group(1)) if match else 10
+
+        match = IDS_PATTERN.search(body)
+        if match:
+            ids = [int(i) for i in match.group(1).split(',') if i.strip()]
+            return [self.by_id[i] for i in ids if i in self.by_id][:limit]
+
+        match = SEARCH_PATTERN.search(body)
+        term = unescape(match.group(1)).lower() if match else ''
+        if not term:
+            return self.games[:limit]
+        found = [game for game in self.games
+                 if term in game['name'].lower()]
+        return found[:limit] or [self.synthesize(unescape(match.group(1)))]
+
+
+class Faults:
+    """Latency, errors and throttling applied to selected services"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, rate_limit=None, services=SERVICES,
+                 seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.services = set(services)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.windows = {}   # service -> (second, requests in it)
+
+    def over_rate_limit(self, service):
+        second = int(time.monotonic())
+        with self.lock:
+            window, count = self.windows.get(service, (second, 0))
+            if window != second:
+                count = 0
+            self.windows[service] = (second, count + 1)
+        return count >= self.rate_limit
+
+    def apply(self, service):
+        """Sleep as configured, then return an error status or None"""
+        if service not in self.services:
+            return None
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+        if delay:
+            time.sleep(delay)
+        if self.rate_limit and self.over_rate_limit(service):
+            return 429
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 503
+        return None
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeUpstream/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send(self, status, body=b'', content_type='application/json',
+             headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        path = urlsplit(self.path).path
+        if path == '/_stats':
+            return 'stats', None
+        if path == '/oauth2/token':
+            return 'twitch', None
+        if path.startswith('/v4/'):
+            return 'igdb', path[len('/v4/'):]
+        if path.startswith('/images/'):
+            return 'images', None
+        if path.startswith('/v1_1/') and path.endswith('/upload'):
+            return 'cloudinary', None
+        if path.endswith('/chat/completions'):
+            return 'ai', None
+        return None, None
+
+    def handle_request(self):
+        service, endpoint = self.route()
+        body = self.read_body()
+        if service is None:
+            return self.send(404, {'message': 'Not found'})
+        if service == 'stats':
+            return self.send(200, self.server.stats())
+
+        status = self.server.faults.apply(service)
+        if status:
+            self.server.count(service, status)
+            message = ('Too Many Requests' if status == 429
+                       else 'Injected failure')
+            # Cloudinary's client only raises for bodies shaped like its own
+            body = ({'error': {'message': message}}
+                    if service == 'cloudinary'
+                    else {'status': status, 'message': message})
+            return self.send(
+                status, body,
+                headers={'Retry-After': '1'} if status == 429 else None)
+
+        self.server.count(service, 200)
+        getattr(self, f'serve_{service}')(endpoint, body)
+
+    do_GET = do_POST = handle_request
+
+    def serve_twitch(self, endpoint, body):
+        self.send(200, {
+            'access_token': uuid.uuid4().hex,
+            'expires_in': self.server.token_lifetime,
+            'token_type': 'bearer',
+        })
+
+    def serve_igdb(self, endpoint, body):
+        query = body.decode()
+        catalogue = self.server.catalogue
+        if endpoint == 'multiquery':
+            self.send(200, [
+                {'name': name,
+                 'result': catalogue.query(sub_query)
+                 if sub_endpoint == 'games' else []}
+                for sub_endpoint, name, sub_query in split_multiquery(query)
+            ])
+        elif endpoint == 'games':
+            self.send(200, catalogue.query(query))
+        else:
+            self.send(200, [])
+
+    def serve_images(self, endpoint, body):
+        self.send(200, PIXEL, content_type='image/gif')
+
+    def serve_cloudinary(self, endpoint, body):
+        match = re.search(rb'name="public_id"\r\n\r\n([^\r]*)', body)
+        public_id = match.group(1).decode() if match else uuid.uuid4().hex
+        cloud_name = self.path.split('/')[2]
+        url = (f'{self.server.base_url}/{cloud_name}/image/upload/'
+               f'v1/{public_id}.gif')
+        self.send(200, {
+            'public_id': public_id,
+            'version': 1,
+            'format': 'gif',
+            'resource_type': 'image',
+            'width': 1,
+            'height': 1,
+            'bytes': len(PIXEL),
+            'url': url,
+            'secure_url': url,
+        })
+
+    def serve_ai(self, endpoint, body):
+        try:
+            messages = json.loads(body).get('messages', [])
+            prompt = messages[-1]['content']
+        except (ValueError, LookupError, AttributeError, TypeError):
+            prompt = ''
+        match = re.search(r'conclusion on (.*?)\. Do not', prompt)
+        content = REVIEW_TEXT.format(
+            title=match.group(1) if match else 'This game')
+        self.send(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': json.loads(body or b'{}').get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content},
+            }],
+            'usage': {
+                'prompt_tokens': len(prompt.split()),
+                'completion_tokens': len(content.split()),
+                'total_tokens': len(prompt.split()) + len(content.split()),
+            },
+        })
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    """
+    The stand-in server. ``start()`` serves from a background thread (or
+    use it as a context manager); ``serve_forever()`` blocks.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, payload=DEFAULT_PAYLOAD,
+                 token_lifetime=60 * 60 * 24, verbose=False, **faults):
+        super().__init__((host, port), FakeUpstreamHandler)
+        self.base_url = f'http://{host}:{self.server_address[1]}'
+        with open(payload) as recorded:
+            self.catalogue = GameCatalogue(
+                json.load(recorded), f'{self.base_url}/images')
+        self.faults = Faults(**faults)
+        self.token_lifetime = token_lifetime
+        self.verbose = verbose
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        self.thread = None
+
+    def count(self, service, status):
+        with self.counts_lock:
+            counts = self.counts.setdefault(service, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def stats(self):
+        """Responses sent so far, by service and status code"""
+        with self.counts_lock:
+            return {
+                service: {str(status): count
+                          for status, count in counts.items()}
+                for service, counts in self.counts.items()
+            }
+
+    def settings(self):
+        """Settings that point this project at the server"""
+        return {
+            'IGDB_API_URL': f'{self.base_url}/v4/',
+            'TWITCH_TOKEN_URL': f'{self.base_url}/oauth2/token',
+            'IGDB_CLIENT_ID': 'fake-client-id',
+            'IGDB_CLIENT_SECRET': 'fake-client-secret',
+            'CLOUDINARY_UPLOAD_PREFIX': self.base_url,
+            'AI_REVIEW_ENDPOINT': f'{self.base_url}/inference',
+            'AI_REVIEW_TOKEN': 'fake-token',
+        }
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.serve_forever, name='fake-upstream', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
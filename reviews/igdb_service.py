@@ -1,12 +1,202 @@
-from igdb.wrapper import IGDBWrapper
+from igdb.wrapper import API_URL, IGDBWrapper
 from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from .igdb_parser import GameParser
+from .throttle import RETRY_STATUSES, SingleFlight, acquire, retry_delay
+from .timing import record_cache, upstream
+import hashlib
 import json
+import logging
 import requests
 import os
+import threading
+import time
+
+
+logger = logging.getLogger('reviews.igdb_service')
+
+
+TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+
+
+# Fields requested for every game search, kept in one place so the cache
+# key changes whenever the shape of the payload does
+GAME_FIELDS = (
+    'id, name, summary, release_dates.date, '
+    'release_dates.platform.id, release_dates.platform.name, '
+    'release_dates.platform.platform_type, '
+    'platforms.id, platforms.name, platforms.platform_type, cover.url, '
+    'genres.name, '
+    'involved_companies.company.name, '
+    'involved_companies.company.description, '
+    'involved_companies.company.websites.url, '
+    'involved_companies.company.websites.type, '
+    'involved_companies.company.start_date, '
+    'involved_companies.company.logo.url, '
+    'involved_companies.developer, involved_companies.publisher'
+)
+
+
+# IGDB accepts at most this many named sub-queries per /multiquery call,
+# and returns at most this many rows per sub-query
+MULTIQUERY_LIMIT = 10
+MULTIQUERY_RESULT_LIMIT = 500
+
+
+def escape_igdb_string(value):
+    """Escape a value for use inside a double-quoted APICalypse string"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def igdb_api_url():
+    """Base URL of the IGDB API (overridden to use a local stand-in)"""
+    return getattr(settings, 'IGDB_API_URL', None) or API_URL
+
+
+def twitch_token_url():
+    return getattr(settings, 'TWITCH_TOKEN_URL', None) or TWITCH_TOKEN_URL
+
+
+def get_igdb_cache():
+    """Return the cache used for IGDB responses (falls back to default)"""
+    alias = getattr(settings, 'IGDB_CACHE_ALIAS', 'igdb')
+    if alias not in settings.CACHES:
+        alias = 'default'
+    return caches[alias]
+
+
+def make_cache_key(endpoint, query, fields, limit):
+    """Build a cache key from a normalized query and the requested fields"""
+    normalized_query = ' '.join(str(query).lower().split())
+    normalized_fields = ','.join(
+        sorted(field.strip() for field in fields.split(','))
+    )
+    raw_key = f'{endpoint}|{normalized_query}|{normalized_fields}|{limit}'
+    digest = hashlib.sha1(raw_key.encode('utf-8')).hexdigest()
+    return f'igdb:{endpoint}:{digest}'
+
+
+def process_release_dates(release_dates_data):
+    """Process IGDB release dates data to get earliest date per platform"""
+    if not release_dates_data:
+        return []
+
+    # Group release dates by platform, keeping only the earliest date
+    platform_releases = {}
+    for release_date in release_dates_data:
+        if 'date' in release_date:
+            platform_name = "Unknown Platform"
+            if ('platform' in release_date and
+                    'name' in release_date['platform']):
+                platform_name = release_date['platform']['name']
+
+            try:
+                timestamp = release_date['date']
+                date_obj = datetime.fromtimestamp(timestamp)
+                formatted_date = date_obj.strftime('%B %d, %Y')
+
+                # Keep only the earliest date for each platform
+                if (platform_name not in platform_releases or
+                        timestamp <
+                        platform_releases[platform_name]['timestamp']):
+                    platform_releases[platform_name] = {
+                        'platform': platform_name,
+                        'date': formatted_date,
+                        'timestamp': timestamp
+                    }
+            except (ValueError, OSError):
+                continue
+
+    # Sort by timestamp and return list
+    sorted_releases = sorted(
+        platform_releases.values(),
+        key=lambda x: x['timestamp']
+    )
+    return sorted_releases
+
+
+def build_game_snapshot(game):
+    """
+    Build the JSON snapshot stored on :model:`reviews.Review` from a
+    formatted IGDB game, as returned by ``search_games_with_platforms``
+    """
+    return {
+        'platforms': game.get('platforms', []),
+        'genres': game.get('genres', []),
+        'release_dates': process_release_dates(game.get('release_dates')),
+        'developers': game.get('developers', []),
+        'publishers': game.get('publishers', []),
+    }
+
+
+class SessionIGDBWrapper(IGDBWrapper):
+    """
+    IGDB wrapper that sends requests through a shared keep-alive session.
+
+    Every request takes a token from the shared 'igdb' rate limit bucket.
+    429 and 5xx responses and connection errors are retried with jittered
+    exponential backoff, and identical requests already in flight in this
+    process share one upstream call.
+    """
+
+    RETRY_STATUSES = RETRY_STATUSES
+
+    def __init__(self, client_id, auth_token, session, timeout=10):
+        super().__init__(client_id, auth_token)
+        self.session = session
+        self.timeout = timeout
+        self.rate_limit = getattr(settings, 'IGDB_RATE_LIMIT', 4)
+        self.rate_limit_burst = getattr(settings, 'IGDB_RATE_LIMIT_BURST', 4)
+        self.max_retries = getattr(settings, 'IGDB_MAX_RETRIES', 3)
+        self.backoff_base = getattr(settings, 'IGDB_BACKOFF_BASE', 0.5)
+        self.backoff_cap = getattr(settings, 'IGDB_BACKOFF_CAP', 8)
+        self.single_flight = SingleFlight()
+        self.retries = 0
+
+    def api_request(self, endpoint, query):
+        return self.single_flight.do(
+            (endpoint, query), lambda: self.send(endpoint, query))
+
+    def send(self, endpoint, query):
+        url = igdb_api_url() + endpoint
+        for attempt in range(self.max_retries + 1):
+            acquire('igdb', self.rate_limit, self.rate_limit_burst)
+            # Compose per attempt so a refreshed token is picked up
+            params = self._compose_request(query)
+            retry_after = None
+            try:
+                with upstream('igdb'):
+                    response = self.session.post(
+                        url, timeout=self.timeout, **params)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            else:
+                if (response.status_code not in self.RETRY_STATUSES or
+                        attempt == self.max_retries):
+                    response.raise_for_status()
+                    return response.content
+                retry_after = response.headers.get('Retry-After')
+
+            self.retries += 1
+            time.sleep(retry_delay(
+                attempt, self.backoff_base, self.backoff_cap, retry_after))
 
 
 class IGDBService:
-    """Service class for interacting with IGDB API"""
+    """Service class for interacting with IGDB API
+
+    Use :func:`get_igdb_service` to share one instance (and its token and
+    connection pool) across the whole process.
+    """
 
     def __init__(self):
         self.client_id = (
@@ -18,7 +208,24 @@ class IGDBService:
             os.getenv('IGDB_CLIENT_SECRET')
         )
         self.access_token = None
+        self.token_expires_at = 0
+        # Refresh the token this many seconds before Twitch expires it
+        self.token_refresh_margin = getattr(
+            settings, 'IGDB_TOKEN_REFRESH_MARGIN', 300)
+        self.token_lock = threading.Lock()
+        self.token_refreshes = 0
         self.wrapper = None
+        self.request_timeout = getattr(settings, 'IGDB_REQUEST_TIMEOUT', 10)
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.cache = get_igdb_cache()
+        # Seconds a cached response is served without revalidation
+        self.cache_ttl = getattr(settings, 'IGDB_CACHE_TTL', 60 * 60 * 24)
+        # Extra seconds a stale response may be served while it refreshes
+        self.cache_stale_ttl = getattr(
+            settings, 'IGDB_CACHE_STALE_TTL', 60 * 60 * 24 * 7)
 
         if not self.client_id or not self.client_secret:
             raise ValueError(
@@ -26,36 +233,77 @@ class IGDBService:
                 "in settings or environment variables"
             )
 
+    def token_is_valid(self):
+        """Check whether the cached token is outside its refresh window"""
+        return bool(self.access_token) and (
+            time.time() < self.token_expires_at - self.token_refresh_margin
+        )
+
     def get_access_token(self):
         """Get Twitch access token for IGDB API"""
-        if self.access_token:
+        if self.token_is_valid():
             return self.access_token
 
-        url = "https://id.twitch.tv/oauth2/token"
-        data = {
-            'client_id': self.client_id,
-            'client_secret': self.client_secret,
-            'grant_type': 'client_credentials'
-        }
+        # Only one thread refreshes; the others wait and reuse its token
+        with self.token_lock:
+            if self.token_is_valid():
+                return self.access_token
 
-        response = requests.post(url, data=data)
-        if response.status_code == 200:
-            self.access_token = response.json()['access_token']
-            return self.access_token
-        else:
-            raise Exception(
-                f"Failed to get access token: {response.status_code} - "
-                f"{response.text}"
-            )
+            data = {
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'grant_type': 'client_credentials'
+            }
+
+            with upstream('twitch'):
+                response = self.session.post(
+                    twitch_token_url(), data=data,
+                    timeout=self.request_timeout)
+            if response.status_code == 200:
+                payload = response.json()
+                self.access_token = payload['access_token']
+                self.token_expires_at = (
+                    time.time() + payload.get('expires_in', 0))
+                self.token_refreshes += 1
+                if self.wrapper:
+                    self.wrapper.auth_token = self.access_token
+                return self.access_token
+            else:
+                raise Exception(
+                    f"Failed to get access token: {response.status_code} - "
+                    f"{response.text}"
+                )
 
     def initialize_wrapper(self):
         """Initialize IGDB wrapper with credentials"""
+        # Always go through get_access_token so expiring tokens are renewed
+        access_token = self.get_access_token()
         if not self.wrapper:
-            if not self.access_token:
-                self.get_access_token()
-            self.wrapper = IGDBWrapper(self.client_id, self.access_token)
+            self.wrapper = SessionIGDBWrapper(
+                self.client_id, access_token, self.session,
+                timeout=self.request_timeout
+            )
         return self.wrapper
 
+    def stats(self):
+        """Return token and connection pool counters for monitoring"""
+        connections_opened = 0
+        requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections_opened += pool.num_connections
+            requests_sent += pool.num_requests
+        return {
+            'token_refreshes': self.token_refreshes,
+            'retries': self.wrapper.retries if self.wrapper else 0,
+            'requests': requests_sent,
+            'connections_opened': connections_opened,
+            'connections_reused': max(requests_sent - connections_opened, 0),
+        }
+
     def get_game_platforms_by_name(self, game_name):
         """Get platforms, genres, developers, and publishers for a game by name
         (returns first match)"""
@@ -73,191 +321,176 @@ class IGDBService:
     def search_games_with_platforms(self, game_name, limit=10):
         """
         Search for games by name and return with detailed platform information
+
+        Results are served from the IGDB cache when possible. A stale entry
+        is returned immediately and refreshed in the background.
         """
+        cache_key = make_cache_key('games', game_name, GAME_FIELDS, limit)
+        entry = self.cache.get(cache_key)
+        record_cache(entry is not None)
+        if entry is not None:
+            if entry['fresh_until'] <= time.time():
+                self.refresh_in_background(cache_key, game_name, limit)
+            return entry['games']
+
+        try:
+            games = self.fetch_games_with_platforms(game_name, limit)
+        except Exception:
+            logger.exception('IGDB search failed for %r', game_name)
+            return []
+
+        self.store_games(cache_key, games)
+        return games
+
+    def store_games(self, cache_key, games):
+        """Store formatted games with a freshness deadline"""
+        entry = {
+            'games': games,
+            'fresh_until': time.time() + self.cache_ttl,
+        }
+        self.cache.set(
+            cache_key, entry, timeout=self.cache_ttl + self.cache_stale_ttl)
+
+    def refresh_in_background(self, cache_key, game_name, limit):
+        """Revalidate a stale cache entry without blocking the caller"""
+        # Only one refresh per key at a time, across threads and processes
+        # sharing the cache backend
+        lock_key = f'{cache_key}:refreshing'
+        if not self.cache.add(lock_key, True, timeout=60):
+            return
+
+        def refresh():
+            try:
+                games = self.fetch_games_with_platforms(game_name, limit)
+                self.store_games(cache_key, games)
+            except Exception:
+                logger.exception(
+                    'IGDB cache refresh failed for %r', game_name)
+            finally:
+                self.cache.delete(lock_key)
+                # This thread's own database connection (rate limiting)
+                connection.close()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def fetch_games_with_platforms(self, game_name, limit=10):
+        """Query IGDB directly and format the results (no caching)"""
         wrapper = self.initialize_wrapper()
 
         query_string = (
-            f'fields id, name, summary, release_dates.date, '
-            f'release_dates.platform.id, release_dates.platform.name, release_dates.platform.platform_type, '
-            f'platforms.id, platforms.name, platforms.platform_type, cover.url, genres.name, '
-            f'involved_companies.company.name, '
-            f'involved_companies.company.description, '
-            f'involved_companies.company.websites.url, '
-            f'involved_companies.company.websites.type, '
-            f'involved_companies.company.start_date_format, '
-            f'involved_companies.company.logo.url, '
-            f'involved_companies.developer, involved_companies.publisher; '
-            f'search "{game_name}"; limit {limit};'
+            f'fields {GAME_FIELDS}; '
+            f'search "{escape_igdb_string(game_name)}"; limit {limit};'
         )
 
-        try:
-            byte_array = wrapper.api_request('games', query_string)
-            games = json.loads(byte_array)
-
-            # Format the results to make platforms easier to work with
-            formatted_games = []
-            for game in games:
-                cover_url = (
-                    game.get('cover', {}).get('url', '')
-                    if game.get('cover') else ''
-                )
-                if cover_url:
-                    cover_url = cover_url.replace('t_thumb', 't_cover_big')
-                formatted_game = {
-                    'id': game.get('id'),
-                    'name': game.get('name'),
-                    'summary': game.get('summary', ''),
-                    'cover_url': cover_url,
-                    'platforms': [],
-                    'genres': [],
-                    'developers': [],
-                    'publishers': []
-                }
-
-                # Extract platform information
-                if 'platforms' in game:
-                    for platform in game['platforms']:
-                        platform_info = {
-                            'id': platform.get('id'),
-                            'name': platform.get('name'),
-                            'abbreviation': platform.get('abbreviation', '')
-                        }
-                        formatted_game['platforms'].append(platform_info)
-
-                # Extract genre information
-                if 'genres' in game:
-                    for genre in game['genres']:
-                        genre_info = {
-                            'id': genre.get('id'),
-                            'name': genre.get('name')
-                        }
-                        formatted_game['genres'].append(genre_info)
-
-                # Extract developer information
-                if 'involved_companies' in game:
-                    for company_data in game['involved_companies']:
-                        if (company_data.get('developer') and
-                                'company' in company_data):
-                            company = company_data['company']
-
-                            # Extract website URL
-                            website_url = ''
-                            if 'websites' in company:
-                                for website in company['websites']:
-                                    # Type 1 is official website (per new docs)
-                                    if website.get('type') == 1:
-                                        website_url = website.get('url', '')
-                                        break
-                                # If no official site, take the first one
-                                if not website_url and company['websites']:
-                                    first_site = company['websites'][0]
-                                    website_url = first_site.get('url', '')
-
-                            # Convert start_date_format timestamp to year
-                            founded_year = ''
-                            if company.get('start_date_format'):
-                                try:
-                                    import datetime
-                                    timestamp = company['start_date_format']
-                                    if (isinstance(timestamp, (int, float)) and
-                                            timestamp > 0):
-                                        date_obj = datetime.datetime.\
-                                            fromtimestamp(timestamp)
-                                        founded_year = date_obj.year
-                                    else:
-                                        founded_year = ''
-                                except (ValueError, TypeError, OSError):
-                                    founded_year = ''
-
-                            # Extract logo URL
-                            logo_url = ''
-                            if (company.get('logo') and
-                                    company['logo'].get('url')):
-                                logo_url = company['logo']['url']
-                                # Convert to HTTPS and larger size
-                                if logo_url.startswith('//'):
-                                    logo_url = 'https:' + logo_url
-                                # Replace t_thumb with t_logo_med for quality
-                                logo_url = logo_url.replace(
-                                    't_thumb', 't_logo_med')
-
-                            developer_info = {
-                                'id': company.get('id'),
-                                'name': company.get('name', ''),
-                                'description': company.get('description', ''),
-                                'website': website_url,
-                                'founded_year': founded_year,
-                                'logo_url': logo_url
-                            }
-                            formatted_game['developers'].append(developer_info)
-
-                # Extract publisher information
-                if 'involved_companies' in game:
-                    for company_data in game['involved_companies']:
-                        if (company_data.get('publisher') and
-                                'company' in company_data):
-                            company = company_data['company']
-
-                            # Extract website URL
-                            website_url = ''
-                            if 'websites' in company:
-                                for website in company['websites']:
-                                    # Category 1 is official website
-                                    if website.get('category') == 1:
-                                        website_url = website.get('url', '')
-                                        break
-                                # If no official site, take the first one
-                                if not website_url and company['websites']:
-                                    first_site = company['websites'][0]
-                                    website_url = first_site.get('url', '')
-
-                            # Convert start_date timestamp to year
-                            founded_year = ''
-                            if company.get('start_date'):
-                                try:
-                                    import datetime
-                                    timestamp = company['start_date']
-                                    if (isinstance(timestamp, (int, float)) and
-                                            timestamp > 0):
-                                        date_obj = datetime.datetime.\
-                                            fromtimestamp(timestamp)
-                                        founded_year = date_obj.year
-                                    else:
-                                        founded_year = ''
-                                except (ValueError, TypeError, OSError):
-                                    founded_year = ''
-
-                            # Extract logo URL
-                            logo_url = ''
-                            if (company.get('logo') and
-                                    company['logo'].get('url')):
-                                logo_url = company['logo']['url']
-                                # Convert to HTTPS and larger size
-                                if logo_url.startswith('//'):
-                                    logo_url = 'https:' + logo_url
-                                # Replace t_thumb with t_logo_med for quality
-                                logo_url = logo_url.replace(
-                                    't_thumb', 't_logo_med')
-
-                            publisher_info = {
-                                'id': company.get('id'),
-                                'name': company.get('name', ''),
-                                'description': company.get('description', ''),
-                                'website': website_url,
-                                'founded_year': founded_year,
-                                'logo_url': logo_url
-                            }
-                            formatted_game['publishers'].append(publisher_info)
-
-                # Extract release dates with platform information
-                if 'release_dates' in game:
-                    formatted_game['release_dates'] = game['release_dates']
-
-                formatted_games.append(formatted_game)
-
-            return formatted_games
-        except Exception as e:
-            print(f"Error searching games with platforms: {e}")
-            import traceback
-            traceback.print_exc()
-            return []
+        byte_array = wrapper.api_request('games', query_string)
+        games = json.loads(byte_array)
+        return self.format_games(games)
+
+    def multiquery(self, queries):
+        """
+        Send up to MULTIQUERY_LIMIT ``(endpoint, body)`` sub-queries in one
+        request and return their results as a list, in the same order
+        """
+        if len(queries) > MULTIQUERY_LIMIT:
+            raise ValueError(
+                f"IGDB multiquery accepts at most {MULTIQUERY_LIMIT} "
+                f"sub-queries, got {len(queries)}")
+        wrapper = self.initialize_wrapper()
+        # Name sub-queries by position; titles may not be valid names
+        query_string = ''.join(
+            f'query {endpoint} "q{index}" {{ {body} }};'
+            for index, (endpoint, body) in enumerate(queries)
+        )
+        response = json.loads(wrapper.api_request('multiquery', query_string))
+        results = {item['name']: item.get('result', []) for item in response}
+        return [results.get(f'q{index}', []) for index in range(len(queries))]
+
+    def fetch_games_batch(self, game_names, limit=1):
+        """
+        Search IGDB for many titles, MULTIQUERY_LIMIT titles per request
+        (no caching). Returns {title: formatted games}.
+        """
+        names = list(dict.fromkeys(game_names))
+        found = {}
+        parser = GameParser()
+        for batch in chunked(names, MULTIQUERY_LIMIT):
+            results = self.multiquery([
+                ('games',
+                 f'fields {GAME_FIELDS}; '
+                 f'search "{escape_igdb_string(name)}"; limit {limit};')
+                for name in batch
+            ])
+            for name, games in zip(batch, results):
+                found[name] = self.format_games(games, parser)
+        return found
+
+    def search_games_batch(self, game_names, limit=1):
+        """
+        Cached counterpart of :meth:`fetch_games_batch`, sharing cache
+        entries with :meth:`search_games_with_platforms`
+        """
+        found = {}
+        missing = []
+        for name in dict.fromkeys(game_names):
+            entry = self.cache.get(
+                make_cache_key('games', name, GAME_FIELDS, limit))
+            record_cache(entry is not None)
+            if entry is not None and entry['fresh_until'] > time.time():
+                found[name] = entry['games']
+            else:
+                missing.append(name)
+
+        if missing:
+            fetched = self.fetch_games_batch(missing, limit=limit)
+            for name, games in fetched.items():
+                self.store_games(
+                    make_cache_key('games', name, GAME_FIELDS, limit), games)
+            found.update(fetched)
+        return found
+
+    def fetch_games_by_ids(self, game_ids):
+        """
+        Fetch games by IGDB id, packing MULTIQUERY_RESULT_LIMIT ids into
+        each sub-query and MULTIQUERY_LIMIT sub-queries into each request.
+        Returns {id: formatted game}; unknown ids are left out.
+        """
+        ids = list(dict.fromkeys(int(game_id) for game_id in game_ids))
+        found = {}
+        parser = GameParser()
+        id_batches = list(chunked(ids, MULTIQUERY_RESULT_LIMIT))
+        for request_batch in chunked(id_batches, MULTIQUERY_LIMIT):
+            results = self.multiquery([
+                ('games',
+                 f'fields {GAME_FIELDS}; '
+                 f'where id = ({",".join(str(i) for i in batch)}); '
+                 f'limit {MULTIQUERY_RESULT_LIMIT};')
+                for batch in request_batch
+            ])
+            for games in results:
+                for game in self.format_games(games, parser):
+                    found[game['id']] = game
+        return found
+
+    def format_games(self, games, parser=None):
+        """
+        Format raw IGDB games to make platforms easier to work with.
+
+        Pass the same ``parser`` for every response of a batch so shared
+        companies are only parsed once.
+        """
+        parser = parser or GameParser()
+        return [game.to_dict() for game in parser.parse_all(games)]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_igdb_service():
+    """Return the process-wide :class:`IGDBService` instance"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = IGDBService()
+    return _service
@@ -0,0 +1,317 @@
+"""
+Bulk import of IGDB games as reviews.
+
+Used by the populate_reviews command and the 'populate' background job.
+Existing reviews, companies and genres are preloaded into maps, missing
+rows are inserted with bulk_create, and the review/genre links are
+written in one statement, so the number of queries does not grow with
+the size of the batch.
+
+bulk_create skips save() and model signals, so the slugs, search index,
+autocomplete index, navbar menus and cached pages that signals normally
+maintain are updated here.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.text import slugify
+from developer.models import Developer
+from publisher.models import Publisher
+from .ai_reviews import placeholder_text
+from .assets import AssetPipeline, add_game_assets
+from .autocomplete import index_entry
+from .igdb_service import build_game_snapshot
+from .menus import invalidate_menu
+from .models import Genre, Review
+from .page_cache import purge_reviews
+from .search import update_search_index
+import datetime
+import random
+
+
+# Reviewers are drawn from this many accounts instead of sorting the whole
+# user table randomly for every game
+REVIEWER_POOL_SIZE = 500
+
+
+def release_date_of(game):
+    if 'release_dates' in game and game['release_dates']:
+        try:
+            timestamp = game['release_dates'][0]['date']
+            return datetime.datetime.fromtimestamp(timestamp).date()
+        except Exception:
+            return None
+    return None
+
+
+def split_new_games(entries):
+    """
+    Separate entries whose game already has a review (matching title,
+    ignoring case, or slug), using one query. Returns (new, skipped).
+    """
+    titles = {entry['game'].get('name', '').lower() for entry in entries}
+    slugs = {slugify(entry['game'].get('name', '')) for entry in entries}
+    existing = set()
+    for title, slug in Review.objects.annotate(
+        title_lower=Lower('title')
+    ).filter(
+        Q(title_lower__in=titles) | Q(slug__in=slugs)
+    ).values_list('title', 'slug'):
+        existing.update((title.lower(), slug))
+
+    new = []
+    skipped = 0
+    for entry in entries:
+        title = entry['game'].get('name', '')
+        keys = (title.lower(), slugify(title))
+        if existing.intersection(keys):
+            skipped += 1
+            continue
+        existing.update(keys)
+        new.append(entry)
+    return new, skipped
+
+
+def company_key(name):
+    """
+    Companies are matched by slug: names differing only in case or
+    punctuation ("SEGA", "Sega") are the same company, and could not be
+    stored apart anyway since slugs are unique
+    """
+    return slugify(name) or name.lower()
+
+
+def load_companies(model, games, field):
+    """
+    Map company key -> stored row for the companies in ``games``, matching
+    names ignoring case as well as slugs
+    """
+    names = {game[field][0]['name'] for game in games if game.get(field)}
+    if not names:
+        return {}
+    companies = {}
+    for company in model.objects.annotate(name_lower=Lower('name')).filter(
+        Q(name_lower__in={name.lower() for name in names}) |
+        Q(slug__in={company_key(name) for name in names})
+    ).only('id', 'name', 'slug'):
+        companies.setdefault(company_key(company.name), company)
+        # A row holding the slug wins: a new row could not take it
+        companies[company.slug] = company
+    return companies
+
+
+def known_names(games, field, companies):
+    """Names in ``games`` that belong to a company in ``companies``"""
+    return {
+        game[field][0]['name'] for game in games
+        if game.get(field) and company_key(game[field][0]['name']) in companies
+    }
+
+
+def company_of(game, field, companies):
+    return companies[company_key(game[field][0]['name'])]
+
+
+def create_company(model, company):
+    """Store ``company`` unless a row with its name or slug exists"""
+    existing = model.objects.filter(
+        Q(slug=company.slug) | Q(name__iexact=company.name)).first()
+    if existing is not None:
+        return existing, False
+    company.save()
+    return company, True
+
+
+def create_companies(model, games, field, companies, pipeline, asset_keys):
+    """Insert the companies missing from ``companies`` in one statement"""
+    missing = {}
+    for game, key in zip(games, asset_keys):
+        if not game.get(field):
+            continue
+        data = game[field][0]
+        slug = company_key(data['name'])
+        if slug in companies or slug in missing:
+            continue
+        missing[slug] = model(
+            name=data['name'],
+            slug=slug,
+            description=data.get('description', ''),
+            website=data.get('website', ''),
+            founded_year=data.get('founded_year') or None,
+            logo=pipeline.get(key, 'placeholder'),
+        )
+    if not missing:
+        return []
+    try:
+        # A concurrent import may have added the same slug since the
+        # preload; the no-op update keeps that row and still returns its
+        # primary key
+        with transaction.atomic():
+            created = model.objects.bulk_create(
+                missing.values(), update_conflicts=True,
+                unique_fields=['slug'], update_fields=['slug'])
+    except IntegrityError:
+        # One clashes on the name instead (a row stored with another
+        # slug): add them one by one, reusing the rows found
+        created = []
+        for slug, company in missing.items():
+            missing[slug], new = create_company(model, company)
+            if new:
+                created.append(company)
+    else:
+        missing = dict(zip(missing, created))
+    companies.update(missing)
+    return created
+
+
+def load_genres(games):
+    """Map genre name -> id, inserting missing genres in one statement"""
+    names = {
+        genre['name']
+        for game in games
+        for genre in game.get('genres', [])
+        if genre.get('name')
+    }
+    if not names:
+        return {}, False
+    genres = dict(
+        Genre.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names.difference(genres)
+    if missing:
+        created = Genre.objects.bulk_create(
+            [Genre(name=name) for name in sorted(missing)],
+            update_conflicts=True, unique_fields=['name'],
+            update_fields=['name'])
+        genres.update((genre.name, genre.pk) for genre in created)
+    return genres, bool(missing)
+
+
+def reviewer_ids():
+    """
+    Ids of REVIEWER_POOL_SIZE accounts in pk order from a random starting
+    point, read through the primary key index
+    """
+    bounds = User.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    start = random.randint(bounds['low'], bounds['high'])
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    ids = list(users.filter(pk__gte=start)[:REVIEWER_POOL_SIZE])
+    if len(ids) < REVIEWER_POOL_SIZE:
+        # Wrap around to the start of the table
+        ids += users.filter(pk__lt=start)[:REVIEWER_POOL_SIZE - len(ids)]
+    return ids
+
+
+def import_games(entries, pipeline=None):
+    """
+    Create reviews for ``entries`` (dicts with the IGDB ``game``,
+    ``review_score``, ``is_published`` and ``is_featured``).
+
+    Returns a dict with the ``created`` reviews, the number ``skipped``
+    because they already exist, the titles ``incomplete`` for lack of a
+    developer or publisher, and asset upload ``errors``.
+    """
+    result = {'created': [], 'skipped': 0, 'incomplete': [], 'errors': []}
+    entries, result['skipped'] = split_new_games(entries)
+
+    complete = []
+    for entry in entries:
+        game = entry['game']
+        if game.get('developers') and game.get('publishers'):
+            complete.append(entry)
+        else:
+            result['incomplete'].append(game.get('name'))
+    if not complete:
+        return result
+    games = [entry['game'] for entry in complete]
+
+    developers = load_companies(Developer, games, 'developers')
+    publishers = load_companies(Publisher, games, 'publishers')
+
+    # Upload every cover and new company logo before writing anything
+    owns_pipeline = pipeline is None
+    if owns_pipeline:
+        pipeline = AssetPipeline()
+    try:
+        known_developers = known_names(games, 'developers', developers)
+        known_publishers = known_names(games, 'publishers', publishers)
+        asset_keys = [
+            add_game_assets(pipeline, game, known_developers,
+                            known_publishers)
+            for game in games
+        ]
+        pipeline.run()
+        result['errors'] = list(pipeline.errors)
+
+        with transaction.atomic():
+            new_developers = create_companies(
+                Developer, games, 'developers', developers, pipeline,
+                [keys[1] for keys in asset_keys])
+            new_publishers = create_companies(
+                Publisher, games, 'publishers', publishers, pipeline,
+                [keys[2] for keys in asset_keys])
+            genres, new_genres = load_genres(games)
+
+            reviewers = reviewer_ids()
+            now = timezone.now()
+            reviews = []
+            for entry, (cover_key, _, _) in zip(complete, asset_keys):
+                game = entry['game']
+                title = game.get('name')
+                reviews.append(Review(
+                    title=title,
+                    slug=slugify(title),
+                    publisher=company_of(game, 'publishers', publishers),
+                    developer=company_of(game, 'developers', developers),
+                    description=game.get('summary', ''),
+                    release_date=(release_date_of(game) or
+                                  datetime.date.today()),
+                    review_score=entry['review_score'],
+                    review_text=placeholder_text(title),
+                    ai_review_status='pending',
+                    reviewed_by_id=(random.choice(reviewers)
+                                    if reviewers else None),
+                    review_date=now,
+                    featured_image=pipeline.get(cover_key, 'placeholder'),
+                    is_featured=entry['is_featured'],
+                    is_published=entry['is_published'],
+                    igdb_id=game.get('id'),
+                    igdb_data=build_game_snapshot(game),
+                    igdb_synced_on=now,
+                ))
+            Review.objects.bulk_create(reviews)
+
+            Review.genres.through.objects.bulk_create([
+                Review.genres.through(review_id=review.pk,
+                                      genre_id=genres[genre['name']])
+                for review, game in zip(reviews, games)
+                for genre in game.get('genres', [])
+                if genre.get('name')
+            ], ignore_conflicts=True)
+
+            update_search_index([review.pk for review in reviews])
+            purge_reviews([review.pk for review in reviews])
+    finally:
+        if owns_pipeline:
+            pipeline.close()
+
+    # What post_save receivers would have done for each row
+    for review in reviews:
+        if review.is_published:
+            index_entry('games', review.pk, review.title, review.slug)
+    for kind, created in (('developers', new_developers),
+                          ('publishers', new_publishers)):
+        for company in created:
+            index_entry(kind, company.pk, company.name, company.slug)
+        if created:
+            invalidate_menu(kind)
+    if new_genres:
+        for name, pk in genres.items():
+            index_entry('genres', pk, name)
+        invalidate_menu('genres')
+
+    result['created'] = reviews
+    return result
@@ -0,0 +1,154 @@
+"""
+A small database-backed job queue.
+
+Web requests call ``enqueue`` and return straight away; the run_jobs
+command claims jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+workers can share the table, and works through each job's items in
+chunks. Progress is saved after every chunk, and a failed chunk is
+retried with backoff from where the job left off.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+import datetime
+
+
+HANDLERS = {}
+
+
+def register(kind):
+    """Register ``handler(job, chunk)`` for a job kind"""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def chunk_size():
+    return getattr(settings, 'JOB_CHUNK_SIZE', 10)
+
+
+def lease():
+    """How long a claimed job stays locked without progress being saved"""
+    return datetime.timedelta(
+        seconds=getattr(settings, 'JOB_LEASE_SECONDS', 600))
+
+
+def enqueue(kind, items, user=None, max_attempts=3):
+    from .models import Job
+
+    return Job.objects.create(
+        kind=kind,
+        items=items,
+        total=len(items),
+        max_attempts=max_attempts,
+        created_by=user if user and user.is_authenticated else None,
+    )
+
+
+def claim_job():
+    """
+    Lock and return the next runnable job, or None. Running jobs whose
+    lease expired (their worker died) are claimed again.
+    """
+    from .models import Job
+
+    now = timezone.now()
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status='queued', run_after__lte=now) |
+            Q(status='running', locked_until__lt=now)
+        ).order_by('run_after', 'pk').first()
+        if job is None:
+            return None
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_until = now + lease()
+        job.save(update_fields=[
+            'status', 'attempts', 'locked_until', 'updated_on'])
+    return job
+
+
+def merge_result(result, outcome):
+    """Add counters and extend lists from a chunk's outcome"""
+    for key, value in (outcome or {}).items():
+        if isinstance(value, list):
+            result.setdefault(key, []).extend(value)
+        elif isinstance(value, (int, float)):
+            result[key] = result.get(key, 0) + value
+        else:
+            result[key] = value
+
+
+def run_job(job):
+    """Process a claimed job chunk by chunk; returns the final status"""
+    handler = HANDLERS.get(job.kind)
+    if handler is None:
+        job.status = 'failed'
+        job.error = f'No handler registered for {job.kind!r}'
+        job.finished_on = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_on',
+                                'updated_on'])
+        return job.status
+
+    size = chunk_size()
+    try:
+        while job.completed < job.total:
+            chunk = job.items[job.completed:job.completed + size]
+            merge_result(job.result, handler(job, chunk))
+            job.completed += len(chunk)
+            job.locked_until = timezone.now() + lease()
+            job.save(update_fields=[
+                'completed', 'result', 'locked_until', 'updated_on'])
+    except Exception as e:
+        job.error = str(e)
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_on = timezone.now()
+        else:
+            # Back off 30s, 60s, 120s, ... before the next attempt
+            job.status = 'queued'
+            job.run_after = timezone.now() + datetime.timedelta(
+                seconds=30 * 2 ** (job.attempts - 1))
+        job.locked_until = None
+        job.save(update_fields=[
+            'status', 'error', 'finished_on', 'run_after', 'locked_until',
+            'updated_on'])
+        return job.status
+
+    job.status = 'done'
+    job.items = []
+    job.error = ''
+    job.locked_until = None
+    job.finished_on = timezone.now()
+    job.save(update_fields=[
+        'status', 'items', 'error', 'locked_until', 'finished_on',
+        'updated_on'])
+    return job.status
+
+
+@register('populate')
+def populate_reviews(job, chunk):
+    """
+    Create reviews for a chunk of selected IGDB games (see
+    reviews.importer). Games that already have a review are skipped, so a
+    retried chunk is harmless.
+    """
+    from .ai_reviews import queue_reviews
+    from .importer import import_games
+
+    result = import_games(chunk)
+
+    # Finish the chunk's AI text before reporting it as done
+    for future in queue_reviews([review.pk for review in result['created']]):
+        future.result()
+
+    return {
+        'created': len(result['created']),
+        'skipped': result['skipped'],
+        'errors': result['errors'] + [
+            f'Skipped {title} (missing developer or publisher)'
+            for title in result['incomplete']
+        ],
+    }
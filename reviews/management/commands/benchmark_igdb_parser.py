@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from reviews.igdb_service import get_igdb_service
+from pathlib import Path
+import json
+import time
+
+
+DEFAULT_PAYLOAD = (
+    Path(__file__).resolve().parents[2] / 'benchmarks' / 'igdb_games.json')
+
+
+class Command(BaseCommand):
+    help = ('Measure IGDB response parsing throughput against a saved '
+            '/games payload')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--payload', type=str, default=str(DEFAULT_PAYLOAD),
+            help='JSON file holding a raw IGDB games response')
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Times to parse the payload per run (default: 200)')
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='Timed runs; the best one is reported (default: 5)')
+        parser.add_argument(
+            '--min-rate', type=float, default=None,
+            help='Fail if fewer games per second than this are parsed')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['payload']) as payload:
+                games = json.load(payload)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read payload: {str(e)}")
+
+        igdb_service = get_igdb_service()
+        repeat = options['repeat']
+        best = None
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                igdb_service.format_games(games)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+        parsed = len(games) * repeat
+        rate = parsed / best
+        self.stdout.write(self.style.SUCCESS(
+            f'Parsed {parsed} games in {best * 1000:.1f} ms '
+            f'({rate:,.0f} games/s, {best / parsed * 1e6:.1f} µs/game)'))
+
+        if options['min_rate'] and rate < options['min_rate']:
+            raise CommandError(
+                f'Parser throughput {rate:,.0f} games/s is below the '
+                f'required {options["min_rate"]:,.0f} games/s')
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from reviews.perf import (build_scenarios, catalogue_size, load_baseline,
+                          over_budget, run_scenario, save_baseline)
+from pathlib import Path
+
+
+DEFAULT_BASELINE = (
+    Path(__file__).resolve().parents[2] / 'benchmarks' /
+    'view_baselines.json')
+
+
+class Command(BaseCommand):
+    help = ('Measure query counts, database time and wall time of the main '
+            'pages against stored budgets (seed data with seed_catalogue)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--baseline', default=str(DEFAULT_BASELINE),
+            help='JSON file holding the budgets')
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Store this run as the new budgets instead of checking')
+        parser.add_argument(
+            '--prefix', default='Seeded',
+            help='Prefix used when the catalogue was seeded')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Measured requests per page after a warm-up (default: 5)')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='Allowed slowdown over the baseline times (default: 0.5, '
+                 'i.e. 50%%); query counts must not grow at all')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Clear every cache before each request')
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Serve anonymous pages from the page cache; by default it '
+                 'is bypassed so the views themselves are measured')
+        parser.add_argument(
+            '--only', nargs='+',
+            help='Only run these scenarios')
+
+    def handle(self, *args, **options):
+        scenarios = build_scenarios(options['prefix'])
+        if not scenarios:
+            raise CommandError(
+                f'No published reviews with prefix {options["prefix"]!r}; '
+                f'run seed_catalogue first')
+        if options['only']:
+            scenarios = [s for s in scenarios if s.name in options['only']]
+
+        baseline = load_baseline(options['baseline'])
+        budgets = baseline.get('views', {})
+        if not options['update_baseline']:
+            self.check_comparable(baseline)
+
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS
+                     if host != '*'), 'localhost')
+        results = {}
+        failures = {}
+        self.stdout.write(
+            f'{"view":<22} {"queries":>7} {"db ms":>9} {"wall ms":>9}')
+        page_cache = {} if options['page_cache'] else {
+            'PAGE_CACHE_TIMEOUT': 0}
+        for scenario in scenarios:
+            try:
+                with override_settings(**page_cache):
+                    measured = run_scenario(
+                        scenario, host, options['repeat'], options['cold'])
+            except ValueError as e:
+                raise CommandError(f'{scenario.name}: {str(e)}')
+            results[scenario.name] = measured
+
+            line = (f'{scenario.name:<22} {measured["queries"]:>7} '
+                    f'{measured["db_ms"]:>9.1f} {measured["wall_ms"]:>9.1f}')
+            budget = budgets.get(scenario.name)
+            if options['update_baseline'] or budget is None:
+                self.stdout.write(line)
+                continue
+            problems = over_budget(measured, budget, options['tolerance'])
+            if problems:
+                failures[scenario.name] = problems
+                self.stdout.write(self.style.ERROR(
+                    f'{line}  OVER: {"; ".join(problems)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+
+        if options['update_baseline']:
+            save_baseline(options['baseline'], {**budgets, **results})
+            self.stdout.write(self.style.SUCCESS(
+                f'Saved budgets for {len(results)} view(s) to '
+                f'{options["baseline"]}'))
+            return
+
+        missing = [name for name in results if name not in budgets]
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'No budget for: {", ".join(missing)} '
+                f'(record one with --update-baseline)'))
+        if failures:
+            raise CommandError(
+                f'{len(failures)} view(s) over budget: '
+                f'{", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(results) - len(missing)} view(s) within budget'))
+
+    def check_comparable(self, baseline):
+        """Warn when budgets were recorded on a different setup"""
+        if not baseline:
+            return
+        if baseline.get('database') != connection.vendor:
+            self.stdout.write(self.style.WARNING(
+                f'Budgets were recorded on {baseline.get("database")}, '
+                f'this run uses {connection.vendor}'))
+        recorded = baseline.get('catalogue', {})
+        current = catalogue_size()
+        if recorded and recorded != current:
+            self.stdout.write(self.style.WARNING(
+                f'Budgets were recorded with {recorded}, the database '
+                f'now has {current}'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from reviews.query_plans import (hot_queries, plan_text, sequential_scans,
+                                 table_rows)
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN on the queries behind the public and admin pages '
+            'and report sequential scans of large tables')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Run the queries (EXPLAIN ANALYZE) on PostgreSQL')
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help='Ignore sequential scans of tables with fewer rows, which '
+                 'the planner may rightly prefer to hash whole '
+                 '(default: 10000)')
+        parser.add_argument(
+            '--only', type=str, action='append',
+            help='Only explain queries whose name starts with this '
+                 '(repeatable)')
+
+    def handle(self, *args, **options):
+        rows = {}
+        flagged = 0
+        for name, queryset in hot_queries():
+            if options.get('only') and not name.startswith(
+                    tuple(options['only'])):
+                continue
+            scans = []
+            for table in sequential_scans(queryset, options['analyze']):
+                if table not in rows:
+                    rows[table] = table_rows(table, queryset.db)
+                if rows[table] >= options['min_rows']:
+                    scans.append(f'{table} ({rows[table]} rows)')
+
+            if scans:
+                flagged += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: sequential scan of {", ".join(scans)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if options['verbosity'] > 1 or scans:
+                self.stdout.write(plan_text(queryset, options['analyze']))
+
+        if flagged:
+            raise CommandError(
+                f'{flagged} queries scan whole tables of '
+                f'{options["min_rows"]}+ rows')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from reviews.ai_reviews import queue_reviews
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = ('Write AI review text for reviews still pending, for example '
+            'after a restart interrupted the background queue')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry reviews whose generation failed')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            Review.objects.filter(ai_review_status='failed').update(
+                ai_review_status='pending')
+        review_ids = list(Review.objects.filter(
+            ai_review_status='pending').values_list('pk', flat=True))
+        if not review_ids:
+            self.stdout.write(self.style.SUCCESS('No AI reviews pending.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Writing {len(review_ids)} AI review(s)'))
+        futures = queue_reviews(review_ids)
+        written = sum(1 for future in futures if future.result())
+        self.stdout.write(self.style.SUCCESS(
+            f'AI reviews written: {written}/{len(review_ids)}'))
+        if written < len(review_ids):
+            self.stdout.write(self.style.WARNING(
+                f'{len(review_ids) - written} failed; rerun with '
+                f'--retry-failed'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from reviews.models import Review
+from reviews.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild full-text search data for every review'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of reviews indexed per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        review_ids = list(
+            Review.objects.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(review_ids), batch_size):
+            update_search_index(review_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(review_ids)} review(s)'))
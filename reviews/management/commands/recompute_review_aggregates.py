@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = ('Rebuild stored comment, user review, rating and like counters '
+            'on reviews')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--slug', type=str, action='append',
+            help='Only rebuild the review with this slug (repeatable)')
+
+    def handle(self, *args, **options):
+        queryset = Review.objects.all()
+        if options.get('slug'):
+            queryset = queryset.filter(slug__in=options['slug'])
+
+        updated = queryset.recompute_aggregates()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed aggregates for {updated} review(s)'))
@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from reviews.models import Review
+from reviews.page_cache import purge
+from reviews.igdb_service import (MULTIQUERY_LIMIT, MULTIQUERY_RESULT_LIMIT,
+                                  build_game_snapshot, chunked,
+                                  get_igdb_service)
+import datetime
+
+
+class Command(BaseCommand):
+    help = 'Re-sync stale IGDB snapshots stored on reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='Refresh snapshots older than this many days (default: 7)')
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Maximum number of reviews to refresh')
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Number of reviews saved per UPDATE batch (default: 100)')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Refresh every review regardless of age')
+
+    def handle(self, *args, **options):
+        queryset = Review.objects.only('id', 'title', 'igdb_id')
+        if not options['all']:
+            cutoff = timezone.now() - datetime.timedelta(days=options['days'])
+            queryset = queryset.filter(
+                Q(igdb_synced_on__isnull=True) | Q(igdb_synced_on__lt=cutoff)
+            )
+        queryset = queryset.order_by('igdb_synced_on', 'id')
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+
+        reviews = list(queryset)
+        if not reviews:
+            self.stdout.write(self.style.SUCCESS('All snapshots are fresh.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshing {len(reviews)} IGDB snapshot(s)'))
+        igdb_service = get_igdb_service()
+        self.batch_size = options['batch_size']
+        self.refreshed = 0
+        self.missing = 0
+        self.pending = []
+
+        # Known games are fetched by id, thousands per request; the rest are
+        # searched by title, one multiquery per MULTIQUERY_LIMIT titles
+        by_id = [review for review in reviews if review.igdb_id]
+        by_title = [review for review in reviews if not review.igdb_id]
+
+        id_group = MULTIQUERY_LIMIT * MULTIQUERY_RESULT_LIMIT
+        for group in chunked(by_id, id_group):
+            try:
+                games = igdb_service.fetch_games_by_ids(
+                    [review.igdb_id for review in group])
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(
+                    f'Failed to refresh {len(group)} review(s) by id: '
+                    f'{str(e)}'))
+                continue
+            for review in group:
+                self.update_snapshot(review, games.get(review.igdb_id))
+
+        for group in chunked(by_title, MULTIQUERY_LIMIT):
+            try:
+                games = igdb_service.fetch_games_batch(
+                    [review.title for review in group], limit=1)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(
+                    f'Failed to refresh {len(group)} review(s) by title: '
+                    f'{str(e)}'))
+                continue
+            for review in group:
+                matches = games.get(review.title)
+                self.update_snapshot(review, matches[0] if matches else None)
+
+        if self.pending:
+            self.refreshed += self.save_batch(self.pending)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed {self.refreshed} snapshot(s), '
+            f'{self.missing} without a match'))
+
+    def update_snapshot(self, review, game):
+        """Queue a review's new snapshot, saving once a batch is full"""
+        if not game:
+            self.missing += 1
+            self.stdout.write(self.style.WARNING(
+                f'No IGDB match for {review.title}'))
+            return
+
+        review.igdb_id = game.get('id')
+        review.igdb_data = build_game_snapshot(game)
+        review.igdb_synced_on = review.updated_on = timezone.now()
+        self.pending.append(review)
+
+        if len(self.pending) >= self.batch_size:
+            self.refreshed += self.save_batch(self.pending)
+            self.pending = []
+
+    def save_batch(self, reviews):
+        """Write a batch of refreshed snapshots in a single statement"""
+        Review.objects.bulk_update(
+            reviews, ['igdb_id', 'igdb_data', 'igdb_synced_on', 'updated_on'])
+        # Snapshots are only shown on the reviews' own pages
+        purge(*(f'review:{review.pk}' for review in reviews))
+        return len(reviews)
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from reviews.fake_upstream import DEFAULT_PAYLOAD, SERVICES, FakeUpstream
+
+
+class Command(BaseCommand):
+    help = ('Serve local stand-ins for Twitch, IGDB, Cloudinary and the AI '
+            'endpoint, with optional latency and failures')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--payload', default=str(DEFAULT_PAYLOAD),
+            help='JSON file holding recorded IGDB games')
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help='Seconds added to every response (default: 0)')
+        parser.add_argument(
+            '--jitter', type=float, default=0.0,
+            help='Up to this many extra random seconds per response')
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help='Fraction of requests answered with 503 (default: 0)')
+        parser.add_argument(
+            '--throttle-rate', type=float, default=0.0,
+            help='Fraction of requests answered with 429 (default: 0)')
+        parser.add_argument(
+            '--rate-limit', type=int, default=None,
+            help='Answer 429 beyond this many requests per second and '
+                 'service, like IGDB does at 4')
+        parser.add_argument(
+            '--services', nargs='+', choices=SERVICES, default=SERVICES,
+            help='Services the latency and failures apply to (default: all)')
+        parser.add_argument(
+            '--seed', type=int, default=None,
+            help='Seed for injected latency and failures')
+        parser.add_argument(
+            '--verbose-requests', action='store_true',
+            help='Log every request')
+
+    def handle(self, *args, **options):
+        try:
+            server = FakeUpstream(
+                host=options['host'],
+                port=options['port'],
+                payload=options['payload'],
+                verbose=options['verbose_requests'],
+                latency=options['latency'],
+                jitter=options['jitter'],
+                error_rate=options['error_rate'],
+                throttle_rate=options['throttle_rate'],
+                rate_limit=options['rate_limit'],
+                services=options['services'],
+                seed=options['seed'],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot start fake upstream: {str(e)}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fake upstream listening on {server.base_url}'))
+        self.stdout.write('Point another process at it with:')
+        for name, value in server.settings().items():
+            if name == 'AI_REVIEW_TOKEN':
+                name = 'GITHUB_TOKEN'
+            self.stdout.write(f'  export {name}={value}')
+        self.stdout.write(f'Response counts: {server.base_url}/_stats')
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Served: {server.stats()}')
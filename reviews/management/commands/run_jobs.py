@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from reviews.jobs import claim_job, run_job
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (populate imports and similar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no job is ready instead of waiting for more')
+        parser.add_argument(
+            '--sleep', type=float, default=2.0,
+            help='Seconds to wait between polls when idle (default: 2)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Waiting for jobs'))
+        while True:
+            close_old_connections()
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(
+                f'Running {job.kind} job #{job.pk} '
+                f'(attempt {job.attempts}/{job.max_attempts})')
+            status = run_job(job)
+            style = (self.style.SUCCESS if status == 'done'
+                     else self.style.WARNING)
+            self.stdout.write(style(
+                f'{job.kind} job #{job.pk} {status}: {job.result}'
+                + (f' ({job.error})' if job.error else '')))
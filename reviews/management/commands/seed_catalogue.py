@@ -0,0 +1,252 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from developer.models import Developer
+from publisher.models import Publisher
+from reviews.menus import invalidate_menu
+from reviews.models import Genre, Review, UserComment, UserReview
+from reviews.search import update_search_index
+import datetime
+import random
+
+
+ADJECTIVES = [
+    'Shadow', 'Crimson', 'Silent', 'Iron', 'Lost', 'Eternal', 'Hidden',
+    'Broken', 'Golden', 'Frozen', 'Burning', 'Hollow', 'Savage', 'Neon',
+    'Ancient', 'Starlit',
+]
+NOUNS = [
+    'Kingdom', 'Legacy', 'Horizon', 'Frontier', 'Odyssey', 'Protocol',
+    'Empire', 'Requiem', 'Voyage', 'Dominion', 'Citadel', 'Tides', 'Reach',
+    'Covenant', 'Outpost', 'Arena',
+]
+GENRES = [
+    'Adventure', 'Arcade', 'Fighting', 'Indie', 'Platform', 'Puzzle',
+    'Racing', 'Role-playing (RPG)', 'Shooter', 'Simulator', 'Sport',
+    'Strategy', 'Tactical', 'Visual Novel',
+]
+PLATFORMS = [
+    'PC (Microsoft Windows)', 'PlayStation 5', 'Xbox Series X|S',
+    'Nintendo Switch', 'Mac', 'Linux',
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed a large synthetic catalogue (reviews, companies, users, '
+            'user reviews and comments) for benchmark_views')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--developers', type=int, default=2000)
+        parser.add_argument('--publishers', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--user-reviews', type=int, default=200000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument(
+            '--prefix', default='Seeded',
+            help='Name prefix marking seeded rows (default: Seeded)')
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Random seed, so the same catalogue is produced every time')
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Rows per INSERT (default: 2000)')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete rows seeded earlier with this prefix first')
+
+    def handle(self, *args, **options):
+        self.prefix = options['prefix']
+        self.username_prefix = slugify(self.prefix).replace('-', '_')
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+
+        if options['clear']:
+            self.clear()
+        if Review.objects.filter(title__startswith=f'{self.prefix} ').exists():
+            raise CommandError(
+                f'A catalogue with prefix {self.prefix!r} already exists; '
+                f'use --clear to replace it')
+        if options['user_reviews'] > options['reviews'] * options['users']:
+            raise CommandError(
+                'Each user reviews a game once, so --user-reviews cannot '
+                'exceed --reviews x --users')
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            developers = self.create_companies(
+                Developer, 'Studio', options['developers'])
+            publishers = self.create_companies(
+                Publisher, 'Publishing', options['publishers'])
+            genres = self.create_genres()
+            reviews = self.create_reviews(
+                options['reviews'], developers, publishers, genres, users)
+            self.create_user_reviews(options['user_reviews'], reviews, users)
+            self.create_comments(options['comments'], reviews, users)
+
+            self.stdout.write('Computing review counters')
+            Review.objects.filter(pk__in=reviews).recompute_aggregates()
+
+        self.stdout.write('Indexing reviews for search')
+        for start in range(0, len(reviews), 500):
+            update_search_index(reviews[start:start + 500])
+        for name in ('developers', 'publishers', 'genres'):
+            invalidate_menu(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(reviews)} reviews, {len(developers)} developers, '
+            f'{len(publishers)} publishers, {len(users)} users, '
+            f'{options["user_reviews"]} user reviews and '
+            f'{options["comments"]} comments'))
+
+    def clear(self):
+        self.stdout.write(f'Deleting catalogue {self.prefix!r}')
+        with transaction.atomic():
+            reviews = Review.objects.filter(
+                title__startswith=f'{self.prefix} ')
+            UserComment.objects.filter(review__in=reviews).delete()
+            UserReview.objects.filter(game__in=reviews).delete()
+            reviews.delete()
+            Developer.objects.filter(name__startswith=f'{self.prefix} ').delete()
+            Publisher.objects.filter(name__startswith=f'{self.prefix} ').delete()
+            User.objects.filter(
+                username__startswith=f'{self.username_prefix}_').delete()
+
+    def insert(self, model, rows):
+        """bulk_create ``rows`` in batches and return their primary keys"""
+        return [
+            obj.pk for obj in
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+        ]
+
+    def create_users(self, count):
+        self.stdout.write(f'Creating {count} users')
+        # Benchmarks log in with force_login, so no usable password
+        password = make_password(None)
+        users = [
+            User(username=f'{self.username_prefix}_user_{index}',
+                 email=f'user{index}@example.com', password=password)
+            for index in range(count)
+        ]
+        users.append(User(
+            username=f'{self.username_prefix}_admin',
+            email='admin@example.com', password=password,
+            is_staff=True, is_superuser=True))
+        return self.insert(User, users)[:count]
+
+    def create_companies(self, model, suffix, count):
+        self.stdout.write(f'Creating {count} {model._meta.verbose_name_plural}')
+        rows = []
+        for index in range(count):
+            name = f'{self.prefix} {self.random.choice(ADJECTIVES)} ' \
+                   f'{suffix} {index}'
+            rows.append(model(
+                name=name,
+                slug=slugify(name),
+                description=f'{name} makes games.',
+                website=f'https://{slugify(name)}.example.com',
+                founded_year=self.random.randint(1975, 2020),
+            ))
+        return self.insert(model, rows)
+
+    def create_genres(self):
+        Genre.objects.bulk_create(
+            [Genre(name=name) for name in GENRES], ignore_conflicts=True)
+        return dict(Genre.objects.filter(
+            name__in=GENRES).values_list('name', 'pk'))
+
+    def create_reviews(self, count, developers, publishers, genres, users):
+        self.stdout.write(f'Creating {count} reviews')
+        developer_names = dict(Developer.objects.filter(
+            pk__in=developers).values_list('pk', 'name'))
+        publisher_names = dict(Publisher.objects.filter(
+            pk__in=publishers).values_list('pk', 'name'))
+        genre_names = list(genres)
+        now = timezone.now()
+
+        rows = []
+        review_genres = []
+        for index in range(count):
+            title = (f'{self.prefix} {self.random.choice(ADJECTIVES)} '
+                     f'{self.random.choice(NOUNS)} {index}')
+            # Skewed so a few companies have hundreds of games
+            developer = developers[int(len(developers) *
+                                       self.random.random() ** 2)]
+            publisher = publishers[int(len(publishers) *
+                                       self.random.random() ** 2)]
+            names = self.random.sample(genre_names, self.random.randint(1, 3))
+            platforms = self.random.sample(
+                PLATFORMS, self.random.randint(1, 4))
+            review_date = now - datetime.timedelta(
+                minutes=self.random.randint(0, 60 * 24 * 365))
+            rows.append(Review(
+                title=title,
+                slug=slugify(title),
+                developer_id=developer,
+                publisher_id=publisher,
+                description=f'{title} is a game about '
+                            f'{" and ".join(names).lower()}.',
+                release_date=review_date.date() - datetime.timedelta(
+                    days=self.random.randint(0, 3650)),
+                review_score=self.random.randint(10, 100) / 10,
+                review_text=''.join(
+                    f'<p>Paragraph {paragraph} about {title}.</p>'
+                    for paragraph in range(6)),
+                reviewed_by_id=self.random.choice(users),
+                review_date=review_date,
+                is_featured=self.random.random() < 0.01,
+                is_published=self.random.random() < 0.95,
+                ai_review_status='ready',
+                igdb_data={
+                    'platforms': [{'name': name} for name in platforms],
+                    'release_dates': [],
+                    'genres': [{'name': name} for name in names],
+                    'developers': [{'name': developer_names[developer]}],
+                    'publishers': [{'name': publisher_names[publisher]}],
+                },
+            ))
+            review_genres.append([genres[name] for name in names])
+
+        reviews = self.insert(Review, rows)
+        self.insert(Review.genres.through, [
+            Review.genres.through(review_id=review, genre_id=genre)
+            for review, genre_ids in zip(reviews, review_genres)
+            for genre in genre_ids
+        ])
+        return reviews
+
+    def create_user_reviews(self, count, reviews, users):
+        self.stdout.write(f'Creating {count} user reviews')
+        # Every game gets count / len(reviews) reviews from distinct users
+        for start in range(0, count, self.batch_size):
+            rows = []
+            for index in range(start, min(start + self.batch_size, count)):
+                game = index % len(reviews)
+                user = (game * 7919 + index // len(reviews)) % len(users)
+                rows.append(UserReview(
+                    game_id=reviews[game],
+                    user_id=users[user],
+                    rating=self.random.randint(1, 10),
+                    review_text='Seeded user review. ' * 5,
+                    approved=self.random.random() < 0.9,
+                    helpful_votes=self.random.randint(0, 50),
+                ))
+            UserReview.objects.bulk_create(rows)
+
+    def create_comments(self, count, reviews, users):
+        self.stdout.write(f'Creating {count} comments')
+        for start in range(0, count, self.batch_size):
+            UserComment.objects.bulk_create([
+                UserComment(
+                    # Heavily skewed towards the first games seeded
+                    review_id=reviews[int(len(reviews) *
+                                          self.random.random() ** 4)],
+                    author_id=self.random.choice(users),
+                    body='Seeded comment. ' * 3,
+                    approved=self.random.random() < 0.9,
+                )
+                for _ in range(start, min(start + self.batch_size, count))
+            ])
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from .page_cache import purge
+from .timing import record_cache
+import time
+
+
+def menu_version_key(name):
+    return f'menu:{name}:version'
+
+
+def get_menu_version(name):
+    """Return the current cache version for a navbar menu"""
+    key = menu_version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp so an evicted version key can never bring
+        # back data cached under an older version
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_menu(name, build):
+    """Return menu items from the cache, building them on a miss"""
+    key = f'menu:{name}:{get_menu_version(name)}'
+    items = cache.get(key)
+    record_cache(items is not None)
+    if items is None:
+        items = build()
+        cache.set(key, items, getattr(settings, 'MENU_CACHE_TIMEOUT', 300))
+    return items
+
+
+def lazy_menu(name, build):
+    """Defer the cache (and database) lookup until a template uses it"""
+    return SimpleLazyObject(lambda: get_menu(name, build))
+
+
+def bump_menu_version(name):
+    key = menu_version_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_menu(name):
+    """
+    Bump a menu's version after commit so the next render rebuilds it,
+    and purge the cached pages whose navbar shows it
+    """
+    # Bumping before commit would let a render in between cache the old
+    # items under the new version
+    transaction.on_commit(lambda: bump_menu_version(name))
+    purge(f'menu:{name}')
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0003_genre_review_genres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='igdb_data',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='igdb_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='igdb_synced_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
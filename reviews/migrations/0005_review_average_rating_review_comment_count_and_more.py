@@ -0,0 +1,74 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+def backfill_aggregates(apps, schema_editor):
+    Review = apps.get_model('reviews', 'Review')
+    UserComment = apps.get_model('reviews', 'UserComment')
+    UserReview = apps.get_model('reviews', 'UserReview')
+
+    comments = dict(
+        UserComment.objects.filter(approved=True).values('review')
+        .annotate(total=models.Count('pk')).values_list('review', 'total')
+    )
+    ratings = {
+        row['game']: row for row in
+        UserReview.objects.filter(approved=True).values('game')
+        .annotate(total=models.Count('pk'), rating=models.Sum('rating'))
+    }
+    likes = dict(
+        Review.likes.through.objects.values('review')
+        .annotate(total=models.Count('pk')).values_list('review', 'total')
+    )
+
+    reviews = list(Review.objects.only('pk'))
+    for review in reviews:
+        rating = ratings.get(review.pk)
+        review.comment_count = comments.get(review.pk, 0)
+        review.like_count = likes.get(review.pk, 0)
+        if rating:
+            review.user_review_count = rating['total']
+            review.rating_total = rating['rating']
+            review.average_rating = round(
+                rating['rating'] / rating['total'], 1)
+    Review.objects.bulk_update(reviews, [
+        'comment_count', 'user_review_count', 'rating_total',
+        'average_rating', 'like_count',
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0004_review_igdb_data_review_igdb_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='average_rating',
+            field=models.DecimalField(blank=True, decimal_places=1, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='user_review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
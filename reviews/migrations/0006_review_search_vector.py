@@ -0,0 +1,117 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:12
+
+import django.contrib.postgres.search
+from django.db import DatabaseError, migrations, transaction
+
+
+POSTGRES_BACKFILL = """
+UPDATE reviews_review AS r SET search_vector =
+    setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(g.name, ' ')
+        FROM reviews_genre g
+        JOIN reviews_review_genres rg ON rg.genre_id = g.id
+        WHERE rg.review_id = r.id
+    ), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT d.name FROM developer_developer d WHERE d.id = r.developer_id
+    ), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT p.name FROM publisher_publisher p WHERE p.id = r.publisher_id
+    ), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(r.description, '')), 'C')
+"""
+
+SQLITE_BACKFILL = """
+INSERT INTO reviews_review_fts
+    (rowid, title, genres, developer, publisher, description)
+SELECT r.id, r.title,
+    coalesce((
+        SELECT group_concat(g.name, ' ')
+        FROM reviews_genre g
+        JOIN reviews_review_genres rg ON rg.genre_id = g.id
+        WHERE rg.review_id = r.id
+    ), ''),
+    coalesce(d.name, ''), coalesce(p.name, ''), r.description
+FROM reviews_review r
+LEFT JOIN developer_developer d ON d.id = r.developer_id
+LEFT JOIN publisher_publisher p ON p.id = r.publisher_id
+"""
+
+TRIGRAM_INDEXES = (
+    ('reviews_review_title_trgm_idx', 'reviews_review', 'title'),
+    ('developer_name_trgm_idx', 'developer_developer', 'name'),
+    ('publisher_name_trgm_idx', 'publisher_publisher', 'name'),
+)
+
+
+def create_search_structures(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX reviews_review_search_vector_idx '
+                'ON reviews_review USING gin (search_vector)'
+            )
+            cursor.execute(POSTGRES_BACKFILL)
+
+            # Trigram typo matching is optional: it needs pg_trgm, which not
+            # every host provides or lets us install
+            cursor.execute(
+                "SELECT 1 FROM pg_available_extensions "
+                "WHERE name = 'pg_trgm'"
+            )
+            if cursor.fetchone() is None:
+                return
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            except DatabaseError:
+                return
+            for name, table, column in TRIGRAM_INDEXES:
+                cursor.execute(
+                    f'CREATE INDEX {name} ON {table} '
+                    f'USING gin ({column} gin_trgm_ops)'
+                )
+
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                'CREATE VIRTUAL TABLE reviews_review_fts USING fts5('
+                'title, genres, developer, publisher, description, '
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                'CREATE VIRTUAL TABLE reviews_review_fts_vocab '
+                "USING fts5vocab(reviews_review_fts, 'row')"
+            )
+            cursor.execute(SQLITE_BACKFILL)
+
+
+def drop_search_structures(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS reviews_review_search_vector_idx')
+            for name, table, column in TRIGRAM_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('DROP TABLE IF EXISTS reviews_review_fts_vocab')
+            cursor.execute('DROP TABLE IF EXISTS reviews_review_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_review_average_rating_review_comment_count_and_more'),
+        ('developer', '0004_developer_developer_name_lower_idx'),
+        ('publisher', '0004_publisher_publisher_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_review_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='ai_review_status',
+            field=models.CharField(blank=True, choices=[('', 'Not requested'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='GeneratedReview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('prompt_version', models.PositiveSmallIntegerField()),
+                ('content', models.TextField()),
+                ('model', models.CharField(max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Generated Review',
+                'verbose_name_plural': 'Generated Reviews',
+                'unique_together': {('title', 'prompt_version')},
+            },
+        ),
+    ]
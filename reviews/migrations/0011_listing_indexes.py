@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_review_updated_on_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['updated_on'], name='genre_updated_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['title', 'id'], name='review_published_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['review_date', 'id'], name='review_published_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_featured', True), ('is_published', True)), fields=['created_on'], name='review_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_on', 'id'], name='review_created_on_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercomment',
+            index=models.Index(fields=['review', 'approved', 'created_on'], name='comment_review_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercomment',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['created_on', 'id'], name='comment_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usercomment',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['created_on', 'id'], name='comment_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreview',
+            index=models.Index(fields=['game', 'approved', 'created_on'], name='userreview_game_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreview',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['created_on', 'id'], name='userreview_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreview',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['created_on', 'id'], name='userreview_approved_idx'),
+        ),
+    ]
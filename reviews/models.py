@@ -1,12 +1,116 @@
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 from developer.models import Developer
 from publisher.models import Publisher
+from .page_cache import purge, purge_reviews, review_page_keys
 # Create your models here.
 
 
+def average_rating_expression():
+    """SQL expression deriving the average rating from the stored totals"""
+    return models.Case(
+        models.When(user_review_count=0, then=models.Value(None)),
+        default=Round(
+            Cast('rating_total', models.FloatField()) /
+            models.F('user_review_count'),
+            1
+        ),
+        output_field=models.DecimalField(max_digits=3, decimal_places=1),
+    )
+
+
+def adjust_review_aggregates(review_id, comments=0, reviews=0, rating=0):
+    """
+    Apply deltas to the stored counters of a single review.
+
+    Uses F() expressions so concurrent updates never overwrite each other.
+    """
+    if not (comments or reviews or rating):
+        return
+    queryset = Review.objects.filter(pk=review_id)
+    with transaction.atomic():
+        queryset.update(
+            comment_count=models.F('comment_count') + comments,
+            user_review_count=models.F('user_review_count') + reviews,
+            rating_total=models.F('rating_total') + rating,
+            updated_on=timezone.now(),
+        )
+        if reviews or rating:
+            queryset.update(average_rating=average_rating_expression())
+    # Counters are shown on the review's cards as well as its page
+    purge_reviews([review_id])
+
+
+class ReviewQuerySet(models.QuerySet):
+
+    def for_cards(self):
+        """
+        Prepare reviews for list/card templates: join the developer and
+        publisher and skip the columns cards never display.
+        """
+        return self.select_related('developer', 'publisher').defer(
+            'review_text', 'igdb_data')
+
+    def update_and_purge(self, **kwargs):
+        """
+        update() that also purges the cached pages showing these reviews,
+        both before the change (unpublished, unfeatured) and after it
+        """
+        review_ids = list(self.values_list('pk', flat=True))
+        keys = review_page_keys(review_ids)
+        updated = self.update(updated_on=timezone.now(), **kwargs)
+        purge(*keys, *review_page_keys(review_ids))
+        return updated
+
+    def touch(self):
+        """
+        Mark these reviews as changed without saving them, which moves the
+        version reviews.conditional derives their pages' ETags from
+        """
+        return self.update(updated_on=timezone.now())
+
+    def recompute_aggregates(self):
+        """
+        Rebuild the stored counters for these reviews from the comment,
+        user review and like tables in a single UPDATE
+        """
+        approved_comments = UserComment.objects.filter(
+            review=models.OuterRef('pk'), approved=True
+        ).values('review')
+        approved_reviews = UserReview.objects.filter(
+            game=models.OuterRef('pk'), approved=True
+        ).values('game')
+        likes = Review.likes.through.objects.filter(
+            review=models.OuterRef('pk')
+        ).values('review')
+
+        def grouped(queryset, aggregate):
+            return Coalesce(
+                models.Subquery(
+                    queryset.annotate(value=aggregate).values('value')[:1]
+                ),
+                0
+            )
+
+        with transaction.atomic():
+            updated = self.update(
+                comment_count=grouped(approved_comments, models.Count('pk')),
+                user_review_count=grouped(
+                    approved_reviews, models.Count('pk')),
+                rating_total=grouped(approved_reviews, models.Sum('rating')),
+                like_count=grouped(likes, models.Count('pk')),
+                updated_on=timezone.now(),
+            )
+            self.update(average_rating=average_rating_expression())
+        purge_reviews(self.values_list('pk', flat=True))
+        return updated
+
+
 class Review(models.Model):
     title = models.CharField(max_length=200, unique=True)
     slug = models.SlugField(max_length=200, unique=True)
@@ -41,10 +145,62 @@ class Review(models.Model):
     likes = models.ManyToManyField(User, related_name='game_likes', blank=True)
     views = models.PositiveIntegerField(default=0)
 
+    # IGDB snapshot (platforms, genres, release dates and companies) saved at
+    # import so detail pages never need to call IGDB
+    igdb_id = models.PositiveBigIntegerField(blank=True, null=True)
+    igdb_data = models.JSONField(default=dict, blank=True)
+    igdb_synced_on = models.DateTimeField(blank=True, null=True)
+
+    # Denormalized aggregates, maintained by reviews.signals and the
+    # approve() queryset methods; rebuild with recompute_review_aggregates
+    comment_count = models.PositiveIntegerField(default=0)
+    user_review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    average_rating = models.DecimalField(
+        max_digits=3, decimal_places=1, blank=True, null=True)
+    like_count = models.PositiveIntegerField(default=0)
+
+    # Progress of the AI-written review_text (see reviews.ai_reviews)
+    AI_REVIEW_STATUS_CHOICES = [
+        ('', 'Not requested'),
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    ai_review_status = models.CharField(
+        max_length=10, choices=AI_REVIEW_STATUS_CHOICES, blank=True,
+        default='')
+
+    # Full-text search data on PostgreSQL (GIN indexed by migration 0006);
+    # maintained by reviews.search, SQLite uses an FTS5 table instead
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    objects = ReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_on']
         verbose_name = 'Game'
         verbose_name_plural = 'Games'
+        indexes = [
+            # Newest change, read by every conditional GET of a list page
+            models.Index(fields=['updated_on'],
+                         name='review_updated_on_idx'),
+            # Public listings, paged by (sort column, id) keyset cursors
+            models.Index(fields=['title', 'id'],
+                         condition=models.Q(is_published=True),
+                         name='review_published_title_idx'),
+            models.Index(fields=['review_date', 'id'],
+                         condition=models.Q(is_published=True),
+                         name='review_published_date_idx'),
+            # The featured carousel, newest first
+            models.Index(fields=['created_on'],
+                         condition=models.Q(is_featured=True,
+                                            is_published=True),
+                         name='review_featured_idx'),
+            # The populate page's table of every review, newest first
+            models.Index(fields=['created_on', 'id'],
+                         name='review_created_on_idx'),
+        ]
 
     def __str__(self):
         if self.review_score is not None:
@@ -54,21 +210,65 @@ class Review(models.Model):
         return f"{self.title} | Score: {score_display}"
 
     def number_of_likes(self):
-        return self.likes.count()
+        return self.like_count
+
+
+class GeneratedReview(models.Model):
+    """
+    AI review text cached per game title and prompt version, with the
+    cost of producing it
+    """
+    title = models.CharField(max_length=200)
+    prompt_version = models.PositiveSmallIntegerField()
+    content = models.TextField()
+    model = models.CharField(max_length=100)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('title', 'prompt_version')
+        verbose_name = 'Generated Review'
+        verbose_name_plural = 'Generated Reviews'
+
+    def __str__(self):
+        return f"{self.title} (prompt v{self.prompt_version})"
 
 
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # Part of the catalogue version behind every page's ETag (the navbar
+    # lists the genres)
+    updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Genre'
         verbose_name_plural = 'Genres'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_on'], name='genre_updated_on_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class UserCommentQuerySet(models.QuerySet):
+
+    def approve(self):
+        """Approve comments and update review counters per review"""
+        with transaction.atomic():
+            pending = self.filter(approved=False)
+            per_review = pending.values('review').annotate(
+                total=models.Count('pk'))
+            deltas = {row['review']: row['total'] for row in per_review}
+            updated = pending.update(approved=True)
+            for review_id, total in deltas.items():
+                adjust_review_aggregates(review_id, comments=total)
+        return updated
+
+
 class UserComment(models.Model):
     review = models.ForeignKey(
         Review, on_delete=models.CASCADE, related_name="user_comments")
@@ -78,8 +278,24 @@ class UserComment(models.Model):
     approved = models.BooleanField(default=False)
     created_on = models.DateTimeField(auto_now_add=True)
 
+    objects = UserCommentQuerySet.as_manager()
+
     class Meta:
         ordering = ["created_on"]
+        indexes = [
+            # A review's approved comments, newest first
+            models.Index(fields=['review', 'approved', 'created_on'],
+                         name='comment_review_approved_idx'),
+            # The approval queue and recently approved comments, as
+            # partial indexes: SQLite cannot search an index for a bare
+            # boolean condition ("WHERE approved")
+            models.Index(fields=['created_on', 'id'],
+                         condition=models.Q(approved=False),
+                         name='comment_pending_idx'),
+            models.Index(fields=['created_on', 'id'],
+                         condition=models.Q(approved=True),
+                         name='comment_approved_idx'),
+        ]
         verbose_name = 'User Comment'
         verbose_name_plural = 'User Comments'
 
@@ -87,6 +303,43 @@ class UserComment(models.Model):
         review_title = self.review.title if self.review else "Unknown Review"
         return f"Comment by {self.author} on {review_title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to its review's counters
+        if {'review_id', 'approved'}.issubset(field_names):
+            instance._aggregate_state = instance.aggregate_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            # The counters include the row as it was just loaded
+            self._aggregate_state = self.aggregate_state()
+
+    def aggregate_state(self):
+        """Return the review id and this comment's share of its counters"""
+        return (self.review_id, {'comments': 1 if self.approved else 0})
+
+
+class UserReviewQuerySet(models.QuerySet):
+
+    def approve(self):
+        """Approve user reviews and update review counters per game"""
+        with transaction.atomic():
+            pending = self.filter(approved=False)
+            per_game = pending.values('game').annotate(
+                total=models.Count('pk'), rating=models.Sum('rating'))
+            deltas = {
+                row['game']: (row['total'], row['rating'])
+                for row in per_game
+            }
+            updated = pending.update(approved=True)
+            for game_id, (total, rating) in deltas.items():
+                adjust_review_aggregates(
+                    game_id, reviews=total, rating=rating)
+        return updated
+
 
 class UserReview(models.Model):
     game = models.ForeignKey(
@@ -99,10 +352,101 @@ class UserReview(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     helpful_votes = models.PositiveIntegerField(default=0)
 
+    objects = UserReviewQuerySet.as_manager()
+
     class Meta:
         unique_together = ('game', 'user')  # One review per user per game
+        indexes = [
+            # A game's approved user reviews, newest first
+            models.Index(fields=['game', 'approved', 'created_on'],
+                         name='userreview_game_approved_idx'),
+            # The approval queue and recently approved user reviews, as
+            # partial indexes: SQLite cannot search an index for a bare
+            # boolean condition ("WHERE approved")
+            models.Index(fields=['created_on', 'id'],
+                         condition=models.Q(approved=False),
+                         name='userreview_pending_idx'),
+            models.Index(fields=['created_on', 'id'],
+                         condition=models.Q(approved=True),
+                         name='userreview_approved_idx'),
+        ]
         verbose_name = 'User Review'
         verbose_name_plural = 'User Reviews'
 
     def __str__(self):
         return f"{self.user.username}'s review of {self.game.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to its game's counters
+        if {'game_id', 'approved', 'rating'}.issubset(field_names):
+            instance._aggregate_state = instance.aggregate_state()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            # The counters include the row as it was just loaded
+            self._aggregate_state = self.aggregate_state()
+
+    def aggregate_state(self):
+        """Return the game id and this review's share of its counters"""
+        if self.approved:
+            return (self.game_id, {'reviews': 1, 'rating': self.rating})
+        return (self.game_id, {'reviews': 0, 'rating': 0})
+
+
+class Job(models.Model):
+    """
+    Background work run by the run_jobs command (see reviews.jobs).
+
+    ``items`` are processed in chunks; ``completed`` records how far the
+    job got so a retry resumes from the last finished chunk.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind = models.CharField(max_length=50)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='queued')
+    items = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+    finished_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_on']
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='reviews_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} ({self.status})"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket shared by every thread and process calling an upstream
+    API (see reviews.throttle)
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    tokens = models.FloatField()
+    updated_on = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.2f} token(s)"
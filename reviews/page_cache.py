@@ -0,0 +1,251 @@
+"""
+Full-page cache for anonymous GET requests.
+
+Views wrapped with ``cache_anonymous_page`` tag their response with
+surrogate keys (``add_surrogate_keys``), such as ``review:<id>``,
+``developer:<id>`` or ``reviews`` for pages listing review cards. Each key
+has a version in the cache, and a page is only served while every key it
+was stored with still has the same version. ``purge`` bumps versions
+once the current transaction commits, so exactly the pages showing the
+changed rows are rebuilt.
+
+Every page also carries the navbar menu keys (bumped by
+``menus.invalidate_menu``) and ``all``. Bodies are stored gzipped and
+sent as-is to clients that accept gzip.
+
+With a per-process cache backend, a purge only reaches the process that
+made the change; PAGE_CACHE_TIMEOUT bounds how stale other processes get.
+Pages behind ``reviews.conditional`` are also keyed by their database
+version, which every process sees at once.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from functools import wraps
+from urllib.parse import urlencode
+from .timing import record_cache
+import gzip
+import hashlib
+import time
+
+
+# Keys carried by every cached page
+GLOBAL_KEYS = ('all', 'menu:genres', 'menu:developers', 'menu:publishers')
+
+# Query parameters that never change the page
+IGNORED_PARAMS = {'fbclid', 'gclid', 'msclkid'}
+
+# Purging more reviews than this at once drops the whole cache instead
+PURGE_ALL_THRESHOLD = 500
+
+# Response headers recomputed per response rather than stored
+SKIPPED_HEADERS = {'content-length', 'content-encoding', 'vary'}
+
+
+def get_page_cache():
+    alias = getattr(settings, 'PAGE_CACHE_ALIAS', 'pages')
+    if alias not in settings.CACHES:
+        alias = 'default'
+    return caches[alias]
+
+
+def tag_key(key):
+    # Keys such as genre:<name> hold arbitrary text (genre names come from
+    # the query string), which is not a valid memcached key
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return f'page-tag:{digest}'
+
+
+def normalized_query(request):
+    """The query string with its parameters sorted and tracking removed"""
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        if not name.startswith('utm_') and name not in IGNORED_PARAMS
+        for value in values
+    )
+    return urlencode(params)
+
+
+def page_cache_key(request):
+    version = getattr(settings, 'PAGE_CACHE_VERSION', 1)
+    location = f'{request.path}?{normalized_query(request)}'
+    # Pages with a database version (reviews.conditional) are stored per
+    # version, so other processes never serve one older than the data
+    location += getattr(request, '_page_etag', '')
+    digest = hashlib.sha1(location.encode()).hexdigest()
+    return f'page:{version}:{digest}'
+
+
+def add_surrogate_keys(request, *keys):
+    """Tag the page being rendered for ``request`` with ``keys``"""
+    if not hasattr(request, '_surrogate_keys'):
+        request._surrogate_keys = set()
+    request._surrogate_keys.update(keys)
+
+
+def bump(keys):
+    # Versions are timestamps so an evicted tag can never match a page
+    # stored under an older version
+    now = time.time_ns()
+    get_page_cache().set_many(
+        {tag_key(key): now for key in keys}, timeout=None)
+
+
+def purge(*keys):
+    """Invalidate every page tagged with any of ``keys`` after commit"""
+    keys = set(keys)
+    if keys:
+        transaction.on_commit(lambda: bump(keys))
+
+
+def review_page_keys(review_ids):
+    """
+    Surrogate keys of the pages showing these reviews: their detail
+    pages, company pages and genre lists, the review lists, and the
+    featured carousel if any of them is featured
+    """
+    from .models import Genre, Review
+
+    review_ids = list(review_ids)
+    if not review_ids:
+        return set()
+    if len(review_ids) > PURGE_ALL_THRESHOLD:
+        return {'all'}
+    keys = {'reviews'}
+    for pk, developer_id, publisher_id, is_featured in (
+        Review.objects.filter(pk__in=review_ids).values_list(
+            'pk', 'developer_id', 'publisher_id', 'is_featured')
+    ):
+        keys.update((f'review:{pk}', f'developer:{developer_id}',
+                     f'publisher:{publisher_id}'))
+        if is_featured:
+            keys.add('featured')
+    keys.update(
+        f'genre:{name.lower()}' for name in Genre.objects.filter(
+            reviews__in=review_ids).values_list('name', flat=True).distinct()
+    )
+    return keys
+
+
+def purge_reviews(review_ids, *keys):
+    """Purge the pages showing these reviews, plus any extra ``keys``"""
+    purge(*review_page_keys(review_ids), *keys)
+
+
+def anonymous_request(request):
+    """A GET or HEAD whose page is the same for every anonymous visitor"""
+    return (
+        request.method in ('GET', 'HEAD') and
+        # Pending flash messages are rendered into the page
+        'messages' not in request.COOKIES and
+        not request.user.is_authenticated
+    )
+
+
+def cacheable_request(request):
+    return (
+        getattr(settings, 'PAGE_CACHE_TIMEOUT', 0) and
+        anonymous_request(request)
+    )
+
+
+def cacheable_response(request, response):
+    return (
+        response.status_code == 200 and
+        not response.streaming and
+        not response.cookies and
+        # The page rendered a CSRF token, which must not be shared
+        not request.META.get('CSRF_COOKIE_NEEDS_UPDATE') and
+        'private' not in response.get('Cache-Control', '') and
+        'no-store' not in response.get('Cache-Control', '')
+    )
+
+
+def tag_versions(cache, keys, started):
+    """
+    Current versions of ``keys``, or None if one was purged after
+    ``started`` (the page may show data from before the change)
+    """
+    stored = cache.get_many([tag_key(key) for key in keys])
+    versions = {}
+    for key in keys:
+        version = stored.get(tag_key(key))
+        if version is None:
+            version = time.time_ns()
+            if not cache.add(tag_key(key), version, timeout=None):
+                version = cache.get(tag_key(key))
+                if version is None or version > started:
+                    return None
+        elif version > started:
+            return None
+        versions[key] = version
+    return versions
+
+
+def is_current(cache, entry):
+    keys = list(entry['versions'])
+    stored = cache.get_many([tag_key(key) for key in keys])
+    return all(
+        stored.get(tag_key(key)) == version
+        for key, version in entry['versions'].items()
+    )
+
+
+def cached_response(request, entry, hit):
+    """Build the response for a stored page, gzipped when accepted"""
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(entry['body'], status=entry['status'])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(
+            gzip.decompress(entry['body']), status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    patch_vary_headers(response, ['Accept-Encoding', 'Cookie'])
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def cache_anonymous_page(view):
+    """Serve ``view`` from the page cache for anonymous GET requests"""
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not cacheable_request(request):
+            return view(request, *args, **kwargs)
+
+        cache = get_page_cache()
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and is_current(cache, entry):
+            record_cache(True)
+            return cached_response(request, entry, hit=True)
+        record_cache(False)
+
+        started = time.time_ns()
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if not cacheable_response(request, response):
+            return response
+
+        keys = set(GLOBAL_KEYS) | getattr(request, '_surrogate_keys', set())
+        versions = tag_versions(cache, keys, started)
+        if versions is None:
+            return response
+        entry = {
+            'status': response.status_code,
+            'headers': [
+                (name, value) for name, value in response.items()
+                if name.lower() not in SKIPPED_HEADERS
+            ],
+            'body': gzip.compress(response.content, compresslevel=6),
+            'versions': versions,
+        }
+        cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+        return cached_response(request, entry, hit=False)
+
+    return wrapped
@@ -0,0 +1,220 @@
+"""
+Keyset (cursor) pagination.
+
+OFFSET pagination reads and throws away every row before the page, so
+deep pages get slower the further in they are. CursorPaginator carries
+on from the sort value and id of the last row shown instead
+(``WHERE title >= %s AND (title > %s OR id > %s) ORDER BY title, id``),
+so with the sort column indexed every page costs the same as the first.
+
+Positions travel between pages as opaque signed tokens in the ``cursor``
+query parameter. A token also records its page's offset, so templates can
+still show "Showing 33-48 of N" and "Page 3 of M", and it is signed per
+ordering, so a token from another sort just gives the first page. N comes
+from ``reviews.counts.cached_count``, or from the page itself when it is
+the last one.
+
+Querysets are ordered by one column, which gets ``id`` as a tiebreaker in
+the same direction. NULLs in a nullable sort column come last either way.
+"""
+from collections.abc import Sequence
+from django.core import signing
+from django.db.models import Q
+from django.utils.functional import cached_property
+from .counts import cached_count
+import math
+
+
+class CursorPage(Sequence):
+
+    def __init__(self, object_list, paginator, offset, cursor=None,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.offset = offset
+        # The token this page was requested with (None on the first page)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Page {self.number} of {self.paginator.num_pages}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def number(self):
+        return self.offset // self.paginator.per_page + 1
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def start_index(self):
+        return self.offset + 1 if self.object_list else 0
+
+    def end_index(self):
+        return self.offset + len(self.object_list)
+
+
+class CursorPaginator:
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        ordering = object_list.query.order_by or (
+            object_list.query.get_meta().ordering
+            if object_list.query.default_ordering else ())
+        if len(ordering) != 1 or not isinstance(ordering[0], str):
+            raise ValueError(
+                f'CursorPaginator needs a queryset ordered by one field, '
+                f'not {ordering!r}')
+        self.descending = ordering[0].startswith('-')
+        self.key = ordering[0].lstrip('-')
+        self.field = object_list.model._meta.get_field(
+            object_list.model._meta.pk.name if self.key == 'pk' else self.key)
+        self.salt = f'reviews.pagination:{object_list.model._meta.label}:' \
+                    f'{ordering[0]}'
+        # Rows known to exist from the pages built so far
+        self.shown = 0
+
+    @cached_property
+    def count(self):
+        # An estimate, or a count cached before rows were added, is never
+        # allowed below what the page already shows
+        return max(cached_count(self.object_list), self.shown)
+
+    @cached_property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def encode(self, row, offset, backwards=False):
+        value = getattr(row, self.field.attname)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return signing.dumps(
+            [value, row.pk, offset, backwards], salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        """(value, pk, offset, backwards) of ``cursor``, or None"""
+        try:
+            value, pk, offset, backwards = signing.loads(
+                cursor, salt=self.salt)
+            if value is not None:
+                value = self.field.to_python(value)
+            return value, pk, max(int(offset), 0), bool(backwards)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+
+    def segments(self, position, backwards):
+        """
+        (filter, ordering) pairs that list the rows after ``position`` in
+        order, or the rows before it in reverse order if ``backwards``
+        """
+        upwards = self.descending == backwards
+        sign = '' if upwards else '-'
+        by_value = [f'{sign}{self.key}', f'{sign}pk']
+        by_pk = [f'{sign}pk']
+        values, nulls = Q(), None
+        if self.field.null:
+            values = Q(**{f'{self.key}__isnull': False})
+            nulls = Q(**{f'{self.key}__isnull': True})
+
+        if position is not None:
+            value, pk = position
+            after = 'gt' if upwards else 'lt'
+            if value is None:
+                # Among the NULLs, which sort last, only the id is left
+                nulls &= Q(**{f'pk__{after}': pk})
+                if not backwards:
+                    values = None
+            else:
+                # The first condition alone bounds an index range scan
+                bound = 'gte' if upwards else 'lte'
+                values = (
+                    Q(**{f'{self.key}__{bound}': value}) &
+                    (Q(**{f'{self.key}__{after}': value}) |
+                     Q(**{f'pk__{after}': pk}))
+                )
+                if backwards:
+                    nulls = None
+
+        segments = [(values, by_value), (nulls, by_pk)]
+        if backwards:
+            segments.reverse()
+        return [segment for segment in segments if segment[0] is not None]
+
+    def fetch(self, position, backwards, limit):
+        rows = []
+        for condition, ordering in self.segments(position, backwards):
+            rows += self.object_list.filter(condition).order_by(
+                *ordering)[:limit - len(rows)]
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def page(self, cursor=None):
+        """The page at ``cursor``; the first page if it is missing or bad"""
+        decoded = self.decode(cursor) if cursor else None
+        if decoded is None:
+            return self.first_page()
+        value, pk, offset, backwards = decoded
+
+        rows = self.fetch((value, pk), backwards, self.per_page + 1)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            if not more:
+                # Back at the start, which is only a full page if no rows
+                # before it went away
+                if len(rows) < self.per_page:
+                    return self.first_page()
+                return self.build_page(rows, 0, next_page=True)
+            return self.build_page(rows, offset, cursor, previous_page=True,
+                                   next_page=True)
+        if not rows:
+            return self.first_page()
+        return self.build_page(rows, offset, cursor, previous_page=True,
+                               next_page=more)
+
+    def build_page(self, rows, offset, cursor=None, previous_page=False,
+                   next_page=False):
+        page = CursorPage(
+            rows, self, offset, cursor,
+            next_cursor=(self.encode(rows[-1], offset + len(rows))
+                         if next_page else None),
+            previous_cursor=(self.encode(
+                rows[0], max(offset - self.per_page, 0), backwards=True)
+                if previous_page else None),
+        )
+        if next_page:
+            self.shown = max(self.shown, page.end_index() + 1)
+        else:
+            # The last page ends at the exact count, no COUNT needed
+            self.count = page.end_index()
+        return page
+
+    def first_page(self):
+        rows = self.fetch(None, False, self.per_page + 1)
+        return self.build_page(rows[:self.per_page], 0,
+                               next_page=len(rows) > self.per_page)
+
+
+class CursorPaginationMixin:
+    """ListView pagination by ``?cursor=`` tokens instead of page numbers"""
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,193 @@
+"""
+View performance measurement for ``manage.py benchmark_views``.
+
+Each scenario requests a page through the test client and records the
+number of SQL queries, the time spent in the database and the wall time.
+The medians are compared with budgets stored in a baseline file: a view
+fails if it runs more queries than its baseline, or if its database or
+wall time exceeds the baseline by more than the allowed tolerance.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from developer.models import Developer
+from publisher.models import Publisher
+from .models import Review, UserComment, UserReview
+from .pagination import CursorPaginator
+from .views import ReviewList
+from urllib.parse import urlencode
+import json
+import statistics
+import time
+
+
+# Time budgets never go below the baseline plus this many milliseconds, so
+# views that take a few milliseconds are not failed by timer noise
+MIN_SLACK_MS = 5
+
+
+class QueryTimer:
+    """Count queries and time spent in the database while installed"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+
+class Scenario:
+
+    def __init__(self, name, url, user=None):
+        self.name = name
+        self.url = url
+        self.user = user
+
+
+def build_scenarios(prefix):
+    """
+    Pages of the seeded catalogue worth measuring: the largest detail
+    pages and company pages, and the busiest user's profile
+    """
+    seeded = Review.objects.filter(
+        title__startswith=f'{prefix} ', is_published=True)
+    review = seeded.order_by('-comment_count', 'pk').first()
+    if review is None:
+        return []
+    developer = Developer.objects.annotate(
+        total=Count('games')).order_by('-total', 'pk').first()
+    publisher = Publisher.objects.annotate(
+        total=Count('reviews')).order_by('-total', 'pk').first()
+    busiest = UserComment.objects.filter(review__in=seeded).values(
+        'author').annotate(total=Count('pk')).order_by('-total').first()
+    member = User.objects.get(pk=busiest['author']) if busiest else None
+    admin = User.objects.filter(is_superuser=True).order_by('pk').first()
+    search_term = review.title.split()[1]
+    # The cursor of a page from the middle of the list, which must cost no
+    # more than the first page
+    newest = Review.objects.filter(
+        is_published=True).order_by('-review_date')
+    middle = newest.count() // ReviewList.paginate_by // 2 * \
+        ReviewList.paginate_by
+    cursor = CursorPaginator(newest, ReviewList.paginate_by).encode(
+        newest[max(middle - 1, 0)], middle)
+
+    scenarios = [
+        Scenario('home', reverse('home:home')),
+        Scenario('review_list', reverse('reviews:review_list')),
+        Scenario('review_list_newest',
+                 reverse('reviews:review_list') +
+                 f'?{urlencode({"sort": "newest", "cursor": cursor})}'),
+        Scenario('review_detail',
+                 reverse('reviews:review_detail', args=[review.slug])),
+        Scenario('review_detail_member',
+                 reverse('reviews:review_detail', args=[review.slug]),
+                 member),
+        Scenario('search_games',
+                 reverse('reviews:search_games') + f'?q={search_term}'),
+        Scenario('developer_games',
+                 reverse('developer:developer_games', args=[developer.slug])),
+        Scenario('publisher_games',
+                 reverse('publisher:publisher_games', args=[publisher.slug])),
+    ]
+    if member:
+        scenarios.append(Scenario('profile', reverse('reviews:profile'),
+                                  member))
+    if admin:
+        scenarios += [
+            Scenario('approve_comments', reverse('reviews:approve_comments'),
+                     admin),
+            Scenario('approve_reviews', reverse('reviews:approve_reviews'),
+                     admin),
+        ]
+    return scenarios
+
+
+def measure(client, url, cold=False):
+    """Request ``url`` once; returns (status, queries, db ms, wall ms)"""
+    if cold:
+        for cache in caches.all():
+            cache.clear()
+    with QueryTimer() as timer:
+        started = time.perf_counter()
+        response = client.get(url)
+        # Streaming and lazily rendered responses finish here
+        response.content
+        wall = time.perf_counter() - started
+    return (response.status_code, timer.queries, timer.seconds * 1000,
+            wall * 1000)
+
+
+def run_scenario(scenario, host, repeat, cold=False):
+    """Warm up once, then return median measurements over ``repeat`` runs"""
+    client = Client(HTTP_HOST=host)
+    if scenario.user:
+        client.force_login(scenario.user)
+    status = measure(client, scenario.url, cold)[0]
+    if status != 200:
+        raise ValueError(f'{scenario.url} returned {status}')
+
+    runs = [measure(client, scenario.url, cold) for _ in range(repeat)]
+    return {
+        'queries': max(run[1] for run in runs),
+        'db_ms': round(statistics.median(run[2] for run in runs), 2),
+        'wall_ms': round(statistics.median(run[3] for run in runs), 2),
+    }
+
+
+def over_budget(measured, baseline, tolerance):
+    """Return the reasons ``measured`` breaks its ``baseline`` budget"""
+    failures = []
+    if measured['queries'] > baseline['queries']:
+        failures.append(
+            f"{measured['queries']} queries (budget {baseline['queries']})")
+    for key in ('db_ms', 'wall_ms'):
+        budget = max(baseline[key] * (1 + tolerance),
+                     baseline[key] + MIN_SLACK_MS)
+        if measured[key] > budget:
+            failures.append(
+                f"{key} {measured[key]:.1f} (budget {budget:.1f})")
+    return failures
+
+
+def catalogue_size():
+    return {
+        'reviews': Review.objects.count(),
+        'user_reviews': UserReview.objects.count(),
+        'comments': UserComment.objects.count(),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as baseline:
+        json.dump({
+            'database': connection.vendor,
+            'catalogue': catalogue_size(),
+            'views': results,
+        }, baseline, indent=2, sort_keys=True)
+        baseline.write('\n')
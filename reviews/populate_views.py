@@ -1,18 +1,17 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
-from django.db import transaction
 from django.db.models import Q
 from django.utils.text import slugify
-from django.contrib.auth.models import User
-from django.core.paginator import Paginator
 from django.urls import reverse
-from .igdb_service import IGDBService
-from .models import Review, Genre
-from developer.models import Developer
-from publisher.models import Publisher
-from .management.commands.populate_reviews import Command as PopulateCommand
+from .jobs import enqueue
+from .igdb_service import get_igdb_service
+from .models import Job, Review
+from .counts import cached_count
+from .pagination import CursorPaginator
+from urllib.parse import urlencode
 import json
 import datetime
 
@@ -21,11 +20,11 @@ def is_superuser(user):
     return user.is_superuser
 
 
-def get_paginated_redirect(current_page):
+def get_paginated_redirect(cursor):
     """Helper function to create redirect URL with pagination"""
     redirect_url = reverse('reviews:populate_interface')
-    if current_page and str(current_page) != '1':
-        redirect_url += f'?page={current_page}'
+    if cursor:
+        redirect_url += f'?{urlencode({"cursor": cursor})}'
     return redirect_url
 
 
@@ -37,8 +36,7 @@ def populate_reviews_interface(request):
     if request.method == 'POST':
         action = request.POST.get('action')
         existing_review_ids = request.POST.getlist('existing_review_ids')
-        current_page = request.POST.get(
-            'current_page', request.GET.get('page', 1))
+        cursor = request.POST.get('cursor', request.GET.get('cursor'))
 
         if action == 'delete_selected':
             if existing_review_ids:
@@ -54,13 +52,14 @@ def populate_reviews_interface(request):
                         request, f'Error deleting reviews: {str(e)}')
             else:
                 messages.warning(request, 'No reviews selected for deletion')
-            return redirect(get_paginated_redirect(current_page))
+            return redirect(get_paginated_redirect(cursor))
 
         elif action == 'publish_selected':
             if existing_review_ids:
                 try:
                     count = Review.objects.filter(
-                        id__in=existing_review_ids).update(is_published=True)
+                        id__in=existing_review_ids
+                    ).update_and_purge(is_published=True)
                     messages.success(
                         request, f'Successfully published {count} review(s)')
                 except Exception as e:
@@ -68,13 +67,14 @@ def populate_reviews_interface(request):
                         request, f'Error publishing reviews: {str(e)}')
             else:
                 messages.warning(request, 'No reviews selected')
-            return redirect(get_paginated_redirect(current_page))
+            return redirect(get_paginated_redirect(cursor))
 
         elif action == 'unpublish_selected':
             if existing_review_ids:
                 try:
                     count = Review.objects.filter(
-                        id__in=existing_review_ids).update(is_published=False)
+                        id__in=existing_review_ids
+                    ).update_and_purge(is_published=False)
                     messages.success(
                         request, f'Successfully unpublished {count} review(s)')
                 except Exception as e:
@@ -82,13 +82,14 @@ def populate_reviews_interface(request):
                         request, f'Error unpublishing reviews: {str(e)}')
             else:
                 messages.warning(request, 'No reviews selected')
-            return redirect(get_paginated_redirect(current_page))
+            return redirect(get_paginated_redirect(cursor))
 
         elif action == 'feature_selected':
             if existing_review_ids:
                 try:
                     count = Review.objects.filter(
-                        id__in=existing_review_ids).update(is_featured=True)
+                        id__in=existing_review_ids
+                    ).update_and_purge(is_featured=True)
                     messages.success(
                         request, f'Successfully featured {count} review(s)')
                 except Exception as e:
@@ -96,13 +97,14 @@ def populate_reviews_interface(request):
                         request, f'Error featuring reviews: {str(e)}')
             else:
                 messages.warning(request, 'No reviews selected')
-            return redirect(get_paginated_redirect(current_page))
+            return redirect(get_paginated_redirect(cursor))
 
         elif action == 'unfeature_selected':
             if existing_review_ids:
                 try:
                     count = Review.objects.filter(
-                        id__in=existing_review_ids).update(is_featured=False)
+                        id__in=existing_review_ids
+                    ).update_and_purge(is_featured=False)
                     messages.success(
                         request, f'Successfully unfeatured {count} review(s)')
                 except Exception as e:
@@ -110,13 +112,12 @@ def populate_reviews_interface(request):
                         request, f'Error unfeaturing reviews: {str(e)}')
             else:
                 messages.warning(request, 'No reviews selected')
-            return redirect(get_paginated_redirect(current_page))
+            return redirect(get_paginated_redirect(cursor))
 
     # Handle single review deletion (legacy support)
     if request.method == 'POST' and 'delete_review' in request.POST:
         review_id = request.POST.get('review_id')
-        current_page = request.POST.get(
-            'current_page', request.GET.get('page', 1))
+        cursor = request.POST.get('cursor', request.GET.get('cursor'))
         try:
             review = Review.objects.get(id=review_id)
             title = review.title
@@ -126,14 +127,14 @@ def populate_reviews_interface(request):
             messages.error(request, 'Review not found')
         except Exception as e:
             messages.error(request, f'Error deleting review: {str(e)}')
-        return redirect(get_paginated_redirect(current_page))
+        return redirect(get_paginated_redirect(cursor))
 
     if request.method == 'POST':
         search_term = request.POST.get('search', '')
         limit = int(request.POST.get('limit', 50))
 
         # Get games from IGDB
-        igdb_service = IGDBService()
+        igdb_service = get_igdb_service()
         if search_term:
             games = igdb_service.search_games_with_platforms(
                 search_term, limit=limit)
@@ -183,13 +184,12 @@ def populate_reviews_interface(request):
             '-created_on')
 
         # Count featured reviews
-        featured_count = existing_reviews_queryset.filter(
-            is_featured=True).count()
+        featured_count = cached_count(
+            existing_reviews_queryset.filter(is_featured=True))
 
         # Add pagination for existing reviews
-        paginator = Paginator(existing_reviews_queryset, 50)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        paginator = CursorPaginator(existing_reviews_queryset, 50)
+        page_obj = paginator.page(request.GET.get('cursor'))
 
         return render(request, 'reviews/populate_reviews.html', {
             'games': formatted_games,
@@ -202,16 +202,20 @@ def populate_reviews_interface(request):
             'featured_count': featured_count,
         })
 
+    # Import job queued by create_reviews_from_selection, if any
+    job_id = request.GET.get('job', '')
+    job = Job.objects.filter(pk=job_id).first() if job_id.isdigit() else None
+
     # Get existing reviews for GET request
     existing_reviews = Review.objects.all().order_by('-created_on')
 
     # Count featured reviews
-    featured_count = existing_reviews.filter(is_featured=True).count()
+    featured_count = cached_count(
+        existing_reviews.filter(is_featured=True))
 
     # Add pagination for existing reviews
-    paginator = Paginator(existing_reviews, 50)  # Show 50 reviews per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = CursorPaginator(existing_reviews, 50)  # 50 reviews per page
+    page_obj = paginator.page(request.GET.get('cursor'))
 
     return render(request, 'reviews/populate_reviews.html', {
         'existing_reviews': page_obj,
@@ -219,6 +223,7 @@ def populate_reviews_interface(request):
         'page_obj': page_obj,
         'paginator': paginator,
         'featured_count': featured_count,
+        'job': job,
     })
 
 
@@ -234,189 +239,71 @@ def create_reviews_from_selection(request):
             messages.error(request, 'No games selected')
             return redirect('reviews:populate_interface')
 
-        created_reviews = 0
-        skipped_reviews = 0
-        populate_command = PopulateCommand()
-
-        with transaction.atomic():
-            for i, game_json in enumerate(selected_games_data):
-                try:
-                    game = json.loads(game_json)
-                    if i < len(review_scores):
-                        score_str = review_scores[i]
-                        if not score_str.strip():
-                            # silently skip if no score entered
-                            continue
-                        try:
-                            review_score = float(score_str)
-                        except ValueError:
-                            # silently skip if invalid score
-                            continue
-                    else:
-                        review_score = 5.0
-
-                    # Get published and featured status for this game
-                    is_published_key = f'is_published_{i}'
-                    is_featured_key = f'is_featured_{i}'
-
-                    # HTML checkboxes only send data when checked
-                    is_published = is_published_key in request.POST
-                    is_featured = is_featured_key in request.POST
-
-                    title = game.get('name')
-                    slug = slugify(title)
-
-                    # Check if review already exists
-                    existing_review = Review.objects.filter(
-                        Q(title__iexact=title) | Q(slug=slug)
-                    ).first()
-
-                    if existing_review:
-                        skipped_reviews += 1
+        # Only parse the selection here; the run_jobs worker does the
+        # uploads, database writes and AI text
+        items = []
+        for i, game_json in enumerate(selected_games_data):
+            title = None
+            try:
+                game = json.loads(game_json)
+                if i < len(review_scores):
+                    score_str = review_scores[i]
+                    if not score_str.strip():
+                        # silently skip if no score entered
                         continue
+                    try:
+                        review_score = float(score_str)
+                    except ValueError:
+                        # silently skip if invalid score
+                        continue
+                else:
+                    review_score = 5.0
+                title = game.get('name')
+
+                # HTML checkboxes only send data when checked
+                items.append({
+                    'game': game,
+                    'review_score': review_score,
+                    'is_published': f'is_published_{i}' in request.POST,
+                    'is_featured': f'is_featured_{i}' in request.POST,
+                })
+            except Exception as e:
+                messages.error(
+                    request, f'Error processing {title}: {str(e)}')
+
+        if not items:
+            messages.warning(request, 'No games with a review score selected')
+            return redirect('reviews:populate_interface')
 
-                    description = game.get('summary', '')
-                    release_date = None
-                    if 'release_dates' in game and game['release_dates']:
-                        try:
-                            timestamp = game['release_dates'][0]['date']
-                            release_date = datetime.datetime.fromtimestamp(
-                                timestamp).date()
-                        except Exception:
-                            release_date = None
-
-                    # Handle developer
-                    developer_obj = None
-                    if game.get('developers'):
-                        dev_data = game['developers'][0]
-                        logo_url = dev_data.get('logo_url', '')
-                        if logo_url and logo_url.startswith('//'):
-                            logo_url = 'https:' + logo_url
-                        cloudinary_logo_id = (
-                            populate_command
-                            .upload_developer_logo_to_cloudinary(
-                                logo_url, dev_data['name']
-                            )
-                        )
-                        developer_obj, _ = Developer.objects.get_or_create(
-                            name=dev_data['name'],
-                            defaults={
-                                'description': dev_data.get('description', ''),
-                                'website': dev_data.get('website', ''),
-                                'founded_year': (
-                                    dev_data.get('founded_year') or None
-                                ),
-                                'logo': (
-                                    cloudinary_logo_id if cloudinary_logo_id
-                                    else logo_url
-                                )
-                            }
-                        )
-
-                    # Handle publisher
-                    publisher_obj = None
-                    if game.get('publishers'):
-                        pub_data = game['publishers'][0]
-                        logo_url = pub_data.get('logo_url', '')
-                        if logo_url and logo_url.startswith('//'):
-                            logo_url = 'https:' + logo_url
-                        cloudinary_logo_id = (
-                            populate_command
-                            .upload_publisher_logo_to_cloudinary(
-                                logo_url, pub_data['name']
-                            )
-                        )
-                        publisher_obj, _ = Publisher.objects.get_or_create(
-                            name=pub_data['name'],
-                            defaults={
-                                'description': pub_data.get('description', ''),
-                                'website': pub_data.get('website', ''),
-                                'founded_year': (
-                                    pub_data.get('founded_year') or None
-                                ),
-                                'logo': (
-                                    cloudinary_logo_id if cloudinary_logo_id
-                                    else logo_url
-                                )
-                            }
-                        )
-
-                    # Create review if both developer and publisher exist
-                    if developer_obj and publisher_obj:
-                        user = User.objects.order_by('?').first()
-
-                        # Generate AI review
-                        ai_review_text = populate_command.generate_ai_review(
-                            title)
-                        if ai_review_text:
-                            review_text = ai_review_text
-                        else:
-                            review_text = f"Auto-generated review for {title}."
-                        review_date = datetime.datetime.now()
-
-                        # Download and upload cover image
-                        cover_url = game.get('cover_url', '')
-                        if cover_url.startswith('//'):
-                            cover_url = 'https:' + cover_url
-                        cloudinary_id = (
-                            populate_command.upload_cover_to_cloudinary(
-                                cover_url, title
-                            )
-                        )
-                        featured_image = (
-                            cloudinary_id if cloudinary_id else 'placeholder'
-                        )
-
-                        review, created = Review.objects.get_or_create(
-                            title=title,
-                            slug=slug,
-                            defaults={
-                                'publisher': publisher_obj,
-                                'developer': developer_obj,
-                                'description': description,
-                                'release_date': (
-                                    release_date or datetime.date.today()
-                                ),
-                                'review_score': review_score,
-                                'review_text': review_text,
-                                'reviewed_by': user,
-                                'review_date': review_date,
-                                'featured_image': featured_image,
-                                'is_featured': is_featured,
-                                'is_published': is_published
-                            }
-                        )
-
-                        # Add genres to review
-                        genre_objs = []
-                        for genre in game.get('genres', []):
-                            genre_name = genre.get('name')
-                            if genre_name:
-                                genre_obj, _ = Genre.objects.get_or_create(
-                                    name=genre_name
-                                )
-                                genre_objs.append(genre_obj)
-                        if genre_objs:
-                            review.genres.set(genre_objs)
-
-                        if created:
-                            created_reviews += 1
-
-                except Exception as e:
-                    # Only show error modal for actual errors, not for skipped games
-                    messages.error(
-                        request, f'Error processing {title}: {str(e)}')
-                    continue
-
-        # Build success message
-        success_message = f'Successfully created {created_reviews} review(s)'
-        if skipped_reviews > 0:
-            success_message += (f' (skipped {skipped_reviews} '
-                                f'existing review(s))')
-
-        messages.success(request, success_message)
-        return redirect('reviews:populate_interface')
+        job = enqueue('populate', items, user=request.user)
+        messages.success(
+            request, f'Queued {len(items)} game(s) for import')
+        return redirect(
+            reverse('reviews:populate_interface') + f'?job={job.pk}')
 
     except Exception as e:
         messages.error(request, f'Error creating reviews: {str(e)}')
         return redirect('reviews:populate_interface')
+
+
+@user_passes_test(is_superuser)
+@require_http_methods(["GET"])
+def job_progress(request, job_id):
+    """Lightweight JSON progress for the populate page to poll"""
+    job = get_object_or_404(
+        Job.objects.only(
+            'id', 'kind', 'status', 'total', 'completed', 'result', 'error',
+            'attempts', 'max_attempts'),
+        pk=job_id
+    )
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'completed': job.completed,
+        'result': job.result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+    })
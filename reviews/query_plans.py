@@ -0,0 +1,168 @@
+"""
+EXPLAIN checks for the queries behind the public and admin pages, for
+``manage.py explain_hot_queries``.
+
+Each hot query is built the way its view builds it, with sample values
+from the database, and explained. A sequential scan of a table holding at
+least ``min_rows`` rows is reported: it means the query reads the whole
+table on every request, whatever page it is for.
+"""
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from developer.models import Developer
+from publisher.models import Publisher
+from .admin_views import APPROVAL_PAGE_SIZE
+from .conditional import catalogue_versions, review_versions
+from .models import Genre, Review, UserComment, UserReview
+from .pagination import CursorPaginator
+from .views import DISCUSSION_PAGE_SIZE, ReviewList
+import datetime
+import json
+
+
+def page_queries(name, queryset, per_page):
+    """
+    The queries CursorPaginator runs for the first page of ``queryset``
+    and for a page from the middle of it
+    """
+    paginator = CursorPaginator(queryset, per_page)
+    queries = []
+    middle = queryset[queryset.count() // 2:].first()
+    for label, position in (('first', None), ('middle', middle)):
+        if label == 'middle':
+            if middle is None:
+                break
+            position = (getattr(middle, paginator.field.attname), middle.pk)
+        segments = paginator.segments(position, backwards=False)
+        condition, ordering = segments[0]
+        queries.append((
+            f'{name} ({label} page)',
+            queryset.filter(condition).order_by(*ordering)[:per_page + 1],
+        ))
+    return queries
+
+
+def hot_queries():
+    """(name, queryset) for each query worth keeping off sequential scans"""
+    published = Review.objects.filter(is_published=True)
+    review = published.order_by('-comment_count', 'pk').first()
+    genre = Genre.objects.annotate(
+        total=Count('reviews')).order_by('-total', 'pk').first()
+    developer = Developer.objects.order_by('pk').first()
+    publisher = Publisher.objects.order_by('pk').first()
+    week_ago = (timezone.now() - datetime.timedelta(days=7)).replace(
+        minute=0, second=0, microsecond=0)
+    per_page = ReviewList.paginate_by
+
+    queries = [('catalogue_version', catalogue_versions())]
+    queries += page_queries(
+        'review_list', published.order_by('title').for_cards(), per_page)
+    queries += page_queries(
+        'review_list_newest', published.order_by('-review_date').for_cards(),
+        per_page)
+    if genre:
+        queries += page_queries(
+            'review_list_genre', published.filter(
+                genres__name__iexact=genre.name
+            ).order_by('title').for_cards(), per_page)
+    queries += page_queries('home', published.filter(
+        review_date__gte=week_ago).order_by('-review_date').for_cards(), 16)
+    queries.append(('featured', Review.objects.filter(
+        is_featured=True, is_published=True).for_cards()))
+
+    if review:
+        queries += [
+            ('review_version', review_versions(review.slug)),
+            ('review_detail', published.filter(slug=review.slug)),
+        ]
+        queries += page_queries(
+            'review_comments', review.user_comments.filter(
+                approved=True).select_related('author').order_by(
+                    '-created_on'), DISCUSSION_PAGE_SIZE)
+        queries += page_queries(
+            'review_user_reviews', review.user_reviews.filter(
+                approved=True).select_related('user').order_by(
+                    '-created_on'), DISCUSSION_PAGE_SIZE)
+
+    for name, model in (('developer_list', Developer),
+                        ('publisher_list', Publisher)):
+        queries += page_queries(name, model.objects.order_by('name'), 12)
+        queries += page_queries(
+            f'{name}_newest', model.objects.order_by('-created_on'), 12)
+    if developer:
+        queries.append(('developer_games', published.filter(
+            developer=developer).for_cards()))
+    if publisher:
+        queries.append(('publisher_games', published.filter(
+            publisher=publisher).for_cards()))
+
+    for name, model, related in (
+        ('comments', UserComment, ('author', 'review')),
+        ('user_reviews', UserReview, ('user', 'game')),
+    ):
+        pending = model.objects.filter(approved=False)
+        queries += page_queries(
+            f'pending_{name}',
+            pending.select_related(*related).order_by('-created_on'),
+            APPROVAL_PAGE_SIZE)
+        queries += [
+            (f'pending_{name}_count', pending.order_by().values('approved')),
+            (f'recently_approved_{name}', model.objects.filter(
+                approved=True).select_related(*related).order_by(
+                    '-created_on')[:10]),
+        ]
+    queries += page_queries(
+        'populate_reviews', Review.objects.order_by('-created_on'), 50)
+    return queries
+
+
+def plan_text(queryset, analyze=False):
+    """The plan of ``queryset`` as the database prints it"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and analyze:
+        return queryset.explain(analyze=True)
+    return queryset.explain()
+
+
+def sequential_scans(queryset, analyze=False):
+    """The tables ``queryset`` reads with a full sequential scan"""
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json', analyze=analyze))
+        nodes = [plan[0]['Plan']]
+        tables = []
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                tables.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return tables
+    if connection.vendor == 'sqlite':
+        # "SCAN <table>" without "USING ... INDEX" reads the whole table;
+        # scans of subqueries and unions read their own results
+        tables = connections[queryset.db].introspection.table_names()
+        return [
+            line.split('SCAN ', 1)[1].split()[0]
+            for line in queryset.explain().splitlines()
+            if 'SCAN ' in line and ' USING ' not in line and
+            line.split('SCAN ', 1)[1].split()[0] in tables
+        ]
+    raise CommandError(
+        f'Query plans can only be checked on PostgreSQL and SQLite, not '
+        f'{connection.vendor}')
+
+
+def table_rows(table, using='default'):
+    """Rows in ``table``: the planner's estimate on PostgreSQL"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+        else:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+        row = cursor.fetchone()
+    return max(int(row[0]), 0) if row else 0
@@ -0,0 +1,224 @@
+"""
+Full-text search for reviews.
+
+On PostgreSQL every review stores a weighted ``search_vector`` (title,
+genres, developer, publisher and description) backed by a GIN index, and
+results are ranked with ``ts_rank``. When the pg_trgm extension is
+installed, trigram word similarity on the title catches typos.
+
+On SQLite the same columns are mirrored into an FTS5 table ranked with
+bm25. Typos are corrected against the FTS5 vocabulary before giving up.
+
+Any other database falls back to the original ``icontains`` search.
+"""
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                           SearchVector,
+                                           TrigramWordSimilarity)
+from django.db import connection
+from django.db.models import (Case, F, IntegerField, OuterRef, Q, Subquery,
+                              TextField, Value, When)
+from django.db.models.functions import Coalesce
+import difflib
+import re
+
+
+FTS_TABLE = 'reviews_review_fts'
+FTS_VOCAB_TABLE = 'reviews_review_fts_vocab'
+
+# bm25 weights for the FTS5 columns, in table order
+FTS_WEIGHTS = '10.0, 5.0, 5.0, 5.0, 1.0'
+
+_trigram_available = None
+
+
+def search_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+
+def search_limit():
+    return getattr(settings, 'SEARCH_RESULTS_LIMIT', 100)
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def trigram_available():
+    """Check (once per process) whether pg_trgm is installed"""
+    global _trigram_available
+    if _trigram_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def search_reviews(query, queryset):
+    """Return ``queryset`` filtered to ``query`` matches, best first"""
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        return postgres_search(query, tokens, queryset)
+    if connection.vendor == 'sqlite':
+        return sqlite_search(tokens, queryset)
+    return queryset.filter(
+        Q(title__icontains=query) | Q(genres__name__icontains=query)
+    ).distinct()[:search_limit()]
+
+
+def search_companies(query, queryset):
+    """Search developers or publishers by name, tolerating typos"""
+    if connection.vendor == 'postgresql' and trigram_available():
+        return queryset.annotate(
+            similarity=TrigramWordSimilarity(query, 'name')
+        ).filter(
+            Q(name__icontains=query) | Q(name__trigram_word_similar=query)
+        ).order_by('-similarity', 'name')
+    return queryset.filter(name__icontains=query)
+
+
+def postgres_search(query, tokens, queryset):
+    # Prefix-match every word so results appear while words are incomplete
+    raw_query = ' & '.join(f'{token}:*' for token in tokens)
+    search_query = SearchQuery(
+        raw_query, search_type='raw', config=search_config())
+    queryset = queryset.annotate(
+        rank=SearchRank(F('search_vector'), search_query))
+    condition = Q(search_vector=search_query)
+    score = F('rank')
+
+    if trigram_available():
+        queryset = queryset.annotate(
+            similarity=TrigramWordSimilarity(query, 'title'))
+        condition |= Q(title__trigram_word_similar=query)
+        score = F('rank') + F('similarity')
+
+    return queryset.filter(condition).order_by(
+        score.desc(), 'title')[:search_limit()]
+
+
+def sqlite_search(tokens, queryset):
+    ids = fts_match(tokens)
+    if not ids:
+        corrected = correct_tokens(tokens)
+        if corrected != tokens:
+            ids = fts_match(corrected)
+    if not ids:
+        return queryset.none()
+
+    # Keep the bm25 order when loading the rows through the ORM
+    ranking = Case(
+        *[When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking)
+
+
+def fts_match(tokens):
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {FTS_WEIGHTS}) LIMIT %s',
+            [match, search_limit()]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def correct_tokens(tokens):
+    """Replace unknown words with the closest term in the FTS5 index"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT term FROM {FTS_VOCAB_TABLE}')
+        vocabulary = [row[0] for row in cursor.fetchall()]
+
+    corrected = []
+    for token in tokens:
+        matches = difflib.get_close_matches(
+            token, vocabulary, n=1, cutoff=0.75)
+        corrected.append(matches[0] if matches else token)
+    return corrected
+
+
+def search_vector_expression():
+    """Weighted tsvector over a review's text and related names"""
+    from developer.models import Developer
+    from publisher.models import Publisher
+    from .models import Genre
+
+    config = search_config()
+    genre_names = Subquery(
+        Genre.objects.filter(reviews=OuterRef('pk'))
+        .values('reviews')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+    developer_name = Subquery(
+        Developer.objects.filter(pk=OuterRef('developer_id')).values('name'))
+    publisher_name = Subquery(
+        Publisher.objects.filter(pk=OuterRef('publisher_id')).values('name'))
+
+    def weighted(expression, weight):
+        return SearchVector(
+            Coalesce(expression, Value(''), output_field=TextField()),
+            weight=weight, config=config
+        )
+
+    return (
+        SearchVector('title', weight='A', config=config) +
+        weighted(genre_names, 'B') +
+        weighted(developer_name, 'B') +
+        weighted(publisher_name, 'B') +
+        SearchVector('description', weight='C', config=config)
+    )
+
+
+def update_search_index(review_ids):
+    """Rebuild the search data for the given reviews"""
+    from .models import Review
+
+    review_ids = list(review_ids)
+    if not review_ids:
+        return
+    if connection.vendor == 'postgresql':
+        Review.objects.filter(pk__in=review_ids).update(
+            search_vector=search_vector_expression())
+    elif connection.vendor == 'sqlite':
+        reviews = Review.objects.filter(
+            pk__in=review_ids
+        ).select_related('developer', 'publisher').prefetch_related('genres')
+        rows = [
+            (
+                review.pk,
+                review.title,
+                ' '.join(genre.name for genre in review.genres.all()),
+                review.developer.name,
+                review.publisher.name,
+                review.description,
+            )
+            for review in reviews
+        ]
+        remove_from_search_index(review_ids)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, genres, developer, '
+                f'publisher, description) VALUES (%s, %s, %s, %s, %s, %s)',
+                rows
+            )
+
+
+def remove_from_search_index(review_ids):
+    """Drop deleted reviews from the SQLite FTS5 table"""
+    review_ids = list(review_ids)
+    if connection.vendor != 'sqlite' or not review_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(review_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            review_ids
+        )
@@ -0,0 +1,284 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+from developer.models import Developer
+from publisher.models import Publisher
+from .autocomplete import index_entry, unindex_entry
+from .menus import invalidate_menu
+from .models import (Genre, Review, UserComment, UserReview,
+                     adjust_review_aggregates)
+from .page_cache import purge, purge_reviews, review_page_keys
+from .search import remove_from_search_index, update_search_index
+
+
+# Review fields that feed the search index
+SEARCH_FIELDS = {'title', 'description', 'developer', 'publisher'}
+
+# Completion group for each model in the autocomplete index
+AUTOCOMPLETE_KINDS = {
+    Review: 'games',
+    Developer: 'developers',
+    Publisher: 'publishers',
+    Genre: 'genres',
+}
+
+
+def apply_contribution(state, sign):
+    """Add (sign=1) or remove (sign=-1) a row's share of review counters"""
+    review_id, contribution = state
+    adjust_review_aggregates(
+        review_id,
+        **{name: sign * value for name, value in contribution.items()}
+    )
+
+
+@receiver(post_save, sender=UserComment)
+@receiver(post_save, sender=UserReview)
+def update_aggregates_on_save(sender, instance, created, **kwargs):
+    """Keep review counters in step with created or edited rows"""
+    previous = None if created else getattr(instance, '_aggregate_state', None)
+    current = instance.aggregate_state()
+
+    if created:
+        apply_contribution(current, 1)
+    elif previous is None:
+        # The row was not loaded with the fields we track, so rebuild
+        # the counters for its review from the source tables
+        Review.objects.filter(pk=current[0]).recompute_aggregates()
+    elif previous[0] == current[0]:
+        review_id, contribution = current
+        adjust_review_aggregates(review_id, **{
+            name: value - previous[1][name]
+            for name, value in contribution.items()
+        })
+    else:
+        apply_contribution(previous, -1)
+        apply_contribution(current, 1)
+
+    instance._aggregate_state = current
+
+
+@receiver(post_delete, sender=UserComment)
+@receiver(post_delete, sender=UserReview)
+def update_aggregates_on_delete(sender, instance, **kwargs):
+    """Remove a deleted row's share of its review counters"""
+    previous = getattr(instance, '_aggregate_state', None)
+    if previous is None:
+        Review.objects.filter(
+            pk=instance.aggregate_state()[0]
+        ).recompute_aggregates()
+    else:
+        apply_contribution(previous, -1)
+
+
+@receiver(m2m_changed, sender=Review.likes.through)
+def update_like_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Review.like_count in step with the likes relation"""
+    if action == 'pre_remove' and pk_set:
+        # remove() sends every id it was given, linked or not (add() sends
+        # only the new ones), so keep the links that actually exist
+        if reverse:
+            linked = sender.objects.filter(
+                user=instance, review__in=pk_set).values_list('review_id')
+        else:
+            linked = sender.objects.filter(
+                review=instance, user__in=pk_set).values_list('user_id')
+        instance._removed_like_ids = {pk for pk, in linked}
+    elif action == 'post_remove':
+        pk_set = getattr(instance, '_removed_like_ids', set())
+    if action in ('post_add', 'post_remove') and pk_set:
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            # instance is a User; pk_set holds the reviews they (un)liked
+            Review.objects.filter(pk__in=pk_set).update(
+                like_count=F('like_count') + sign)
+        else:
+            Review.objects.filter(pk=instance.pk).update(
+                like_count=F('like_count') + sign * len(pk_set))
+    elif action == 'pre_clear' and reverse:
+        instance._cleared_review_ids = list(
+            instance.game_likes.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            Review.objects.filter(
+                pk__in=getattr(instance, '_cleared_review_ids', [])
+            ).update(like_count=F('like_count') - 1)
+        else:
+            Review.objects.filter(pk=instance.pk).update(like_count=0)
+
+
+@receiver(pre_delete, sender=User)
+def remove_likes_of_deleted_user(sender, instance, **kwargs):
+    """
+    Deleting a user removes their likes by cascade, which sends no
+    m2m_changed; this runs in the same transaction as the delete
+    """
+    Review.objects.filter(likes=instance).update(
+        like_count=F('like_count') - 1)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def invalidate_genres_menu(sender, **kwargs):
+    invalidate_menu('genres')
+
+
+@receiver(pre_delete, sender=Genre)
+def touch_reviews_of_deleted_genre(sender, instance, **kwargs):
+    """The links go by cascade, which sends no m2m_changed"""
+    instance.reviews.touch()
+
+
+@receiver(post_save, sender=Review)
+def index_review_on_save(sender, instance, update_fields, **kwargs):
+    """Refresh a review's search data when its indexed text changes"""
+    if update_fields and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    update_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Review)
+def unindex_review_on_delete(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(m2m_changed, sender=Review.genres.through)
+def index_review_on_genres_change(sender, instance, action, reverse, pk_set,
+                                  **kwargs):
+    """Genre names are part of the search data"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        if action == 'pre_clear' and reverse:
+            instance._cleared_review_ids = list(
+                instance.reviews.values_list('pk', flat=True))
+        return
+    if not reverse:
+        update_search_index([instance.pk])
+    elif action == 'post_clear':
+        update_search_index(getattr(instance, '_cleared_review_ids', []))
+    else:
+        update_search_index(pk_set or [])
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Developer)
+@receiver(post_save, sender=Publisher)
+def index_reviews_on_name_change(sender, instance, created, **kwargs):
+    """Re-index reviews that show a renamed genre or company"""
+    if created:
+        return
+    if sender is Genre:
+        reviews = instance.reviews.all()
+    elif sender is Developer:
+        reviews = instance.games.all()
+    else:
+        reviews = instance.reviews.all()
+    update_search_index(reviews.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Review)
+def autocomplete_review_on_save(sender, instance, **kwargs):
+    """Only published reviews are offered as completions"""
+    if instance.is_published:
+        index_entry('games', instance.pk, instance.title, instance.slug)
+    else:
+        unindex_entry('games', instance.pk)
+
+
+@receiver(post_save, sender=Developer)
+@receiver(post_save, sender=Publisher)
+@receiver(post_save, sender=Genre)
+def autocomplete_name_on_save(sender, instance, **kwargs):
+    if sender is Genre:
+        index_entry('genres', instance.pk, instance.name)
+    else:
+        index_entry(AUTOCOMPLETE_KINDS[sender], instance.pk, instance.name,
+                    instance.slug)
+
+
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Developer)
+@receiver(post_delete, sender=Publisher)
+@receiver(post_delete, sender=Genre)
+def autocomplete_name_on_delete(sender, instance, **kwargs):
+    unindex_entry(AUTOCOMPLETE_KINDS[sender], instance.pk)
+
+
+@receiver(pre_save, sender=Review)
+@receiver(pre_delete, sender=Review)
+def remember_review_pages(sender, instance, **kwargs):
+    """Note the pages showing the stored row before it changes or goes"""
+    if instance.pk is not None:
+        instance._page_keys = review_page_keys([instance.pk])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def purge_review_pages(sender, instance, **kwargs):
+    """Purge the cached pages that showed or now show the review"""
+    keys = set(getattr(instance, '_page_keys', ()))
+    keys.update(('reviews', f'review:{instance.pk}',
+                 f'developer:{instance.developer_id}',
+                 f'publisher:{instance.publisher_id}'))
+    if instance.is_featured:
+        keys.add('featured')
+    purge(*keys)
+
+
+@receiver(post_delete, sender=Review)
+def touch_companies_on_review_delete(sender, instance, **kwargs):
+    """
+    List versions (reviews.conditional) follow the newest updated_on,
+    which a deleted review cannot move; its companies' pages lost a game
+    """
+    now = timezone.now()
+    Developer.objects.filter(pk=instance.developer_id).update(updated_on=now)
+    Publisher.objects.filter(pk=instance.publisher_id).update(updated_on=now)
+
+
+@receiver(post_save, sender=UserComment)
+@receiver(post_save, sender=UserReview)
+@receiver(post_delete, sender=UserComment)
+@receiver(post_delete, sender=UserReview)
+def purge_discussion_pages(sender, instance, **kwargs):
+    """
+    Comments and user reviews are listed on their review's page; counter
+    changes purge the list pages through adjust_review_aggregates
+    """
+    purge(f'review:{instance.aggregate_state()[0]}')
+
+
+@receiver(m2m_changed, sender=Review.genres.through)
+def purge_pages_on_genres_change(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """A review's genres decide which genre lists show it"""
+    if action == 'pre_clear':
+        instance._genre_review_ids = (
+            list(instance.reviews.values_list('pk', flat=True))
+            if reverse else [instance.pk])
+        instance._genre_page_keys = review_page_keys(
+            instance._genre_review_ids)
+    elif action == 'post_clear':
+        Review.objects.filter(
+            pk__in=getattr(instance, '_genre_review_ids', [])).touch()
+        purge(*getattr(instance, '_genre_page_keys', ()))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        if reverse:
+            Review.objects.filter(pk__in=pk_set).touch()
+            purge_reviews(pk_set, f'genre:{instance.name.lower()}')
+        else:
+            Review.objects.filter(pk=instance.pk).touch()
+            purge_reviews([instance.pk], *(
+                f'genre:{name.lower()}' for name in Genre.objects.filter(
+                    pk__in=pk_set).values_list('name', flat=True)))
+
+
+@receiver(post_save, sender=Developer)
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Developer)
+@receiver(post_delete, sender=Publisher)
+def purge_company_pages(sender, instance, **kwargs):
+    purge(AUTOCOMPLETE_KINDS[sender],
+          f'{sender._meta.model_name}:{instance.pk}')
@@ -1,3 +1,1418 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.base import memcache_key_warnings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from cloudinary import exceptions as cloudinary_errors
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from developer.models import Developer
+from publisher.models import Publisher
+from .models import (GeneratedReview, Genre, Job, RateLimitBucket,
+                     Review, UserComment, UserReview)
+from .menus import get_menu, lazy_menu
+from .page_cache import tag_key
+from .assets import COVER_FOLDER, AssetPipeline
+from .counts import cached_count
+from .fake_upstream import FakeUpstream
+from .igdb_parser import GameParser
+from .igdb_service import (IGDBService, SessionIGDBWrapper,
+                           build_game_snapshot, get_igdb_service)
+from .importer import import_games, reviewer_ids
+from .autocomplete import PrefixIndex, prefix_index
+from .pagination import CursorPaginator
+from .query_plans import sequential_scans
+from .search import search_reviews, trigram_available
+from .throttle import SingleFlight, acquire
+from .views import DISCUSSION_PAGE_SIZE, resolve_companies
+from . import ai_reviews, jobs, view_counts
+import datetime
+import json
+import requests
+import threading
+import time
 
-# Create your tests here.
+
+def make_review(title, **kwargs):
+    developer, _ = Developer.objects.get_or_create(name='Test Developer')
+    publisher, _ = Publisher.objects.get_or_create(name='Test Publisher')
+    kwargs.setdefault('is_published', True)
+    kwargs.setdefault('review_date', timezone.now())
+    return Review.objects.create(
+        title=title, slug=title.lower().replace(' ', '-'),
+        developer=developer, publisher=publisher, description='',
+        release_date=timezone.now().date(), **kwargs)
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+class PageTestCase(TestCase):
+    """Starts every test with empty caches"""
+
+    def setUp(self):
+        super().setUp()
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+
+class AggregateTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.review = make_review('Counted Game')
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def assertCounters(self, **expected):
+        self.review.refresh_from_db()
+        self.assertEqual(
+            {name: getattr(self.review, name) for name in expected}, expected)
+        # The stored counters match a rebuild from the source tables
+        stored = {name: getattr(self.review, name) for name in expected}
+        Review.objects.filter(pk=self.review.pk).recompute_aggregates()
+        self.review.refresh_from_db()
+        self.assertEqual(
+            {name: getattr(self.review, name) for name in expected}, stored)
+
+    def test_comments_count_once_approved(self):
+        comment = UserComment.objects.create(
+            review=self.review, author=self.alice, body='Pending')
+        UserComment.objects.create(
+            review=self.review, author=self.bob, body='Approved',
+            approved=True)
+        self.assertCounters(comment_count=1)
+
+        UserComment.objects.filter(pk=comment.pk).approve()
+        self.assertCounters(comment_count=2)
+        UserComment.objects.get(pk=comment.pk).delete()
+        self.assertCounters(comment_count=1)
+
+    def test_user_reviews_count_ratings_once_approved(self):
+        pending = UserReview.objects.create(
+            game=self.review, user=self.alice, rating=6, review_text='Fine')
+        UserReview.objects.create(
+            game=self.review, user=self.bob, rating=9, review_text='Great',
+            approved=True)
+        self.assertCounters(user_review_count=1, rating_total=9)
+
+        UserReview.objects.filter(pk=pending.pk).approve()
+        self.assertCounters(user_review_count=2, rating_total=15)
+        self.assertEqual(str(self.review.average_rating), '7.5')
+
+        pending.refresh_from_db()
+        pending.rating = 2
+        pending.save()
+        self.assertCounters(user_review_count=2, rating_total=11)
+        pending.delete()
+        self.assertCounters(user_review_count=1, rating_total=9)
+
+    def test_likes_follow_add_remove_and_clear(self):
+        other = make_review('Other Game')
+        self.review.likes.add(self.alice, self.bob)
+        self.alice.game_likes.add(other)
+        self.assertCounters(like_count=2)
+
+        self.review.likes.remove(self.bob)
+        self.assertCounters(like_count=1)
+        self.alice.game_likes.clear()
+        self.assertCounters(like_count=0)
+        other.refresh_from_db()
+        self.assertEqual(other.like_count, 0)
+
+        self.review.likes.add(self.alice, self.bob)
+        self.review.likes.clear()
+        self.assertCounters(like_count=0)
+
+    def test_removing_likes_that_do_not_exist_changes_nothing(self):
+        other = make_review('Other Game')
+        self.review.likes.add(self.alice)
+        self.review.likes.remove(self.alice, self.bob)
+        self.review.likes.remove(self.bob)
+        self.assertCounters(like_count=0)
+
+        self.review.likes.add(self.bob)
+        self.bob.game_likes.remove(self.review, other)
+        self.assertCounters(like_count=0)
+        other.refresh_from_db()
+        self.assertEqual(other.like_count, 0)
+
+    def test_deleting_a_user_removes_their_likes_and_discussion(self):
+        self.review.likes.add(self.alice, self.bob)
+        UserComment.objects.create(
+            review=self.review, author=self.alice, body='Mine',
+            approved=True)
+        UserReview.objects.create(
+            game=self.review, user=self.alice, rating=8, review_text='Good',
+            approved=True)
+        self.assertCounters(like_count=2, comment_count=1,
+                            user_review_count=1, rating_total=8)
+
+        self.alice.delete()
+        self.assertCounters(like_count=1, comment_count=0,
+                            user_review_count=0, rating_total=0)
+
+
+class ListPageTests(PageTestCase):
+
+    def render(self, url):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_cards_cost_the_same_queries_however_many_are_shown(self):
+        author = User.objects.create_user('commenter')
+
+        def add_reviews(titles):
+            for title in titles:
+                review = make_review(title, is_featured=True)
+                UserComment.objects.create(
+                    review=review, author=author, body='Hi', approved=True)
+
+        add_reviews(['Game 1'])
+        developer = Developer.objects.get()
+        urls = ['/', '/reviews/', f'/developers/{developer.slug}/']
+        before = [self.render(url)[1] for url in urls]
+        add_reviews([f'Game {n}' for n in range(2, 9)])
+        for url, queries in zip(urls, before):
+            response, after = self.render(url)
+            self.assertEqual(after, queries, url)
+            self.assertContains(
+                response,
+                '<i class="fas fa-comments orange-text"></i> 1</span>')
+
+
+class CursorPaginatorTests(PageTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now()
+        # Ties on the sort column, and a run of NULL review dates
+        for number in range(11):
+            make_review(
+                f'Game {number:02}',
+                review_date=(None if number % 4 == 0 else
+                             start - datetime.timedelta(days=number // 2)))
+
+    def walk(self, queryset, per_page=3):
+        """Pages from the first to the last, then back to the first"""
+        paginator = CursorPaginator(queryset, per_page)
+        forward = [paginator.page()]
+        while forward[-1].has_next():
+            paginator = CursorPaginator(queryset, per_page)
+            forward.append(paginator.page(forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            paginator = CursorPaginator(queryset, per_page)
+            backward.append(paginator.page(backward[-1].previous_cursor))
+        return forward, backward
+
+    def assertWalks(self, queryset, expected):
+        forward, backward = self.walk(queryset)
+        pages = [expected[i:i + 3] for i in range(0, len(expected), 3)]
+        self.assertEqual([list(page) for page in forward], pages)
+        self.assertEqual(
+            [list(page) for page in reversed(backward)], pages)
+        self.assertEqual(
+            [page.number for page in forward], list(range(1, len(pages) + 1)))
+        self.assertEqual(
+            [(page.start_index(), page.end_index()) for page in forward],
+            [(i * 3 + 1, i * 3 + len(page)) for i, page in enumerate(pages)])
+
+    def test_first_middle_and_last_pages(self):
+        queryset = Review.objects.order_by('title')
+        expected = list(queryset)
+        self.assertWalks(queryset, expected)
+
+        paginator = CursorPaginator(queryset, 3)
+        first = paginator.page()
+        self.assertFalse(first.has_previous())
+        self.assertEqual(paginator.count, 11)
+        self.assertEqual(paginator.num_pages, 4)
+        last = self.walk(queryset)[0][-1]
+        self.assertFalse(last.has_next())
+        self.assertEqual(list(last), expected[9:])
+        self.assertEqual(last.paginator.count, 11)
+
+    def test_descending_order_with_ties_and_nulls(self):
+        for ordering in ('review_date', '-review_date'):
+            with self.subTest(ordering=ordering):
+                queryset = Review.objects.order_by(ordering)
+                # NULLs come last either way, ties break on id
+                descending = ordering.startswith('-')
+                dated = sorted(
+                    queryset.exclude(review_date=None),
+                    key=lambda review: (review.review_date, review.pk),
+                    reverse=descending)
+                undated = sorted(queryset.filter(review_date=None),
+                                 key=lambda review: review.pk,
+                                 reverse=descending)
+                self.assertWalks(queryset, dated + undated)
+
+    def test_bad_cursor_gives_the_first_page(self):
+        queryset = Review.objects.order_by('title')
+        page = CursorPaginator(queryset, 3).page('not-a-cursor')
+        self.assertEqual(page.number, 1)
+        # Cursors are signed per ordering
+        cursor = CursorPaginator(queryset, 3).page().next_cursor
+        page = CursorPaginator(
+            Review.objects.order_by('-title'), 3).page(cursor)
+        self.assertEqual(page.number, 1)
+
+
+class ReviewDetailTests(PageTestCase):
+
+    def test_discussion_is_paginated_by_cursor(self):
+        review = make_review('Busy Game')
+        author = User.objects.create_user('commenter')
+        now = timezone.now()
+        for n in range(DISCUSSION_PAGE_SIZE + 5):
+            UserComment.objects.create(
+                review=review, author=author, body=f'Comment {n:02}',
+                approved=True)
+        UserComment.objects.update(created_on=now)
+        url = f'/reviews/{review.slug}/'
+
+        response = self.client.get(url)
+        first = response.context['user_comments']
+        self.assertEqual(len(first), DISCUSSION_PAGE_SIZE)
+        self.assertFalse(response.context['user_reviews'].has_other_pages())
+        self.assertContains(response, f'{DISCUSSION_PAGE_SIZE + 5} comments')
+
+        response = self.client.get(
+            url, {'comments': first.next_cursor, 'user_reviews': 'x'})
+        second = response.context['user_comments']
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            {comment.pk for comment in [*first, *second]},
+            set(UserComment.objects.values_list('pk', flat=True)))
+
+
+class CountTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reviews = Review.objects.filter(is_published=True)
+        self.first = make_review('First')
+
+    def test_counts_are_cached_until_reviews_change(self):
+        self.assertEqual(cached_count(self.reviews), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(self.reviews), 1)
+        # Each filter has its own count
+        self.assertEqual(cached_count(self.reviews.filter(title='None')), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_review('Second')
+        self.assertEqual(cached_count(self.reviews), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.filter(pk=self.first.pk).update_and_purge(
+                is_published=False)
+        self.assertEqual(cached_count(self.reviews), 1)
+
+    @override_settings(COUNT_ESTIMATE_THRESHOLD=1000)
+    def test_large_listings_use_the_planner_estimate(self):
+        with mock.patch('reviews.counts.estimated_count',
+                        return_value=250000):
+            self.assertEqual(cached_count(self.reviews), 250000)
+        # Small listings are counted exactly
+        with mock.patch('reviews.counts.estimated_count', return_value=5):
+            self.assertEqual(cached_count(self.reviews.filter(pk=-1)), 0)
+
+    def test_list_pages_show_the_count(self):
+        for n in range(17):
+            make_review(f'Game {n}')
+        response = self.client.get('/reviews/')
+        self.assertContains(response, 'Showing 1-16 of 18 reviews')
+
+
+class PageCacheTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.review = make_review('Cached Game')
+        self.url = f'/reviews/{self.review.slug}/'
+
+    def assertCached(self, url):
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_tag_keys_are_valid_memcached_keys(self):
+        key = tag_key('genre:role-playing (rpg)')
+        self.assertEqual(list(memcache_key_warnings(key)), [])
+
+    def test_comment_approval_purges_review_page(self):
+        self.assertCached(self.url)
+        author = User.objects.create_user('commenter')
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = UserComment.objects.create(
+                review=self.review, author=author, body='Worth a replay')
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        self.assertCached(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserComment.objects.filter(pk=comment.pk).approve()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Worth a replay')
+
+    def test_company_rename_purges_pages_showing_it(self):
+        developer = self.review.developer
+        developer_url = f'/developers/{developer.slug}/'
+        for url in (self.url, '/developers/', developer_url):
+            self.assertCached(url)
+
+        developer.name = 'Renamed Studio'
+        with self.captureOnCommitCallbacks(execute=True):
+            developer.save()
+        for url in (self.url, '/developers/', developer_url):
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS', url)
+            self.assertContains(response, 'Renamed Studio')
+
+
+class MenuTests(PageTestCase):
+
+    def genre_names(self):
+        return list(Genre.objects.values_list('name', flat=True))
+
+    def test_menus_are_built_once_and_only_when_used(self):
+        build = mock.Mock(side_effect=self.genre_names)
+        menu = lazy_menu('genres', build)
+        build.assert_not_called()
+        self.assertEqual(list(menu), [])
+        self.assertEqual(get_menu('genres', build), [])
+        self.assertEqual(build.call_count, 1)
+
+    def test_cached_pages_skip_the_menu_queries(self):
+        url = f"/reviews/{make_review('Menu Game').slug}/"
+        self.client.get(url)
+        # Only the page's version is read; the navbar comes from the page
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_menus_are_rebuilt_after_commit(self):
+        self.assertEqual(get_menu('genres', self.genre_names), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Genre.objects.create(name='Puzzle')
+            # A render before commit still gets the cached items
+            self.assertEqual(get_menu('genres', self.genre_names), [])
+        self.assertEqual(get_menu('genres', self.genre_names), ['Puzzle'])
+
+
+class ConditionalGetTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.review = make_review('Versioned Game')
+        self.genre = Genre.objects.create(name='Roguelike')
+        self.review.genres.add(self.genre)
+        self.developer = self.review.developer
+        self.urls = [
+            f'/reviews/{self.review.slug}/',
+            '/reviews/',
+            '/reviews/?genre=roguelike',
+            '/developers/',
+            f'/developers/{self.developer.slug}/',
+            '/',
+        ]
+
+    def etags(self):
+        etags = {}
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            etags[url] = response['ETag']
+        return etags
+
+    def assertNotModified(self, etags):
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+
+    def assertModified(self, etags, text):
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertContains(response, text, msg_prefix=url)
+
+    def test_revalidation_runs_one_query(self):
+        etags = self.etags()
+        with self.assertNumQueries(len(etags)):
+            self.assertNotModified(etags)
+
+    def test_etags_do_not_depend_on_process_caches(self):
+        etags = self.etags()
+        # Another worker, or this one after its caches expired
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.assertEqual(self.etags(), etags)
+        self.assertNotModified(etags)
+
+    def test_comment_approval_changes_review_page_etag(self):
+        url = self.urls[0]
+        etags = {url: self.client.get(url)['ETag']}
+        author = User.objects.create_user('commenter')
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = UserComment.objects.create(
+                review=self.review, author=author, body='Worth a replay')
+        # Pending comments are not shown
+        self.assertNotModified(etags)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserComment.objects.filter(pk=comment.pk).approve()
+        self.assertModified(etags, 'Worth a replay')
+
+    def test_company_rename_changes_etags(self):
+        etags = self.etags()
+        self.developer.name = 'Renamed Studio'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.developer.save()
+        # Every navbar lists the developers
+        self.assertModified(etags, 'Renamed Studio')
+
+    def test_genre_rename_changes_etags(self):
+        etags = self.etags()
+        self.genre.name = 'Roguelite'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.save()
+        # Every navbar lists the genres
+        self.assertModified(etags, 'Roguelite')
+
+    def test_review_deletion_changes_list_etags(self):
+        other = make_review('Doomed Game')
+        etags = self.etags()
+        del etags[self.urls[0]]
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotContains(response, 'Doomed Game')
+
+    def test_genre_deletion_changes_etags(self):
+        etags = self.etags()
+        del etags['/reviews/?genre=roguelike']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.genre.delete()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_unrelated_review_change_keeps_review_page_etag(self):
+        url = self.urls[0]
+        etags = {url: self.client.get(url)['ETag']}
+        with self.captureOnCommitCallbacks(execute=True):
+            make_review('Another Game')
+        self.assertNotModified(etags)
+
+    def test_unpublished_review_page_is_not_versioned(self):
+        url = self.urls[0]
+        etags = {url: self.client.get(url)['ETag']}
+        self.review.is_published = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review.save()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class ViewCounterTests(PageTestCase):
+    browser = 'Mozilla/5.0 (X11; Linux x86_64) Firefox/130.0'
+
+    def setUp(self):
+        super().setUp()
+        self.review = make_review('Counted Game')
+        view_counts.counter.take()
+        self.addCleanup(view_counts.counter.take)
+
+    def test_flush_writes_one_update_per_review(self):
+        other = make_review('Other Game')
+        updated_on = self.review.updated_on
+        counter = view_counts.ViewCounter()
+        for slug in [self.review.slug] * 3 + [other.slug]:
+            counter.add(slug)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(counter.flush(), 2)
+        self.review.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.review.views, other.views), (3, 1))
+        # Views are not shown, so the page version must not move
+        self.assertEqual(self.review.updated_on, updated_on)
+        self.assertEqual(counter.take(), {})
+
+    def test_failed_flush_keeps_views_and_retries_when_full(self):
+        counter = view_counts.ViewCounter()
+        self.addCleanup(counter.take)
+        with override_settings(VIEW_COUNT_FLUSH_SIZE=2), \
+                mock.patch.object(counter, 'start_flush') as start_flush:
+            counter.add(self.review.slug)
+            counter.add(self.review.slug)
+            self.assertEqual(start_flush.call_count, 1)
+            with mock.patch.object(
+                    QuerySet, 'update', side_effect=DatabaseError), \
+                    self.assertLogs('reviews.view_counts', 'ERROR'):
+                self.assertEqual(counter.flush(), 0)
+            self.assertEqual(counter.total, 2)
+
+            # Past the flush size after the failure, the next view flushes
+            counter.add(self.review.slug)
+            self.assertEqual(start_flush.call_count, 2)
+        counter.flush()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views, 3)
+
+    def test_failed_flush_is_retried_by_the_timer(self):
+        counter = view_counts.ViewCounter()
+        self.addCleanup(counter.take)
+        with mock.patch('reviews.view_counts.threading.Timer') as timer:
+            counter.add(self.review.slug)
+            self.assertEqual(timer.call_count, 1)
+            with mock.patch.object(
+                    QuerySet, 'update', side_effect=DatabaseError), \
+                    self.assertLogs('reviews.view_counts', 'ERROR'):
+                self.assertEqual(counter.flush(), 0)
+            # No new view arrives, yet a retry is scheduled
+            self.assertEqual(timer.call_count, 2)
+            self.assertIs(counter.timer, timer.return_value)
+            timer.return_value.start.assert_called()
+
+            # The scheduled flush writes the kept views
+            flush = timer.call_args.args[1]
+            with mock.patch('reviews.view_counts.connection'):
+                flush()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.views, 1)
+        self.assertIsNone(counter.timer)
+
+    def test_repeat_views_bots_and_prefetches_are_not_counted(self):
+        url = f'/reviews/{self.review.slug}/'
+        for _ in range(3):
+            self.client.get(url, HTTP_USER_AGENT=self.browser)
+        self.client.get(url, HTTP_USER_AGENT='Googlebot/2.1')
+        self.client.get(url)
+        self.client.get(url, HTTP_USER_AGENT=self.browser,
+                        REMOTE_ADDR='10.0.0.2', HTTP_SEC_PURPOSE='prefetch')
+        self.client.head(url, HTTP_USER_AGENT=self.browser,
+                         REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(view_counts.counter.pending, {self.review.slug: 1})
+
+        # Another visitor, served from the page cache, still counts
+        response = self.client.get(url, HTTP_USER_AGENT=self.browser,
+                                   REMOTE_ADDR='10.0.0.4')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(view_counts.counter.pending, {self.review.slug: 2})
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTests(TestCase):
+
+    def get(self):
+        with self.assertLogs('reviews.timing', 'INFO') as logs:
+            response = self.client.get('/reviews/')
+        fields = json.loads(logs.records[0].getMessage())
+        self.assertEqual((fields['path'], fields['status']),
+                         ('/reviews/', 200))
+        return response
+
+    def test_only_staff_get_the_header(self):
+        self.assertFalse(self.get().has_header('Server-Timing'))
+        self.client.force_login(User.objects.create_user('member'))
+        self.assertFalse(self.get().has_header('Server-Timing'))
+
+        self.client.force_login(
+            User.objects.create_user('editor', is_staff=True))
+        self.assertIn('db;dur=', self.get()['Server-Timing'])
+
+    @override_settings(DEBUG=True)
+    def test_everyone_gets_the_header_under_debug(self):
+        self.assertTrue(self.get().has_header('Server-Timing'))
+
+
+class RateLimitTests(TransactionTestCase):
+
+    def test_tokens_are_committed_at_once(self):
+        acquire('test', rate=1, burst=2)
+        acquire('test', rate=1, burst=2)
+        bucket = RateLimitBucket.objects.get(name='test')
+        self.assertLess(bucket.tokens, 0.1)
+
+    def test_refuses_to_run_inside_a_transaction(self):
+        with transaction.atomic(), self.assertRaises(RuntimeError):
+            acquire('test', rate=1, burst=2)
+        self.assertFalse(RateLimitBucket.objects.exists())
+
+    def test_callers_over_budget_wait_for_their_token(self):
+        now = timezone.now()
+        with mock.patch('reviews.throttle.timezone') as clock, \
+                mock.patch('reviews.throttle.time') as sleeper:
+            clock.now.return_value = now
+            for _ in range(3):
+                acquire('test', rate=2, burst=1)
+            # Tokens refill at 2 a second, so the next arrives 0.5 s later
+            clock.now.return_value = now + datetime.timedelta(seconds=1)
+            acquire('test', rate=2, burst=1)
+        self.assertEqual(
+            [call.args[0] for call in sleeper.sleep.call_args_list],
+            [0.5, 1.0, 0.5])
+
+
+class SingleFlightTests(TestCase):
+
+    class CountingLock:
+        """A lock that reports each time it is taken"""
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.taken = threading.Semaphore(0)
+
+        def __enter__(self):
+            self.lock.acquire()
+            self.taken.release()
+
+        def __exit__(self, *exc_info):
+            self.lock.release()
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        flight.lock = lock = self.CountingLock()
+        release = threading.Event()
+        function = mock.Mock(side_effect=lambda: release.wait(5) and 'games')
+        results = []
+
+        def call():
+            results.append(flight.do('key', function))
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+            # Each caller has registered or found the call in flight
+            self.assertTrue(lock.taken.acquire(timeout=5))
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual(results, ['games'] * 4)
+        self.assertEqual(flight.calls, {})
+
+
+@override_settings(IGDB_CLIENT_ID='id', IGDB_CLIENT_SECRET='secret')
+class IGDBQueryTests(TestCase):
+
+    def test_search_terms_are_escaped(self):
+        service = IGDBService()
+        wrapper = mock.Mock()
+        wrapper.api_request.return_value = b'[]'
+        with mock.patch.object(service, 'initialize_wrapper',
+                               return_value=wrapper):
+            service.fetch_games_with_platforms('Say "Hi" \\ Bye', limit=1)
+        query = wrapper.api_request.call_args.args[1]
+        self.assertIn('search "Say \\"Hi\\" \\\\ Bye"; limit 1;', query)
+
+
+class IGDBSnapshotTests(PageTestCase):
+
+    def test_detail_pages_render_the_stored_snapshot(self):
+        review = make_review('Braid', igdb_data=build_game_snapshot({
+            'platforms': [{'name': 'PC'}],
+            'genres': [{'name': 'Puzzle'}],
+            # Only the earliest date per platform is kept
+            'release_dates': [
+                {'date': 1240000000, 'platform': {'name': 'PC'}},
+                {'date': 1230811200, 'platform': {'name': 'PC'}},
+            ],
+            'developers': [{'name': 'Number None'}],
+        }))
+        with mock.patch('requests.Session.request',
+                        side_effect=AssertionError('No IGDB calls')):
+            response = self.client.get(f'/reviews/{review.slug}/')
+        self.assertEqual(response.context['game_release_dates'], [{
+            'platform': 'PC', 'date': 'January 01, 2009',
+            'timestamp': 1230811200}])
+        self.assertContains(response, 'Puzzle')
+        self.assertContains(response, 'Number None')
+
+    def test_companies_resolve_in_one_query_per_table(self):
+        nintendo = Developer.objects.create(name='Nintendo EPD')
+        Publisher.objects.create(name='Nintendo')
+        unknown = {'name': 'Unknown Studio'}
+        with self.assertNumQueries(1):
+            resolved = resolve_companies(
+                Developer, [{'name': 'NINTENDO EPD'}, unknown, {}])
+        self.assertEqual(resolved, [nintendo, unknown, {}])
+
+        review = make_review('Odyssey', igdb_data={
+            'developers': [{'name': 'nintendo epd'}],
+            'publishers': [{'name': 'Nintendo'}, unknown],
+        })
+        response = self.client.get(f'/reviews/{review.slug}/')
+        self.assertEqual(response.context['game_developers'], [nintendo])
+        self.assertEqual(
+            [type(company) for company in
+             response.context['game_publishers']], [Publisher, dict])
+        self.assertNotIn('developer_db', response.context)
+
+    def test_refresh_updates_only_stale_snapshots(self):
+        old = timezone.now() - datetime.timedelta(days=30)
+        stale = make_review('Stale', igdb_id=7, igdb_synced_on=old)
+        make_review('Fresh', igdb_id=8, igdb_synced_on=timezone.now())
+        service = mock.Mock()
+        service.fetch_games_by_ids.return_value = {
+            7: {'id': 7, 'platforms': [{'name': 'Switch'}]}}
+        with mock.patch('reviews.management.commands.refresh_igdb_data.'
+                        'get_igdb_service', return_value=service):
+            call_command('refresh_igdb_data', stdout=StringIO())
+        service.fetch_games_by_ids.assert_called_once_with([7])
+        stale.refresh_from_db()
+        self.assertEqual(stale.igdb_data['platforms'], [{'name': 'Switch'}])
+        self.assertGreater(stale.igdb_synced_on, old)
+
+
+@override_settings(IGDB_CLIENT_ID='id', IGDB_CLIENT_SECRET='secret')
+class IGDBTokenTests(TestCase):
+
+    def setUp(self):
+        self.service = IGDBService()
+        self.service.session = mock.Mock()
+        self.service.session.post.side_effect = self.issue_token
+        self.issued = 0
+        patcher = mock.patch('reviews.igdb_service.time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time.time.return_value = 1000
+
+    def issue_token(self, *args, **kwargs):
+        self.issued += 1
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {
+            'access_token': f'token{self.issued}', 'expires_in': 3600}
+        return response
+
+    def test_tokens_are_reused_until_their_refresh_window(self):
+        self.assertEqual(self.service.get_access_token(), 'token1')
+        wrapper = self.service.initialize_wrapper()
+        margin = self.service.token_refresh_margin
+        self.time.time.return_value += 3600 - margin - 1
+        self.assertEqual(self.service.get_access_token(), 'token1')
+
+        self.time.time.return_value += 1
+        self.assertEqual(self.service.get_access_token(), 'token2')
+        self.assertEqual(wrapper.auth_token, 'token2')
+        self.assertEqual(self.service.stats()['token_refreshes'], 2)
+
+    def test_concurrent_callers_share_one_refresh(self):
+        release = threading.Event()
+        issue_token = self.issue_token
+        self.service.session.post.side_effect = (
+            lambda *args, **kwargs: release.wait(5) and issue_token())
+        tokens = []
+        threads = [threading.Thread(
+            target=lambda: tokens.append(self.service.get_access_token()))
+            for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(tokens, ['token1'] * 4)
+        self.assertEqual(self.service.session.post.call_count, 1)
+
+    def test_one_service_per_process(self):
+        with mock.patch('reviews.igdb_service._service', None):
+            self.assertIs(get_igdb_service(), get_igdb_service())
+
+
+class IGDBRetryTests(TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        self.wrapper = SessionIGDBWrapper('id', 'token', self.session)
+        for target in ('acquire', 'time'):
+            patcher = mock.patch(f'reviews.igdb_service.{target}')
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def response(self, status, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        response._content = b'[]'
+        return response
+
+    def test_throttled_and_failed_requests_are_retried(self):
+        self.session.post.side_effect = [
+            self.response(429, {'Retry-After': '3'}),
+            self.response(503),
+            requests.Timeout('slow'),
+            self.response(200),
+        ]
+        self.assertEqual(self.wrapper.send('games', 'fields name;'), b'[]')
+        self.assertEqual(self.wrapper.retries, 3)
+        # Every attempt takes a rate limit token
+        self.assertEqual(self.acquire.call_count, 4)
+        delays = [call.args[0] for call in self.time.sleep.call_args_list]
+        self.assertEqual(delays[0], 3)
+        self.assertTrue(0 <= delays[1] <= 1 and 0 <= delays[2] <= 2)
+
+    def test_gives_up_after_the_last_retry(self):
+        self.session.post.return_value = self.response(502)
+        with self.assertRaises(requests.HTTPError):
+            self.wrapper.send('games', 'fields name;')
+        self.assertEqual(self.session.post.call_count,
+                         self.wrapper.max_retries + 1)
+
+    def test_client_errors_are_not_retried(self):
+        self.session.post.return_value = self.response(400)
+        with self.assertRaises(requests.HTTPError):
+            self.wrapper.send('games', 'fields name;')
+        self.assertEqual(self.session.post.call_count, 1)
+
+
+@override_settings(IGDB_CLIENT_ID='id', IGDB_CLIENT_SECRET='secret')
+class IGDBCacheTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.service = IGDBService()
+        self.fetch = mock.Mock(side_effect=[['old'], ['new']])
+        self.service.fetch_games_with_platforms = self.fetch
+        for target in ('time', 'threading'):
+            patcher = mock.patch(f'reviews.igdb_service.{target}')
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.time.time.return_value = 1000
+        # Run background refreshes in the calling thread
+        self.threading.Thread.side_effect = (
+            lambda target, **kwargs: mock.Mock(start=target))
+
+    def test_stale_entries_are_served_while_they_refresh(self):
+        search = self.service.search_games_with_platforms
+        self.assertEqual(search('Portal'), ['old'])
+        self.assertEqual(search('Portal'), ['old'])
+        self.assertEqual(self.fetch.call_count, 1)
+
+        self.time.time.return_value += self.service.cache_ttl
+        self.assertEqual(search('Portal'), ['old'])
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(search('Portal'), ['new'])
+
+    def test_searches_share_entries_by_normalized_query(self):
+        search = self.service.search_games_with_platforms
+        self.assertEqual(search('Portal  2'), ['old'])
+        self.assertEqual(search(' portal 2 '), ['old'])
+        self.assertEqual(search('Portal 2', limit=1), ['new'])
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_failed_searches_are_not_cached(self):
+        self.fetch.side_effect = [requests.ConnectionError(), ['games']]
+        search = self.service.search_games_with_platforms
+        with self.assertLogs('reviews.igdb_service', 'ERROR'):
+            self.assertEqual(search('Portal'), [])
+        self.assertEqual(search('Portal'), ['games'])
+
+    def test_one_refresh_runs_at_a_time(self):
+        search = self.service.search_games_with_platforms
+        search('Portal')
+        self.time.time.return_value += self.service.cache_ttl
+        with mock.patch.object(self.service.cache, 'add',
+                               return_value=False):
+            self.assertEqual(search('Portal'), ['old'])
+        self.assertEqual(self.fetch.call_count, 1)
+        self.threading.Thread.assert_not_called()
+
+
+class ImporterTests(PageTestCase):
+
+    def entry(self, title, developer, publisher):
+        return {
+            'game': {'id': None, 'name': title,
+                     'developers': [{'name': developer}],
+                     'publishers': [{'name': publisher}]},
+            'review_score': 80, 'is_published': True, 'is_featured': False,
+        }
+
+    def test_companies_match_ignoring_case_and_punctuation(self):
+        existing = Developer.objects.create(name='Sega')
+        Publisher.objects.create(name='Square Enix Ltd', slug='square-enix')
+        result = import_games([
+            self.entry('First', 'SEGA', 'Square-Enix'),
+            self.entry('Second', 'sega', 'SQUARE ENIX'),
+            self.entry('Third', 'Bandai Namco', 'Bandai Namco'),
+            self.entry('Fourth', 'BANDAI NAMCO', 'Bandai-Namco'),
+        ])
+        self.assertEqual(len(result['created']), 4)
+        self.assertEqual(
+            {review.developer.pk for review in result['created'][:2]},
+            {existing.pk})
+        self.assertEqual(Developer.objects.count(), 2)
+        self.assertEqual(
+            list(Publisher.objects.values_list('name', flat=True)),
+            ['Bandai Namco', 'Square Enix Ltd'])
+
+    def test_name_clash_falls_back_to_one_by_one(self):
+        # Same name, another slug, and added after the preload
+        Developer.objects.create(name='Atlus', slug='atlus-japan')
+        with mock.patch('reviews.importer.load_companies',
+                        side_effect=lambda *args: {}):
+            result = import_games([
+                self.entry('First', 'Atlus', 'Atlus'),
+                self.entry('Second', 'Vanillaware', 'Atlus'),
+            ])
+        self.assertEqual(
+            [review.developer.slug for review in result['created']],
+            ['atlus-japan', 'vanillaware'])
+        self.assertEqual(Developer.objects.count(), 2)
+
+    def test_failed_logo_uploads_keep_the_placeholder(self):
+        entry = self.entry('First', 'Sega', 'Atlus')
+        entry['game']['developers'][0]['logo_url'] = '//images/sega.png'
+        with mock.patch.object(AssetPipeline, 'transfer', return_value=None):
+            import_games([entry])
+        self.assertEqual(
+            Developer.objects.get(name='Sega').logo.public_id, 'placeholder')
+
+    def test_reviewers_are_drawn_from_the_whole_table(self):
+        User.objects.bulk_create(
+            [User(username=f'user{n}') for n in range(20)])
+        pks = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        with mock.patch('reviews.importer.REVIEWER_POOL_SIZE', 5):
+            with mock.patch('random.randint', return_value=pks[17]):
+                self.assertEqual(reviewer_ids(), pks[17:] + pks[:2])
+
+
+class SearchTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.portal = make_review('Portal')
+        self.other = make_review('Half-Life')
+        self.other.description = 'Made by the studio behind Portal.'
+        self.other.save()
+
+    def search(self, query):
+        return [review.title for review in search_reviews(
+            query, Review.objects.filter(is_published=True))]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('portal'), ['Portal', 'Half-Life'])
+        self.assertEqual(self.search('half li'), ['Half-Life'])
+        self.assertEqual(self.search('   '), [])
+
+    def test_index_follows_genres_companies_and_deletes(self):
+        puzzle = Genre.objects.create(name='Puzzle')
+        self.portal.genres.add(puzzle)
+        self.assertEqual(self.search('puzzle'), ['Portal'])
+
+        developer = self.portal.developer
+        developer.name = 'Valve'
+        developer.save()
+        self.assertEqual(sorted(self.search('valve')), ['Half-Life', 'Portal'])
+
+        self.portal.delete()
+        self.assertEqual(self.search('puzzle'), [])
+
+    def test_typos_still_find_titles(self):
+        if connection.vendor == 'postgresql' and not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        self.assertEqual(self.search('protal')[:1], ['Portal'])
+
+
+class AIReviewTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client_mock = mock.Mock()
+        self.client_mock.complete.return_value = mock.Mock(
+            choices=[mock.Mock(message=mock.Mock(content='<p>Great</p>'))],
+            usage=mock.Mock(prompt_tokens=40, completion_tokens=600))
+        for target, value in (('get_client', self.client_mock),
+                              ('close_old_connections', None)):
+            patcher = mock.patch(f'reviews.ai_reviews.{target}',
+                                 return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_text_is_generated_once_per_title(self):
+        first = make_review('Celeste', ai_review_status='pending')
+        second = make_review(' CELESTE', ai_review_status='pending')
+        self.assertTrue(ai_reviews.write_review(first.pk))
+        self.assertTrue(ai_reviews.write_review(second.pk))
+
+        self.assertEqual(self.client_mock.complete.call_count, 1)
+        for review in (first, second):
+            review.refresh_from_db()
+            self.assertEqual(
+                (review.ai_review_status, review.review_text),
+                ('ready', '<p>Great</p>'))
+        generated = GeneratedReview.objects.get()
+        self.assertEqual(
+            (generated.title, generated.prompt_tokens,
+             generated.completion_tokens), ('celeste', 40, 600))
+
+    def test_failures_mark_the_review(self):
+        review = make_review('Celeste', ai_review_status='pending')
+        self.client_mock.complete.side_effect = TimeoutError()
+        with self.assertLogs('reviews.ai_reviews', 'ERROR'):
+            self.assertFalse(ai_reviews.write_review(review.pk))
+        review.refresh_from_db()
+        self.assertEqual(review.ai_review_status, 'failed')
+        self.assertFalse(GeneratedReview.objects.exists())
+
+    def test_reviews_are_queued_after_commit(self):
+        executor = mock.Mock()
+        with mock.patch('reviews.ai_reviews.get_executor',
+                        return_value=executor), \
+                self.captureOnCommitCallbacks(execute=True):
+            futures = ai_reviews.queue_reviews([1, 2])
+            executor.submit.assert_not_called()
+        self.assertEqual(
+            executor.submit.call_args_list,
+            [mock.call(ai_reviews.write_review, 1),
+             mock.call(ai_reviews.write_review, 2)])
+        self.assertEqual(len(futures), 2)
+
+
+@override_settings(JOB_CHUNK_SIZE=2)
+class JobTests(TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.failures = set()
+        patcher = mock.patch.dict(jobs.HANDLERS, {'test': self.handle})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, job, chunk):
+        for item in chunk:
+            if item in self.failures:
+                self.failures.discard(item)
+                raise ValueError(f'Item {item} failed')
+        self.handled.append(chunk)
+        return {'done': len(chunk), 'items': chunk}
+
+    def test_jobs_are_claimed_once_until_their_lease_expires(self):
+        first = jobs.enqueue('test', [1])
+        second = jobs.enqueue('test', [2])
+        later = jobs.enqueue('test', [3])
+        Job.objects.filter(pk=later.pk).update(
+            run_after=timezone.now() + datetime.timedelta(hours=1))
+        self.assertEqual(jobs.claim_job(), first)
+        self.assertEqual(jobs.claim_job(), second)
+        self.assertIsNone(jobs.claim_job())
+
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ('running', 1))
+        self.assertGreater(first.locked_until, timezone.now())
+        # Its worker died: the job can be claimed again
+        Job.objects.filter(pk=first.pk).update(
+            locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        claimed = jobs.claim_job()
+        self.assertEqual((claimed, claimed.attempts), (first, 2))
+
+    def test_failed_chunks_resume_where_the_job_stopped(self):
+        job = jobs.enqueue('test', [1, 2, 3, 4, 5])
+        self.failures = {3}
+        self.assertEqual(jobs.run_job(jobs.claim_job()), 'queued')
+        job.refresh_from_db()
+        self.assertEqual((job.completed, job.error), (2, 'Item 3 failed'))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(jobs.claim_job())
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(jobs.run_job(jobs.claim_job()), 'done')
+        job.refresh_from_db()
+        self.assertEqual(self.handled, [[1, 2], [3, 4], [5]])
+        self.assertEqual(job.result, {'done': 5, 'items': [1, 2, 3, 4, 5]})
+        self.assertEqual((job.completed, job.items, job.error), (5, [], ''))
+
+    def test_jobs_fail_after_their_last_attempt(self):
+        job = jobs.enqueue('test', [1], max_attempts=1)
+        self.failures = {1}
+        self.assertEqual(jobs.run_job(jobs.claim_job()), 'failed')
+        job.refresh_from_db()
+        self.assertIsNotNone(job.finished_on)
+
+    def test_progress_is_polled_as_json(self):
+        job = jobs.enqueue('test', [1, 2, 3])
+        jobs.run_job(jobs.claim_job())
+        url = reverse('reviews:job_progress', args=[job.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_superuser('admin'))
+        progress = self.client.get(url).json()
+        self.assertEqual(
+            (progress['status'], progress['completed'], progress['total']),
+            ('done', 3, 3))
+
+
+class FakeUpstreamTests(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.upstream = FakeUpstream().start()
+        cls.addClassCleanup(cls.upstream.stop)
+
+    def setUp(self):
+        settings_override = override_settings(**self.upstream.settings())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_igdb_searches_are_served_from_the_recording(self):
+        service = IGDBService()
+        self.addCleanup(service.session.close)
+        games = service.fetch_games_with_platforms('Portal 2', limit=1)
+        self.assertEqual([game['name'] for game in games], ['Portal 2'])
+        self.assertTrue(games[0]['cover_url'].startswith(
+            f'{self.upstream.base_url}/images/'))
+        # Titles missing from the recording still find a game
+        games = service.fetch_games_with_platforms('Unrecorded', limit=1)
+        self.assertEqual([game['name'] for game in games], ['Unrecorded'])
+        self.assertEqual(self.upstream.stats()['twitch'], {'200': 1})
+
+    def test_images_upload_and_ai_text_are_served(self):
+        with AssetPipeline() as pipeline:
+            key = pipeline.add(COVER_FOLDER, 'Portal 2',
+                               f'{self.upstream.base_url}/images/cover.jpg')
+            pipeline.run()
+        self.assertEqual(pipeline.get(key), 'game_covers/portal_2')
+        self.assertIn('Portal 2 is a confident',
+                      ai_reviews.generate_review_text('Portal 2'))
+
+    def test_faults_are_injected_per_service(self):
+        with FakeUpstream(throttle_rate=1, services=['igdb'],
+                          seed=1) as upstream:
+            response = requests.post(f'{upstream.base_url}/v4/games')
+            self.assertEqual(
+                (response.status_code, response.headers['Retry-After']),
+                (429, '1'))
+            self.assertEqual(requests.get(
+                f'{upstream.base_url}/images/x.jpg').status_code, 200)
+            self.assertEqual(upstream.stats(), {
+                'igdb': {'429': 1}, 'images': {'200': 1}})
+
+
+class QueryPlanTests(PageTestCase):
+
+    # Without statistics SQLite picks an index whenever one fits, so a full
+    # scan means the index is missing; PostgreSQL rightly scans tiny tables
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite plans only')
+    def test_hot_queries_scan_no_whole_tables(self):
+        genre = Genre.objects.create(name='Puzzle')
+        author = User.objects.create_user('commenter')
+        for n in range(3):
+            review = make_review(f'Game {n}', is_featured=True)
+            review.genres.add(genre)
+            UserComment.objects.create(review=review, author=author,
+                                       body='Pending')
+            UserReview.objects.create(game=review, user=author, rating=7,
+                                      review_text='Fine', approved=True)
+        output = StringIO()
+        # Every full scan counts, however small the table
+        call_command('explain_hot_queries', min_rows=0, stdout=output)
+        self.assertNotIn('sequential scan', output.getvalue())
+        self.assertIn('review_comments (first page): OK', output.getvalue())
+
+    def test_other_databases_are_refused(self):
+        queryset = Review.objects.all()
+        with mock.patch.object(connection, 'vendor', 'oracle'), \
+                self.assertRaises(CommandError):
+            sequential_scans(queryset)
+
+
+class AssetPipelineTests(TestCase):
+
+    def setUp(self):
+        self.pipeline = AssetPipeline(max_workers=1)
+        self.addCleanup(self.pipeline.close)
+        patcher = mock.patch('reviews.assets.time.sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def response(self, status, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        response._content = b'GIF89a'
+        return response
+
+    def transfer(self, downloads, uploads):
+        self.pipeline.session.get = mock.Mock(side_effect=downloads)
+        upload = mock.Mock(side_effect=uploads)
+        with mock.patch('cloudinary.uploader.upload', upload):
+            key = self.pipeline.add(COVER_FOLDER, 'Braid', '//img/braid.jpg')
+            self.pipeline.run()
+        return self.pipeline.get(key), upload
+
+    def test_throttled_and_failed_requests_are_retried(self):
+        public_id, upload = self.transfer(
+            [self.response(429, {'Retry-After': '2'}),
+             requests.ConnectionError('reset'),
+             self.response(200)],
+            [cloudinary_errors.RateLimited('Too Many Requests'),
+             cloudinary_errors.Error('Socket error'),
+             {'public_id': 'game_covers/braid'}])
+        self.assertEqual(public_id, 'game_covers/braid')
+        self.assertEqual(self.pipeline.errors, [])
+        self.assertEqual(self.pipeline.session.get.call_count, 3)
+        self.assertEqual(upload.call_count, 3)
+        # Retry-After is honoured; the other waits are jittered backoff
+        self.assertEqual(self.sleep.call_count, 4)
+        self.assertEqual(self.sleep.call_args_list[0], mock.call(2))
+
+    def test_client_errors_and_exhausted_retries_fail(self):
+        public_id, upload = self.transfer(
+            [self.response(200)], [cloudinary_errors.BadRequest('Bad')])
+        self.assertIsNone(public_id)
+        self.assertEqual(upload.call_count, 1)
+
+        self.pipeline.results.clear()
+        public_id, upload = self.transfer(
+            [self.response(503)] * 4, [])
+        self.assertIsNone(public_id)
+        self.assertEqual(self.pipeline.session.get.call_count, 4)
+        self.assertEqual(upload.call_count, 0)
+        self.assertEqual(len(self.pipeline.errors), 2)
+
+
+class AutocompleteTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        prefix_index.built_at = None
+        self.addCleanup(setattr, prefix_index, 'built_at', None)
+
+    def labels(self, prefix, limit=5):
+        return {kind: [match['label'] for match in matches]
+                for kind, matches in prefix_index.complete(
+                    prefix, limit).items()}
+
+    def test_changes_are_indexed_when_they_commit(self):
+        prefix_index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_review('Zelda Saga')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    make_review('Zelda Phantom')
+                    raise DatabaseError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.labels('zel')['games'], ['Zelda Saga'])
+
+    def test_each_kind_stops_at_the_limit(self):
+        for n in range(4):
+            make_review(f'Mega Man {n} Mega')
+        Genre.objects.create(name='Metroidvania')
+        prefix_index.build()
+        labels = self.labels('me', limit=2)
+        # A name matching under several word starts is listed once
+        self.assertEqual(labels['games'],
+                         ['Mega Man 0 Mega', 'Mega Man 1 Mega'])
+        self.assertEqual(labels['genres'], ['Metroidvania'])
+        self.assertEqual(labels['developers'], [])
+
+    def test_concurrent_requests_share_one_build(self):
+        index = PrefixIndex()
+        builds = []
+
+        def build():
+            builds.append(1)
+            time.sleep(0.05)
+            index.built_at = time.monotonic()
+
+        with mock.patch.object(index, 'build', side_effect=build):
+            threads = [threading.Thread(target=index.ensure_built)
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            index.ensure_built()
+        self.assertEqual(builds, [1])
+
+
+class IGDBParserTests(TestCase):
+
+    def setUp(self):
+        path = Path(__file__).resolve().parent / 'benchmarks' / \
+            'igdb_games.json'
+        with open(path) as payload:
+            # Parsed without the service, which needs IGDB credentials
+            parser = GameParser()
+            self.games = [game.to_dict()
+                          for game in parser.parse_all(json.load(payload))]
+        self.by_name = {game['name']: game for game in self.games}
+
+    def test_shared_companies_are_copied_per_game(self):
+        portal = self.by_name['Portal 2']
+        half_life = self.by_name['Half-Life 2']
+        self.assertEqual(portal['developers'], half_life['developers'])
+        portal['developers'][0]['name'] = 'Changed'
+        portal['genres'][0]['name'] = 'Changed'
+        self.assertEqual(half_life['developers'][0]['name'],
+                         'Valve Corporation')
+        self.assertEqual(half_life['genres'][0]['name'], 'Shooter')
+
+    def test_missing_fields_get_defaults(self):
+        braid = self.by_name['Braid']
+        self.assertEqual(
+            (braid['summary'], braid['cover_url'], braid['platforms'],
+             braid['developers'], braid['publishers']),
+            ('', '', [], [], []))
+        self.assertNotIn('release_dates', braid)
+        # Only a supporting company, neither developer nor publisher
+        self.assertEqual(
+            self.by_name['Star Wars: Knights of the Old Republic'][
+                'developers'], [])
+        nintendo = self.by_name['Super Mario Odyssey']['publishers'][0]
+        self.assertEqual((nintendo['founded_year'], nintendo['website']),
+                         ('', 'https://www.nintendo.com'))
+        unreleased = self.by_name['Hollow Knight: Silksong']
+        self.assertTrue(all('date' not in release
+                            for release in unreleased['release_dates']))
+
+
+class ApprovalQueueTests(PageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin')
+        self.client.force_login(self.admin)
+        review = make_review('Queued')
+        UserComment.objects.bulk_create([
+            UserComment(review=review, author=self.admin, body=f'{n}')
+            for n in range(5)
+        ])
+
+    @mock.patch('reviews.admin_views.APPROVAL_PAGE_SIZE', 2)
+    def test_pending_comments_are_paginated(self):
+        url = reverse('reviews:approve_comments')
+        bodies = []
+        response = self.client.get(url)
+        while True:
+            self.assertEqual(response.context['total_unapproved'], 5)
+            page = response.context['page_obj']
+            bodies += [comment.body for comment in page]
+            if not page.has_next():
+                break
+            response = self.client.get(url, {'cursor': page.next_cursor})
+        self.assertEqual(sorted(bodies), ['0', '1', '2', '3', '4'])
+        self.assertEqual(len(bodies), 5)
+
+        # The total stays exact after approving from a later page
+        response = self.client.post(
+            f'{url}?cursor={page.cursor}',
+            {'action': 'approve', 'comment_ids': [page[0].pk]})
+        self.assertEqual(response.context['total_unapproved'], 4)
@@ -0,0 +1,98 @@
+"""
+Throttling helpers for upstream APIs.
+
+``acquire`` takes a token from a RateLimitBucket row, so every thread and
+gunicorn process shares one budget. A caller over budget reserves the
+next token anyway and sleeps until it is due, which keeps the wait to a
+single database round-trip. It commits the token at once, so it may not
+be called inside a transaction. ``SingleFlight`` lets concurrent identical
+requests in a process share one upstream call, and ``retry_delay`` is the
+backoff every upstream client waits between attempts.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+import random
+import threading
+import time
+
+
+# Threads of one process take turns; this also avoids SQLite's "database
+# is locked" errors when two threads upgrade read locks at once
+_bucket_lock = threading.Lock()
+
+
+def acquire(name, rate, burst):
+    """Block until a token from bucket ``name`` is available"""
+    from .models import RateLimitBucket
+
+    # Inside a transaction the bucket's row lock would be held until that
+    # transaction commits, queueing every other caller behind it
+    if connection.in_atomic_block:
+        raise RuntimeError(
+            f'Rate limit bucket {name!r} cannot be used inside a '
+            f'transaction')
+
+    with _bucket_lock, transaction.atomic():
+        now = timezone.now()
+        bucket, created = (
+            RateLimitBucket.objects.select_for_update().get_or_create(
+                name=name, defaults={'tokens': burst, 'updated_on': now}))
+        elapsed = max((now - bucket.updated_on).total_seconds(), 0)
+        tokens = min(burst, bucket.tokens + elapsed * rate) - 1
+        bucket.tokens = tokens
+        bucket.updated_on = now
+        bucket.save(update_fields=['tokens', 'updated_on'])
+
+    if tokens < 0:
+        time.sleep(-tokens / rate)
+
+
+# Upstream responses worth another attempt: throttling and server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def backoff_delay(attempt, base, cap):
+    """Exponential backoff with full jitter for retry ``attempt`` (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_delay(attempt, base, cap, retry_after=None):
+    """
+    Seconds to wait before retrying ``attempt``: the server's Retry-After
+    when it gives whole seconds, otherwise ``backoff_delay``
+    """
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), cap)
+    return backoff_delay(attempt, base, cap)
+
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its result"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, function):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event()}
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = function()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
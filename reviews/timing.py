@@ -0,0 +1,178 @@
+"""
+Per-request performance instrumentation.
+
+ServerTimingMiddleware measures a sample of requests (see
+SERVER_TIMING_SAMPLE_RATE): SQL queries through
+``connection.execute_wrapper``, template rendering through the
+TimedDjangoTemplates backend, cache hits and misses reported by
+``record_cache``, and outbound calls wrapped in ``upstream()``. The totals
+are logged as one JSON line on the 'reviews.timing' logger, and sent in a
+``Server-Timing`` header to staff (or to everyone when DEBUG is on) only,
+since they show how the site's backends perform.
+
+Requests that are not sampled, and code running outside a request (jobs,
+commands), only pay for a context variable lookup.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+import json
+import logging
+import random
+import time
+
+
+logger = logging.getLogger('reviews.timing')
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Counters for one sampled request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.upstream = {}  # service -> [calls, seconds]
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def metrics(self):
+        """(name, milliseconds, description) for each measurement"""
+        metrics = [
+            ('db', self.db * 1000, f'{self.queries} queries'),
+            ('tpl', self.template * 1000, 'templates'),
+            ('cache', None,
+             f'{self.cache_hits} hits, {self.cache_misses} misses'),
+        ]
+        for service, (calls, seconds) in sorted(self.upstream.items()):
+            metrics.append((service, seconds * 1000, f'{calls} call(s)'))
+        metrics.append(
+            ('total', (time.perf_counter() - self.started) * 1000, None))
+        return metrics
+
+
+def current():
+    """The timings of the request being measured, or None"""
+    return _current.get()
+
+
+def record_cache(hit):
+    timings = _current.get()
+    if timings is not None:
+        if hit:
+            timings.cache_hits += 1
+        else:
+            timings.cache_misses += 1
+
+
+@contextmanager
+def upstream(service):
+    """Time an outbound call to ``service`` (igdb, cloudinary, ai, ...)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        calls, seconds = timings.upstream.get(service, (0, 0.0))
+        timings.upstream[service] = [
+            calls + 1, seconds + time.perf_counter() - started]
+
+
+def server_timing_header(metrics):
+    entries = []
+    for name, duration, description in metrics:
+        entry = name
+        if duration is not None:
+            entry += f';dur={duration:.1f}'
+        if description:
+            entry += f';desc="{description}"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        # Templates rendered from inside another render are already timed
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time reported per request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(
+            super().get_template(template_name).template, self)
+
+
+def show_server_timing(request):
+    """Whether ``request`` may see the Server-Timing header"""
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or bool(user and user.is_staff)
+
+
+class ServerTimingMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0)
+
+    def __call__(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        metrics = timings.metrics()
+        if show_server_timing(request):
+            response['Server-Timing'] = server_timing_header(metrics)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.queries,
+            'cache_hits': timings.cache_hits,
+            'cache_misses': timings.cache_misses,
+        }
+        fields.update(
+            (f'{name}_ms', round(duration, 1))
+            for name, duration, _ in metrics if duration is not None)
+        logger.info(json.dumps(fields))
+        return response
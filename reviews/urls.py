@@ -1,7 +1,7 @@
 from . import views
 from .admin_views import approve_comments, approve_reviews
 from .populate_views import (populate_reviews_interface,
-                             create_reviews_from_selection)
+                             create_reviews_from_selection, job_progress)
 from django.urls import path
 
 app_name = 'reviews'
@@ -9,10 +9,13 @@ app_name = 'reviews'
 urlpatterns = [
     path('', views.ReviewList.as_view(), name='review_list'),
     path('search/', views.search_games, name='search_games'),
+    path('search/suggest/', views.search_suggestions,
+         name='search_suggestions'),
     path('accounts/profile/', views.profile, name='profile'),
     path('populate/', populate_reviews_interface, name='populate_interface'),
     path('populate/create/', create_reviews_from_selection,
          name='create_reviews'),
+    path('populate/jobs/<int:job_id>/', job_progress, name='job_progress'),
     path('admin/approve-comments/', approve_comments, name='approve_comments'),
     path('admin/approve-reviews/', approve_reviews, name='approve_reviews'),
     path('<slug:slug>/', views.review_details, name='review_detail'),
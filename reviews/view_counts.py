@@ -0,0 +1,182 @@
+"""
+Buffered page view counts for ``Review.views``.
+
+``count_views`` records a view for each review page served, from the page
+cache or as 304 Not Modified too. Views are added up in process memory
+and written every VIEW_COUNT_FLUSH_INTERVAL seconds, or once
+VIEW_COUNT_FLUSH_SIZE are pending, as one ``views = views + n`` UPDATE
+per review, so busy pages take one short row lock per flush instead of
+one per hit.
+
+Crawlers, prefetches and HEAD requests are not counted, and a visitor
+(user, or IP address and user agent) viewing the same review again
+within VIEW_COUNT_DEDUPE_WINDOW seconds counts once.
+
+Pending views are flushed when the process exits normally. A worker
+that is killed loses the views it had not flushed yet: at most one
+interval's worth, and never more than VIEW_COUNT_FLUSH_SIZE.
+
+The counter is not shown on any page, so a flush neither touches
+``updated_on`` nor purges cached pages.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import F
+from functools import wraps
+import atexit
+import hashlib
+import logging
+import re
+import threading
+
+
+logger = logging.getLogger('reviews.view_counts')
+
+# User agents of crawlers, link previews and scripted clients
+BOT_PATTERN = re.compile(
+    r'bot|crawl|spider|slurp|preview|facebookexternalhit|embedly|'
+    r'headless|lighthouse|curl|wget|python-|httpx|okhttp|java/|go-http',
+    re.IGNORECASE)
+
+
+class ViewCounter:
+    """Views per review slug, pending a flush"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.total = 0
+        self.timer = None
+        self.flushing = threading.Lock()
+        # A size-triggered flush has been started and not yet taken
+        self.flush_started = False
+
+    def add(self, slug):
+        with self.lock:
+            self.pending[slug] = self.pending.get(slug, 0) + 1
+            self.total += 1
+            full = (
+                self.total >= getattr(
+                    settings, 'VIEW_COUNT_FLUSH_SIZE', 500) and
+                not self.flush_started
+            )
+            if full:
+                self.flush_started = True
+            else:
+                self.start_timer()
+        if full:
+            self.start_flush()
+
+    def start_timer(self):
+        """Schedule a flush unless one is scheduled; call with the lock"""
+        if self.timer is None:
+            self.timer = threading.Timer(
+                getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 30),
+                self.flush_in_thread)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def take(self):
+        with self.lock:
+            pending, self.pending, self.total = self.pending, {}, 0
+            self.flush_started = False
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        return pending
+
+    def restore(self, pending):
+        """Put back views a flush could not write, and retry them later"""
+        with self.lock:
+            for slug, views in pending.items():
+                self.pending[slug] = self.pending.get(slug, 0) + views
+                self.total += views
+            if self.pending:
+                # take() cancelled the timer; without it the views would
+                # wait for the next visit
+                self.start_timer()
+
+    def flush(self):
+        """Write the pending views; returns how many reviews were updated"""
+        from .models import Review
+
+        # One flush at a time per process
+        with self.flushing:
+            pending = sorted(self.take().items())
+            written = 0
+            # Each UPDATE commits on its own, holding one row lock for one
+            # statement
+            for slug, views in pending:
+                try:
+                    Review.objects.filter(slug=slug).update(
+                        views=F('views') + views)
+                except DatabaseError:
+                    logger.exception('Could not write review view counts')
+                    # Kept for the next flush
+                    self.restore(dict(pending[written:]))
+                    break
+                written += 1
+            return written
+
+    def start_flush(self):
+        threading.Thread(target=self.flush_in_thread, daemon=True).start()
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+counter = ViewCounter()
+atexit.register(counter.flush)
+
+
+def countable_request(request):
+    user_agent = request.headers.get('User-Agent', '')
+    return (
+        request.method == 'GET' and
+        bool(user_agent) and
+        not BOT_PATTERN.search(user_agent) and
+        # Speculative loads the visitor may never see
+        request.headers.get('Sec-Purpose', '') != 'prefetch' and
+        request.headers.get('Purpose', '') != 'prefetch'
+    )
+
+
+def visitor_key(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    # The proxy in front of the app appends the client's address last;
+    # earlier entries come from the client and can be made up
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    address = (forwarded.rsplit(',', 1)[-1].strip() or
+               request.META.get('REMOTE_ADDR', ''))
+    return f'{address}:{request.headers.get("User-Agent", "")}'
+
+
+def record_view(request, slug):
+    """Count a view of review ``slug`` unless it repeats a recent one"""
+    if not countable_request(request):
+        return False
+    digest = hashlib.sha1(
+        f'{slug}:{visitor_key(request)}'.encode()).hexdigest()
+    if not cache.add(f'viewed:{digest}', True,
+                     getattr(settings, 'VIEW_COUNT_DEDUPE_WINDOW', 60 * 30)):
+        return False
+    counter.add(slug)
+    return True
+
+
+def count_views(view):
+    """Record a view of the review at ``slug`` for each page served"""
+
+    @wraps(view)
+    def wrapped(request, slug, *args, **kwargs):
+        response = view(request, slug, *args, **kwargs)
+        if response.status_code in (200, 304):
+            record_view(request, slug)
+        return response
+
+    return wrapped
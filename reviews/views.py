@@ -1,60 +1,59 @@
 from django.shortcuts import render, get_object_or_404, reverse
 from django.views import generic
 from django.contrib import messages
-from django.http import HttpResponseRedirect
-from django.db.models import Avg, Q
+from django.http import HttpResponseRedirect, JsonResponse
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.decorators import login_required
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_http_methods
 from publisher.models import Publisher
 from developer.models import Developer
+from .autocomplete import complete
+from .conditional import catalogue_version, conditional_page, review_version
 from .models import Review, UserComment, UserReview
+from .page_cache import add_surrogate_keys, cache_anonymous_page
+from .pagination import CursorPaginationMixin, CursorPaginator
 from .forms import UserCommentForm, UserReviewForm
-from .igdb_service import IGDBService
-from datetime import datetime
+from .search import search_companies, search_reviews
+from .view_counts import count_views
 
 
 # Create your views here.
 
 
-def process_release_dates(release_dates_data):
-    """Process IGDB release dates data to get earliest date per platform"""
-    if not release_dates_data:
-        return []
-
-    # Group release dates by platform, keeping only the earliest date
-    platform_releases = {}
-    for release_date in release_dates_data:
-        if 'date' in release_date:
-            platform_name = "Unknown Platform"
-            if ('platform' in release_date and
-                    'name' in release_date['platform']):
-                platform_name = release_date['platform']['name']
-
-            try:
-                timestamp = release_date['date']
-                date_obj = datetime.fromtimestamp(timestamp)
-                formatted_date = date_obj.strftime('%B %d, %Y')
-
-                # Keep only the earliest date for each platform
-                if (platform_name not in platform_releases or
-                        timestamp <
-                        platform_releases[platform_name]['timestamp']):
-                    platform_releases[platform_name] = {
-                        'platform': platform_name,
-                        'date': formatted_date,
-                        'timestamp': timestamp
-                    }
-            except (ValueError, OSError):
-                continue
-
-    # Sort by timestamp and return list
-    sorted_releases = sorted(
-        platform_releases.values(),
-        key=lambda x: x['timestamp']
-    )
-    return sorted_releases
+# Comments and user reviews shown per page of a review's discussion
+DISCUSSION_PAGE_SIZE = 20
+
 
+def resolve_companies(model, companies):
+    """
+    Map IGDB company dicts to rows of ``model`` using a single
+    case-insensitive lookup. Companies without a matching row are returned
+    as-is so the template can fall back to the IGDB data.
+    """
+    names = {
+        company['name'].lower() for company in companies
+        if company.get('name')
+    }
+    if not names:
+        return list(companies)
+
+    rows = {
+        row.name_lower: row
+        for row in model.objects.annotate(
+            name_lower=Lower('name')
+        ).filter(name_lower__in=names)
+    }
+    return [
+        rows.get((company.get('name') or '').lower(), company)
+        for company in companies
+    ]
 
-class ReviewList(generic.ListView):
+
+@method_decorator(conditional_page(catalogue_version), name='dispatch')
+@method_decorator(cache_anonymous_page, name='dispatch')
+class ReviewList(CursorPaginationMixin, generic.ListView):
     template_name = "reviews/review_list.html"
     paginate_by = 16
 
@@ -64,6 +63,9 @@ class ReviewList(generic.ListView):
         genre = self.request.GET.get('genre')
         if genre:
             queryset = queryset.filter(genres__name__iexact=genre)
+            add_surrogate_keys(self.request, f'genre:{genre.lower()}')
+        else:
+            add_surrogate_keys(self.request, 'reviews')
 
         sort = self.request.GET.get('sort')
         if sort == 'az':
@@ -76,16 +78,20 @@ class ReviewList(generic.ListView):
             queryset = queryset.order_by('review_date')
         else:
             queryset = queryset.order_by('title')  # Default to A-Z sorting
-        return queryset
+        return queryset.for_cards()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        add_surrogate_keys(self.request, 'featured')
         context['featured_reviews'] = Review.objects.filter(
             is_featured=True, is_published=True
-        )
+        ).for_cards()
         return context
 
 
+@count_views
+@conditional_page(review_version)
+@cache_anonymous_page
 def review_details(request, slug):
     """
     Display an individual :model:`reviews.Review`.
@@ -94,6 +100,9 @@ def review_details(request, slug):
 
     ``review``
         An instance of :model:`reviews.Review`.
+    ``user_comments``, ``user_reviews``
+        Pages of :model:`reviews.UserComment` and :model:`reviews.UserReview`,
+        chosen by the ``comments`` and ``user_reviews`` cursors.
 
     **Template:**
 
@@ -102,79 +111,47 @@ def review_details(request, slug):
 
     queryset = Review.objects.filter(is_published=True)
     review = get_object_or_404(queryset, slug=slug)
-    user_comments = review.user_comments.all().order_by("-created_on")
-    comment_count = review.user_comments.filter(approved=True).count()
-
-    # Get platforms, release dates, genres, and developers from IGDB
-    # for this game
-    game_platforms = []
-    game_release_dates = []
-    game_genres = []
-    game_developers = []
-    game_publishers = []
-    try:
-        igdb_service = IGDBService()
-        platform_data = igdb_service.get_game_platforms_by_name(review.title)
-        if platform_data and platform_data.get('platforms'):
-            game_platforms = platform_data['platforms']
-        if platform_data and platform_data.get('genres'):
-            game_genres = platform_data['genres']
-        # Map IGDB developers to Django Developer objects
-        if platform_data and platform_data.get('developers'):
-            igdb_developers = platform_data['developers']
-            game_developers = []
-            for dev in igdb_developers:
-                db_dev = Developer.objects.filter(
-                    name__iexact=dev.get('name')
-                ).first()
-                if db_dev:
-                    game_developers.append(db_dev)
-                else:
-                    # fallback: add dict with name/description only
-                    game_developers.append(dev)
-        # Map IGDB publishers to Django Publisher objects
-        if platform_data and platform_data.get('publishers'):
-            igdb_publishers = platform_data['publishers']
-            game_publishers = []
-            for pub in igdb_publishers:
-                db_pub = Publisher.objects.filter(
-                    name__iexact=pub.get('name')
-                ).first()
-                if db_pub:
-                    game_publishers.append(db_pub)
-                else:
-                    # fallback: add dict with name/description only
-                    game_publishers.append(pub)
-        if (platform_data and
-                platform_data.get('game', {}).get('release_dates')):
-            raw_release_dates = platform_data['game']['release_dates']
-            game_release_dates = process_release_dates(raw_release_dates)
-    except Exception as e:
-        # If IGDB fails, we'll just show without platform data
-        print(f"IGDB platform lookup failed: {e}")
+    add_surrogate_keys(request, f'review:{review.pk}')
+    # Get comments - show approved ones + current user's unapproved ones
+    if request.user.is_authenticated:
+        user_comments = review.user_comments.filter(
+            Q(approved=True) | Q(author=request.user))
+    else:
+        user_comments = review.user_comments.filter(approved=True)
+    user_comments = CursorPaginator(
+        user_comments.select_related('author').order_by("-created_on"),
+        DISCUSSION_PAGE_SIZE,
+    ).page(request.GET.get('comments'))
+    comment_count = review.comment_count
+
+    # Platforms, release dates, genres and companies come from the IGDB
+    # snapshot saved on the review at import time
+    igdb_data = review.igdb_data or {}
+    game_platforms = igdb_data.get('platforms', [])
+    game_release_dates = igdb_data.get('release_dates', [])
+    game_genres = igdb_data.get('genres', [])
+
+    # Map IGDB developers and publishers to Django objects where they exist
+    game_developers = resolve_companies(
+        Developer, igdb_data.get('developers', []))
+    game_publishers = resolve_companies(
+        Publisher, igdb_data.get('publishers', []))
 
     # Get user reviews - show approved ones + current user's unapproved ones
     if request.user.is_authenticated:
         user_reviews = review.user_reviews.filter(
-            Q(approved=True) | Q(user=request.user)
-        ).order_by("-created_on")
+            Q(approved=True) | Q(user=request.user))
     else:
-        user_reviews = review.user_reviews.filter(
-            approved=True
-        ).order_by("-created_on")
-
-    # Count only approved reviews for the public count
-    user_review_count = review.user_reviews.filter(approved=True).count()
-
-    # Calculate average review score - only from approved reviews
-    average_review_score = None
-    if user_review_count > 0:
-        approved_reviews = review.user_reviews.filter(approved=True)
-        average_review_score = approved_reviews.aggregate(
-            Avg('rating')
-        )['rating__avg']
-        # Round to 1 decimal place
-        average_review_score = round(average_review_score, 1)
+        user_reviews = review.user_reviews.filter(approved=True)
+    user_reviews = CursorPaginator(
+        user_reviews.select_related('user').order_by("-created_on"),
+        DISCUSSION_PAGE_SIZE,
+    ).page(request.GET.get('user_reviews'))
+
+    # Counts and average only include approved reviews and are stored on
+    # the review itself
+    user_review_count = review.user_review_count
+    average_review_score = review.average_rating
 
     # Check if current user has already reviewed this game
     user_has_reviewed = False
@@ -233,7 +210,6 @@ def review_details(request, slug):
             "game_genres": game_genres,
             "game_developers": game_developers,
             "game_publishers": game_publishers,
-            "developer_db": Developer.objects.all(),
         },
     )
 
@@ -365,26 +341,16 @@ def search_games(request):
     query = request.GET.get('q', '')
 
     if query:
-        # Search games by title
-        games_by_title = Review.objects.filter(
-            title__icontains=query,
-            is_published=True
-        )
-
-        # Search games by genre
-        games_by_genre = Review.objects.filter(
-            genres__name__icontains=query,
-            is_published=True
-        )
-
-        # Combine and remove duplicates
-        games = (games_by_title | games_by_genre).distinct()
+        # Ranked full-text search over title, genres, companies and
+        # description
+        games = search_reviews(
+            query, Review.objects.filter(is_published=True).for_cards())
 
         # Search publishers
-        publishers = Publisher.objects.filter(name__icontains=query)
+        publishers = search_companies(query, Publisher.objects.all())
 
         # Search developers
-        developers = Developer.objects.filter(name__icontains=query)
+        developers = search_companies(query, Developer.objects.all())
 
         return render(request, 'reviews/search_results.html', {
             'query': query,
@@ -396,15 +362,29 @@ def search_games(request):
     return render(request, 'reviews/search_results.html', {'query': query})
 
 
+@require_http_methods(["GET"])
+def search_suggestions(request):
+    """JSON completions for the navbar search, served from memory"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 20)
+    except ValueError:
+        limit = 5
+    return JsonResponse({
+        'query': query,
+        'results': complete(query, limit),
+    })
+
+
 @login_required
 def profile(request):
     """Display user profile with account management links"""
     user_reviews = UserReview.objects.filter(
         user=request.user
-    ).order_by('-created_on')
+    ).select_related('game').order_by('-created_on')
     user_comments = UserComment.objects.filter(
         author=request.user
-    ).order_by('-created_on')
+    ).select_related('review').order_by('-created_on')
 
     context = {
         'user_reviews': user_reviews,
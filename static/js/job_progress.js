@@ -0,0 +1,48 @@
+// Poll the progress of a queued import job until it finishes
+document.addEventListener('DOMContentLoaded', function () {
+    const card = document.getElementById('job-progress');
+    if (!card) {
+        return;
+    }
+    const bar = document.getElementById('job-progress-bar');
+    const text = document.getElementById('job-progress-text');
+    const labels = { queued: 'Queued', running: 'Running', done: 'Done', failed: 'Failed' };
+
+    function render(job) {
+        const percent = job.total ? Math.round(100 * job.completed / job.total) : 100;
+        bar.style.width = percent + '%';
+        bar.parentElement.setAttribute('aria-valuenow', job.completed);
+
+        let message = labels[job.status] + ': ' + job.completed + ' of ' + job.total + ' game(s) processed';
+        if (job.result.created !== undefined) {
+            message += ', ' + job.result.created + ' created';
+        }
+        if (job.result.skipped) {
+            message += ', ' + job.result.skipped + ' skipped';
+        }
+        if (job.error && job.status !== 'done') {
+            message += ' (' + job.error + ')';
+        }
+        text.textContent = message;
+        if (job.status === 'failed') {
+            bar.classList.replace('bg-success', 'bg-danger');
+        }
+    }
+
+    function poll() {
+        fetch(card.dataset.url)
+            .then(function (response) { return response.json(); })
+            .then(function (job) {
+                render(job);
+                if (job.status === 'done') {
+                    // Show the new reviews in the table below
+                    setTimeout(function () { window.location.search = ''; }, 1500);
+                } else if (job.status !== 'failed') {
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(function () { setTimeout(poll, 5000); });
+    }
+
+    poll();
+});
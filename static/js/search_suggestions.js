@@ -0,0 +1,42 @@
+// Search-as-you-type suggestions for the navbar search box
+document.addEventListener('DOMContentLoaded', function () {
+    const input = document.getElementById('search-input');
+    const list = document.getElementById('search-suggestions');
+    if (!input || !list) {
+        return;
+    }
+
+    let timer = null;
+    let controller = null;
+
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < 2) {
+            list.replaceChildren();
+            return;
+        }
+        // Wait for a pause in typing before asking the server
+        timer = setTimeout(function () {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const url = input.dataset.suggestUrl + '?q=' + encodeURIComponent(query);
+            fetch(url, { signal: controller.signal })
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    const labels = new Set();
+                    Object.values(data.results).forEach(function (matches) {
+                        matches.forEach(function (match) { labels.add(match.label); });
+                    });
+                    list.replaceChildren(...Array.from(labels).map(function (label) {
+                        const option = document.createElement('option');
+                        option.value = label;
+                        return option;
+                    }));
+                })
+                .catch(function () {});
+        }, 150);
+    });
+});